@@ -1,12 +1,26 @@
+import asyncio
+import json
+import time
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core import progress
+from app.core.config import settings
+from app.core.database import SessionLocal, get_db
 from app.api import deps
 from app.repositories.book_summary_repo import BookSummaryRepository
+from app.services.summary_service import summary_progress_channel
 
 router = APIRouter(prefix="/books", tags=["analysis"])
 
+TERMINAL_STATUSES = {"completed", "failed"}
+# while the worker has not published progress yet, the stored row is re-read this often
+DB_POLL_SECONDS = 2.0
+KEEPALIVE_SECONDS = 15.0
+
 
 def get_summary_repo(db: Session = Depends(get_db)):
     return BookSummaryRepository(db)
@@ -29,3 +43,63 @@ def get_analysis(book_id: str, repo: BookSummaryRepository = Depends(get_summary
         "consensus_model": consensus.model_name if consensus else None,
         "consensus_prompt_version": consensus.prompt_version if consensus else None,
     }
+
+
+@router.get("/{book_id}/analysis/stream")
+def stream_summary(book_id: str, repo: BookSummaryRepository = Depends(get_summary_repo), current_user=Depends(deps.get_current_user)):
+    """Server-Sent Events for the book summary: `status` events on every state change
+    (with map/reduce progress while running), `delta` events carrying summary text
+    as it is generated, and `reset` when a retry restarts generation. The stream
+    ends once the summary is completed or has failed for good."""
+    if not repo.get_summary(book_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No summary available")
+    return StreamingResponse(
+        _summary_events(book_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stored_summary(book_id: str) -> tuple[str | None, str | None]:
+    # request-scoped sessions are closed before a streaming body runs
+    with SessionLocal() as db:
+        row = BookSummaryRepository(db).get_summary(book_id)
+        return (row.status, row.summary) if row else (None, None)
+
+
+async def _summary_events(book_id: str):
+    channel = summary_progress_channel(book_id)
+    offset, run, last_state = 0, None, None
+    db_checked = last_sent = float("-inf")
+    deadline = time.monotonic() + settings.PROGRESS_STREAM_MAX_SECONDS
+    while time.monotonic() < deadline:
+        state, chunk, offset = await run_in_threadpool(progress.read, channel, offset)
+        if state is not None and state.get("run") != run:
+            if run is not None:
+                yield _sse("reset", {})
+            run = state.get("run")
+            state, chunk, offset = await run_in_threadpool(progress.read, channel, 0)
+        if state is None and time.monotonic() - db_checked >= DB_POLL_SECONDS:
+            # no live progress: not picked up by a worker yet, or finished long enough ago to expire
+            db_checked = time.monotonic()
+            stored_status, stored_text = await run_in_threadpool(_stored_summary, book_id)
+            state = {"status": stored_status or "failed"}
+            if stored_status == "completed":
+                chunk = stored_text or ""
+        now = time.monotonic()
+        if state is not None and state != last_state:
+            yield _sse("status", state)
+            last_state, last_sent = state, now
+        if chunk:
+            yield _sse("delta", {"text": chunk})
+            last_sent = now
+        if state is not None and state.get("status") in TERMINAL_STATUSES:
+            return
+        if now - last_sent >= KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = now
+        await asyncio.sleep(settings.PROGRESS_POLL_SECONDS)
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
 from typing import Optional, List
+from uuid import UUID
 
 from app.core.database import get_db
 from app.api import deps
 from app.schemas.books import BookCreate, BookUpdate, BookOut
+from app.schemas.recommendations import SimilarBooksOut, RecommendationItemOut
 from app.services.book_service import BookService
+from app.services.recommendation_service import RecommendationService
 
 router = APIRouter(prefix="/books", tags=["books"])
 
@@ -14,6 +17,10 @@ def get_book_service(db: Session = Depends(get_db)) -> BookService:
     return BookService(db)
 
 
+def get_rec_service(db: Session = Depends(get_db)) -> RecommendationService:
+    return RecommendationService(db)
+
+
 @router.post("", response_model=BookOut, status_code=201)
 def create_book(
     file: UploadFile = File(...),
@@ -82,3 +89,25 @@ def delete_book(
 ):
     svc.delete_book(book_id)
     return None
+
+
+@router.get("/{book_id}/similar", response_model=SimilarBooksOut)
+def similar_books(
+    book_id: UUID,
+    limit: int = Query(10, ge=1, le=50),
+    svc: RecommendationService = Depends(get_rec_service),
+    current_user=Depends(deps.get_current_user),
+):
+    items, provider = svc.similar_books(str(book_id), limit=limit)
+    if not items:
+        return SimilarBooksOut(
+            book_id=book_id,
+            items=[],
+            provider=provider,
+            message="No similar books yet. They are computed with the next model training run.",
+        )
+    return SimilarBooksOut(
+        book_id=book_id,
+        items=[RecommendationItemOut(book_id=b, score=s, rank=i + 1) for i, (b, s) in enumerate(items)],
+        provider=provider,
+    )
@@ -17,7 +17,18 @@ def get_rec_service(db: Session = Depends(get_db)) -> RecommendationService:
 def get_recommendations(
     svc: RecommendationService = Depends(get_rec_service), current_user=Depends(deps.get_current_user)
 ):
-    items, prefs, book_tags = svc.compute_and_get(user_id=str(current_user.id), limit=10)
-    if not prefs or not book_tags or len(items) == 0:
-        return RecommendationsOut(items=[], message="No recommendations yet. Add tags to books and borrow to build signal.")
-    return RecommendationsOut(items=[RecommendationItemOut(book_id=item.book_id, score=item.score, rank=item.rank) for item in items])
+    snap, items, stale = svc.get_recommendations(user_id=str(current_user.id), limit=10)
+    if len(items) == 0:
+        return RecommendationsOut(
+            items=[],
+            generated_at=snap.generated_at,
+            provider=snap.provider,
+            message="No recommendations yet. Add tags to books and borrow to build signal.",
+            stale=stale,
+        )
+    return RecommendationsOut(
+        items=[RecommendationItemOut(book_id=item.book_id, score=item.score, rank=item.rank) for item in items],
+        generated_at=snap.generated_at,
+        provider=snap.provider,
+        stale=stale,
+    )
@@ -0,0 +1,98 @@
+"""Compare the IVF-PQ index against exact inner-product search on synthetic ALS factors.
+
+    python -m app.benchmarks.ann --items 200000 --factors 64 --queries 200 --probes 4,8,16,32
+
+Prints one JSON document with build time, recall@k and latency percentiles per setting.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.providers.recs.ann import IVFPQIndex
+
+
+def synthetic_factors(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    # clustered, norm-skewed vectors resemble trained item factors better than iid noise
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=n)
+    scale = rng.pareto(3.0, size=(n, 1)).astype(np.float32) + 0.5
+    return (centers[assign] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)) * scale / np.sqrt(dim)
+
+
+def exact_top_k(items: np.ndarray, query: np.ndarray, k: int, exclude: np.ndarray) -> np.ndarray:
+    scores = items @ query
+    scores[exclude] = -np.inf
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    arr = np.asarray(samples) * 1000.0
+    return {f"p{p}": round(float(np.percentile(arr, p)), 3) for p in (50, 95, 99)}
+
+
+def run(args: argparse.Namespace) -> dict:
+    rng = np.random.default_rng(args.seed)
+    items = synthetic_factors(args.items, args.factors, args.clusters, rng)
+    queries = synthetic_factors(args.queries, args.factors, args.clusters, rng)
+    excludes = [rng.choice(args.items, args.exclude, replace=False) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    index = IVFPQIndex.build(items, n_lists=args.lists, n_subvectors=args.subvectors)
+    build_seconds = time.perf_counter() - started
+
+    exact_latency = []
+    truth = []
+    for q, ex in zip(queries, excludes):
+        t0 = time.perf_counter()
+        truth.append(set(exact_top_k(items, q, args.k, ex).tolist()))
+        exact_latency.append(time.perf_counter() - t0)
+
+    runs = []
+    for n_probe in args.probes:
+        latency = []
+        hits = 0
+        for q, ex, expected in zip(queries, excludes, truth):
+            t0 = time.perf_counter()
+            found, _ = index.search(q, args.k, exclude=ex, n_probe=n_probe, vectors=items, rerank=args.rerank)
+            latency.append(time.perf_counter() - t0)
+            hits += len(expected.intersection(found.tolist()))
+        runs.append(
+            {
+                "n_probe": n_probe,
+                "rerank": args.rerank,
+                f"recall@{args.k}": round(hits / (args.k * args.queries), 4),
+                "latency_ms": percentiles(latency),
+            }
+        )
+    return {
+        "items": args.items,
+        "factors": args.factors,
+        "lists": index.n_lists,
+        "subvectors": index.codebooks.shape[0],
+        "build_seconds": round(build_seconds, 3),
+        "exact_latency_ms": percentiles(exact_latency),
+        "ann": runs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--exclude", type=int, default=20, help="excluded items per query")
+    parser.add_argument("--lists", type=int, default=0, help="0 = sqrt(items)")
+    parser.add_argument("--subvectors", type=int, default=16)
+    parser.add_argument("--probes", type=lambda s: [int(x) for x in s.split(",")], default=[4, 8, 16, 32])
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Throughput of the summary and consensus workers against the fake LLM provider.
+
+    python -m app.benchmarks.llm_workers --tasks 200 --concurrency 4 --latency-ms 800 --tokens-per-second 30
+    python -m app.benchmarks.llm_workers --task update_review_consensus --reviews 40 --failure-rate 0.05
+
+Seeds `--tasks` books in the configured database (a unique text file of
+`--chars` characters each, in a temporary local storage directory, plus
+`--reviews` reviews per book for consensus runs). It then starts an in-process
+Celery worker with a thread pool of `--concurrency` on the extract and llm
+queues, enqueues one task per book and waits until every book is done (for
+summaries, once `generate_summary` has run after `summarize_book` extracted).
+
+Prints one JSON document with:
+- end-to-end throughput
+- end-to-end latency percentiles per book
+- queue wait percentiles per task, from publish to start
+- per-task, per-stage timings (fetch, extract, generate, commit) from `task_stage_seconds`
+- the LLM call count and mean latency
+
+The broker defaults to the in-memory transport, so only PostgreSQL is needed.
+Pass `--broker` to go through Redis. Seeded rows are deleted afterwards.
+
+Worker threads share one provider, so `--max-inflight` models the parallelism of
+the Ollama server(s) behind the whole worker fleet. Concurrency beyond that only
+adds queue wait inside the worker.
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from celery import signals
+from prometheus_client import REGISTRY
+from sqlalchemy import delete
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import Book, BookFile, Review, SummaryCacheEntry, User
+from app.providers.llm import reset_llm_provider
+from app.providers.storage import get_storage_provider
+from app.repositories.catalog_repo import CatalogRepository
+from app.workers.tasks import EXTRACTED
+
+TASKS = {
+    "summarize_book": "app.workers.tasks.summarize_book",
+    "update_review_consensus": "app.workers.tasks.update_review_consensus",
+}
+# tasks one book goes through, in order
+PIPELINES = {
+    "summarize_book": ("summarize_book", "generate_summary"),
+    "update_review_consensus": ("update_review_consensus",),
+}
+STAGES = ("fetch", "extract", "generate", "commit")
+
+_VOCAB = (
+    "library archive river winter letter garden city mother engine silence harbour "
+    "promise window soldier map island music doctor storm kingdom ledger lantern "
+    "walked found remembered carried opened lost wrote returned watched crossed"
+).split()
+
+
+def synthetic_text(n_chars: int, rng: random.Random) -> str:
+    paragraphs, size = [], 0
+    while size < n_chars:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = rng.choices(_VOCAB, k=rng.randint(6, 18))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:n_chars]
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    arr = np.asarray(samples) * 1000.0
+    return {f"p{p}": round(float(np.percentile(arr, p)), 1) for p in (50, 95, 99)}
+
+
+def _sample(name: str, labels: dict[str, str]) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _stage_totals(tasks: tuple[str, ...]) -> dict[tuple[str, str], tuple[float, float]]:
+    return {
+        (task, stage): (
+            _sample("task_stage_seconds_sum", {"task": task, "stage": stage}),
+            _sample("task_stage_seconds_count", {"task": task, "stage": stage}),
+        )
+        for task in tasks
+        for stage in STAGES
+    }
+
+
+def _llm_totals() -> tuple[float, float]:
+    labels = {"model": "fake", "outcome": "ok"}
+    return _sample("llm_request_seconds_sum", labels), _sample("llm_request_seconds_count", labels)
+
+
+def configure(args: argparse.Namespace, storage_dir: str) -> None:
+    settings.LLM_PROVIDER = "fake"
+    settings.STORAGE_PROVIDER = "local"
+    settings.LOCAL_STORAGE_PATH = storage_dir
+    settings.FAKE_LLM_LATENCY_MS = args.latency_ms
+    settings.FAKE_LLM_LATENCY_SIGMA = args.latency_sigma
+    settings.FAKE_LLM_TOKENS_PER_SECOND = args.tokens_per_second
+    settings.FAKE_LLM_FAILURE_RATE = args.failure_rate
+    settings.FAKE_LLM_SEED = args.seed
+    settings.OLLAMA_MAX_INFLIGHT = args.max_inflight
+    reset_llm_provider()
+    celery_app.conf.broker_url = args.broker
+    celery_app.conf.broker_connection_retry_on_startup = True
+    # the in-memory transport polls once a second by default, which would show up as queue wait
+    celery_app.conf.broker_transport_options = {"polling_interval": 0.01}
+    # completion is observed through task signals; results are never read
+    celery_app.conf.task_ignore_result = True
+
+
+def seed(args: argparse.Namespace, run_id: str) -> tuple[list[str], list[str], list[str]]:
+    """(book ids, reviewer ids, content hashes) of the seeded data."""
+    rng = random.Random(args.seed)
+    storage = get_storage_provider()
+    book_ids, user_ids, hashes = [], [], []
+    with SessionLocal() as db:
+        n_reviewers = args.reviews if args.task == "update_review_consensus" else 0
+        for i in range(n_reviewers):
+            user = User(email=f"bench-{run_id}-{i}@example.com", password_hash="!")
+            db.add(user)
+            db.flush()
+            user_ids.append(user.id)
+        now = datetime.utcnow()
+        for i in range(args.tasks):
+            book = Book(title=f"Benchmark {run_id} #{i}", author="llm_workers")
+            db.add(book)
+            db.flush()
+            book_ids.append(str(book.id))
+            if args.task == "summarize_book":
+                # the run id keeps the summary cache from serving earlier runs
+                content = f"{run_id} {i}\n\n{synthetic_text(args.chars, rng)}".encode()
+                key = storage.put(io.BytesIO(content), f"bench-{run_id}/{i}.txt")
+                digest = hashlib.sha256(content).hexdigest()
+                hashes.append(digest)
+                db.add(
+                    BookFile(
+                        book_id=book.id,
+                        storage_provider="local",
+                        object_key=key,
+                        file_type="txt",
+                        mime_type="text/plain",
+                        size_bytes=len(content),
+                        content_sha256=digest,
+                    )
+                )
+            for j, user_id in enumerate(user_ids):
+                db.add(
+                    Review(
+                        user_id=user_id,
+                        book_id=book.id,
+                        rating=rng.randint(1, 5),
+                        review_text=synthetic_text(rng.randint(200, 1200), rng),
+                        created_at=now - timedelta(seconds=len(user_ids) - j),
+                    )
+                )
+        # written out of band, so bump the version the repositories would
+        CatalogRepository(db).bump()
+        db.commit()
+    return book_ids, [str(u) for u in user_ids], hashes
+
+
+def cleanup(book_ids: list[str], user_ids: list[str], hashes: list[str]) -> None:
+    with SessionLocal() as db:
+        # files, summaries, chunks, consensus and reviews cascade
+        db.execute(delete(Book).where(Book.id.in_(book_ids)))
+        if user_ids:
+            db.execute(delete(User).where(User.id.in_(user_ids)))
+        if hashes:
+            db.execute(delete(SummaryCacheEntry).where(SummaryCacheEntry.content_sha256.in_(hashes)))
+        CatalogRepository(db).bump()
+        db.commit()
+
+
+def run(args: argparse.Namespace) -> dict:
+    task_name = TASKS[args.task]
+    pipeline = PIPELINES[args.task]
+    run_id = uuid.uuid4().hex[:8]
+    # keyed by book id, which every task of the pipeline takes as its argument
+    enqueued: dict[str, float] = {}
+    finished: dict[str, float] = {}
+    failed: set[str] = set()
+    waits: dict[str, list[float]] = {name: [] for name in pipeline}
+    lock = threading.Lock()
+    all_done = threading.Event()
+    ready = threading.Event()
+
+    def on_ready(**kwargs):
+        ready.set()
+
+    def on_prerun(task=None, **kwargs):
+        sent_at = getattr(task.request, "sent_at", None)
+        # retries run after a countdown, which is not queue wait
+        if sent_at and not task.request.eta:
+            with lock:
+                waits.setdefault(task.name.rsplit(".", 1)[-1], []).append(max(0.0, time.time() - sent_at))
+
+    def on_postrun(args=None, state=None, retval=None, **kwargs):
+        # the extract stage hands the book on to the llm queue
+        if state == "RETRY" or retval == EXTRACTED:
+            return
+        book_id = args[0] if args else None
+        with lock:
+            if book_id not in enqueued or book_id in finished:
+                return
+            finished[book_id] = time.perf_counter()
+            if state != "SUCCESS":
+                failed.add(book_id)
+            if len(finished) == len(enqueued):
+                all_done.set()
+
+    with tempfile.TemporaryDirectory(prefix="llm-bench-") as storage_dir:
+        configure(args, storage_dir)
+        book_ids, user_ids, hashes = seed(args, run_id)
+        signals.worker_ready.connect(on_ready, weak=False)
+        signals.task_prerun.connect(on_prerun, weak=False)
+        signals.task_postrun.connect(on_postrun, weak=False)
+        worker = celery_app.Worker(
+            pool="threads",
+            concurrency=args.concurrency,
+            queues=["extract", "llm"],
+            loglevel="WARNING",
+            without_heartbeat=True,
+            without_mingle=True,
+            without_gossip=True,
+            redirect_stdouts=False,
+            quiet=True,
+        )
+        thread = threading.Thread(target=worker.start, daemon=True)
+        stages_before = _stage_totals(pipeline)
+        llm_before = _llm_totals()
+        try:
+            thread.start()
+            # worker boot is not queue wait
+            if not ready.wait(60):
+                raise RuntimeError("worker did not start")
+            t0 = time.perf_counter()
+            for book_id in book_ids:
+                with lock:
+                    enqueued[book_id] = time.perf_counter()
+                celery_app.send_task(task_name, args=[book_id])
+            completed = all_done.wait(args.timeout)
+            wall = time.perf_counter() - t0
+        finally:
+            worker.stop(in_sighandler=False)
+            thread.join(10)
+            signals.worker_ready.disconnect(on_ready)
+            signals.task_prerun.disconnect(on_prerun)
+            signals.task_postrun.disconnect(on_postrun)
+            cleanup(book_ids, user_ids, hashes)
+
+    stages_after = _stage_totals(pipeline)
+    stages: dict[str, dict] = {}
+    for (name, stage), (total, n) in stages_after.items():
+        seconds = total - stages_before[name, stage][0]
+        count = n - stages_before[name, stage][1]
+        if count:
+            stages.setdefault(name, {})[stage] = {
+                "count": int(count),
+                "total_seconds": round(seconds, 3),
+                "mean_ms": round(seconds / count * 1000.0, 1),
+            }
+    llm_after = _llm_totals()
+    llm_calls = llm_after[1] - llm_before[1]
+    done = [b for b in finished if b not in failed]
+    return {
+        "task": args.task,
+        "tasks": args.tasks,
+        "concurrency": args.concurrency,
+        "max_inflight": args.max_inflight,
+        "broker": args.broker.split("://")[0],
+        "fake_llm": {
+            "latency_ms": args.latency_ms,
+            "latency_sigma": args.latency_sigma,
+            "tokens_per_second": args.tokens_per_second,
+            "failure_rate": args.failure_rate,
+        },
+        "completed": len(done),
+        "failed": len(failed),
+        "timed_out": not completed,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(done) / wall, 3) if wall > 0 else 0.0,
+        "queue_wait_ms": {name: percentiles(samples) for name, samples in waits.items()},
+        "end_to_end_ms": percentiles([finished[b] - enqueued[b] for b in done]),
+        "stages": stages,
+        "llm_calls": int(llm_calls),
+        "llm_call_mean_ms": round((llm_after[0] - llm_before[0]) / llm_calls * 1000.0, 1) if llm_calls else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--task", choices=sorted(TASKS), default="summarize_book")
+    parser.add_argument("--tasks", type=int, default=50, help="tasks to enqueue (one book each)")
+    parser.add_argument("--concurrency", type=int, default=4, help="worker threads")
+    parser.add_argument("--max-inflight", type=int, default=settings.OLLAMA_MAX_INFLIGHT, help="LLM calls in flight")
+    parser.add_argument("--chars", type=int, default=60_000, help="text per book (summaries)")
+    parser.add_argument("--reviews", type=int, default=20, help="reviews per book (consensus)")
+    parser.add_argument("--latency-ms", type=float, default=settings.FAKE_LLM_LATENCY_MS)
+    parser.add_argument("--latency-sigma", type=float, default=settings.FAKE_LLM_LATENCY_SIGMA)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.FAKE_LLM_TOKENS_PER_SECOND)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--broker", default="memory://", help="e.g. redis://localhost:6379/1")
+    parser.add_argument("--timeout", type=float, default=3600.0, help="seconds to wait for all tasks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="keep worker and task logs")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    report = json.dumps(run(args), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Offline evaluation and performance benchmark for the recommenders.
+
+    python -m app.benchmarks.recs_eval --users 20000 --books 5000 --tags 300 --k 10
+    python -m app.benchmarks.recs_eval --load interactions.npz --factors 128 --alpha 20
+
+Generates (or loads) an interaction log with timestamps, holds out the newest
+`--holdout` fraction of it, trains on the rest and scores every evaluation user
+with `ALSRecommender`, `ContentBasedRecommender` and a popularity baseline.
+Prints one JSON document with precision@k/recall@k, training time, per-user
+scoring latency percentiles and peak memory, for tracking across releases.
+
+A dataset file is an `.npz` with integer arrays `users`, `books`, `timestamps`,
+float `weights`, and the book x tag incidence as `book_tag_books`/`book_tag_tags`;
+`--save` writes the synthetic dataset in that format.
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.core.config import settings
+from app.providers.recs.content_based import BookTagMatrix, ContentBasedRecommender
+from app.providers.recs.interactions import InteractionMatrix
+from app.providers.recs.ml_als import ALSRecommender
+
+
+def _zipf_weights(n: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def synthetic_dataset(
+    n_users: int,
+    n_books: int,
+    n_tags: int,
+    mean_interactions: float,
+    taste: float,
+    rng: np.random.Generator,
+) -> dict[str, np.ndarray]:
+    """Power-law book and tag popularity and user activity, with each user drawing
+    a `taste` share of their books from a few favourite tags."""
+    tag_pop = _zipf_weights(n_tags, 1.1, rng)
+    book_pop = _zipf_weights(n_books, 0.9, rng)
+
+    tags_per_book = np.minimum(1 + rng.poisson(1.5, size=n_books), min(5, n_tags))
+    bt_books = np.repeat(np.arange(n_books), tags_per_book)
+    bt_tags = np.concatenate([rng.choice(n_tags, size=c, replace=False, p=tag_pop) for c in tags_per_book])
+    order = np.argsort(bt_tags, kind="stable")
+    postings = np.split(bt_books[order], np.cumsum(np.bincount(bt_tags, minlength=n_tags))[:-1])
+
+    activity = rng.pareto(1.5, size=n_users) + 1.0
+    counts = np.clip(np.round(activity * mean_interactions / activity.mean()), 1, n_books // 2).astype(int)
+
+    users, books = [], []
+    for u, count in enumerate(counts):
+        favourites = rng.choice(n_tags, size=min(3, n_tags), replace=False, p=tag_pop)
+        liked = np.unique(np.concatenate([postings[t] for t in favourites]))
+        n_taste = min(rng.binomial(count, taste), liked.size)
+        picks = []
+        if n_taste:
+            p = book_pop[liked] / book_pop[liked].sum()
+            picks.append(rng.choice(liked, size=n_taste, replace=False, p=p))
+        picks.append(rng.choice(n_books, size=count - n_taste, p=book_pop))
+        chosen = np.unique(np.concatenate(picks))
+        users.append(np.full(chosen.size, u))
+        books.append(chosen)
+    users = np.concatenate(users)
+    books = np.concatenate(books)
+    # a borrow is 1.0; roughly a third also carry a review adding rating / 5
+    weights = 1.0 + (rng.random(users.size) < 0.3) * rng.integers(1, 6, size=users.size) / 5.0
+    return {
+        "users": users,
+        "books": books,
+        "weights": weights.astype(np.float32),
+        "timestamps": rng.random(users.size),
+        "book_tag_books": bt_books,
+        "book_tag_tags": bt_tags,
+    }
+
+
+def load_dataset(path: str) -> dict[str, np.ndarray]:
+    with np.load(path, allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    arr = np.asarray(samples) * 1000.0
+    return {f"p{p}": round(float(np.percentile(arr, p)), 3) for p in (50, 95, 99)}
+
+
+class _PeakMemory:
+    """Peak Python/numpy heap growth (tracemalloc) inside the block, in MB."""
+
+    def __enter__(self) -> "_PeakMemory":
+        tracemalloc.start()
+        self.peak_mb = 0.0
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.peak_mb = round(peak / 2**20, 2)
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return round(rss / 2**20 if sys.platform == "darwin" else rss / 2**10, 2)
+
+
+def _accuracy(recommended: list[list[str]], held_out: list[set[str]], k: int) -> dict[str, float]:
+    hits = [len(held.intersection(recs[:k])) for recs, held in zip(recommended, held_out)]
+    n = max(len(hits), 1)
+    return {
+        f"precision@{k}": round(sum(h / k for h in hits) / n, 4),
+        f"recall@{k}": round(sum(h / len(held) for h, held in zip(hits, held_out)) / n, 4),
+        "coverage": round(len({b for recs in recommended for b in recs[:k]}) / max(len(recommended) * k, 1), 4),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    rng = np.random.default_rng(args.seed)
+    if args.load:
+        data = load_dataset(args.load)
+    else:
+        data = synthetic_dataset(args.users, args.books, args.tags, args.interactions, args.taste, rng)
+        if args.save:
+            np.savez_compressed(args.save, **data)
+
+    users = data["users"].astype(str)
+    books = data["books"].astype(str)
+    cut = np.quantile(data["timestamps"], 1.0 - args.holdout)
+    train = data["timestamps"] < cut
+    train_data = InteractionMatrix.from_arrays(users[train], books[train], data["weights"][train])
+
+    held_out: dict[str, set[str]] = {}
+    for u, b in zip(users[~train].tolist(), books[~train].tolist()):
+        held_out.setdefault(u, set()).add(b)
+    eval_users = sorted(u for u in held_out if train_data.user_index(u) is not None)
+    if len(eval_users) > args.eval_users:
+        eval_users = sorted(rng.choice(eval_users, size=args.eval_users, replace=False).tolist())
+    truth = [held_out[u] for u in eval_users]
+    seen = []
+    for u in eval_users:
+        row = train_data.user_index(u)
+        cols = train_data.matrix.indices[train_data.matrix.indptr[row] : train_data.matrix.indptr[row + 1]]
+        seen.append(set(train_data.book_ids[cols].tolist()))
+
+    results: dict = {
+        "dataset": {
+            "source": args.load or "synthetic",
+            "users": int(np.unique(users).size),
+            "books": int(np.unique(books).size),
+            "interactions": int(users.size),
+            "train_interactions": int(train.sum()),
+            "holdout": args.holdout,
+            "eval_users": len(eval_users),
+        },
+        "k": args.k,
+    }
+
+    # ALS: train on the pre-cutoff log, score each user against the full item factors
+    als = ALSRecommender(factors=args.factors, iterations=args.iterations, alpha=args.alpha)
+    with _PeakMemory() as mem:
+        started = time.perf_counter()
+        user_factors, item_factors = als.fit(train_data.matrix)
+        train_seconds = time.perf_counter() - started
+    book_ids = train_data.book_ids.tolist()
+    book_index = {b: i for i, b in enumerate(book_ids)}
+    recommended, latency = [], []
+    for u, exclude in zip(eval_users, seen):
+        t0 = time.perf_counter()
+        scores = als.score_with_factors(
+            user_factors[train_data.user_index(u)], item_factors, book_ids, exclude, args.k, book_index
+        )
+        latency.append(time.perf_counter() - t0)
+        recommended.append([b for b, _ in scores])
+    results["ml_als"] = {
+        "params": {"factors": args.factors, "iterations": args.iterations, "alpha": args.alpha},
+        "train_seconds": round(train_seconds, 3),
+        "train_peak_mb": mem.peak_mb,
+        "latency_ms": percentiles(latency),
+        **_accuracy(recommended, truth, args.k),
+    }
+
+    # content-based: tag weights = borrow counts per tag, as the preference job computes them
+    book_tags: dict[str, list[str]] = {}
+    for b, t in zip(data["book_tag_books"].astype(str).tolist(), data["book_tag_tags"].astype(str).tolist()):
+        book_tags.setdefault(b, []).append(t)
+    content = ContentBasedRecommender()
+    with _PeakMemory() as mem:
+        started = time.perf_counter()
+        matrix = BookTagMatrix.from_book_tags(book_tags)
+        build_seconds = time.perf_counter() - started
+    recommended, latency = [], []
+    for exclude in seen:
+        prefs: dict[str, float] = {}
+        for b in exclude:
+            for t in book_tags.get(b, []):
+                prefs[t] = prefs.get(t, 0.0) + 1.0
+        t0 = time.perf_counter()
+        scores = content.recommend_with_matrix(prefs, matrix, exclude, args.k)
+        latency.append(time.perf_counter() - t0)
+        recommended.append([b for b, _ in scores])
+    results["content"] = {
+        "train_seconds": round(build_seconds, 3),
+        "train_peak_mb": mem.peak_mb,
+        "latency_ms": percentiles(latency),
+        **_accuracy(recommended, truth, args.k),
+    }
+
+    # most-borrowed books before the cutoff; the floor any model has to beat
+    popularity = np.asarray(train_data.matrix.getnnz(axis=0)).argsort(kind="stable")[::-1]
+    ranked = train_data.book_ids[popularity[: args.k + max((len(s) for s in seen), default=0)]].tolist()
+    recommended = [[b for b in ranked if b not in exclude][: args.k] for exclude in seen]
+    results["popularity"] = _accuracy(recommended, truth, args.k)
+
+    results["max_rss_mb"] = _max_rss_mb()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load", help="dataset .npz to evaluate instead of synthetic data")
+    parser.add_argument("--save", help="write the synthetic dataset to this .npz")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--interactions", type=float, default=20.0, help="mean interactions per user")
+    parser.add_argument("--taste", type=float, default=0.7, help="share of a user's books from favourite tags")
+    parser.add_argument("--holdout", type=float, default=0.2, help="newest fraction of the log held out")
+    parser.add_argument("--eval-users", type=int, default=2_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factors", type=int, default=settings.ALS_FACTORS)
+    parser.add_argument("--iterations", type=int, default=settings.ALS_ITERATIONS)
+    parser.add_argument("--alpha", type=float, default=settings.ALS_ALPHA)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    report = json.dumps(run(args), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import time
+from datetime import datetime
+
 from celery import Celery, signals
 from .config import settings
 from app.core.logging import configure_logging
-from app.core.metrics import TASK_SUCCESS, TASK_FAILURE, TASK_RETRY
+from app.core.metrics import TASK_SUCCESS, TASK_FAILURE, TASK_RETRY, TASK_QUEUE_WAIT_SECONDS
 
 
 celery_app = Celery(
@@ -11,10 +14,46 @@ celery_app = Celery(
 )
 
 celery_app.conf.task_routes = {
-    "app.workers.tasks.summarize_book": {"queue": "llm"},
+    # parsing is CPU-bound and LLM calls are IO-bound; each queue gets a pool sized for its work
+    "app.workers.tasks.summarize_book": {"queue": "extract"},
+    "app.workers.tasks.generate_summary": {"queue": "llm"},
     "app.workers.tasks.update_review_consensus": {"queue": "llm"},
+    "app.workers.tasks.evict_summary_cache": {"queue": "celery"},
+    "app.workers.tasks.advance_summary_backfill": {"queue": "celery"},
     "app.workers.tasks.recompute_user_preferences": {"queue": "recs"},
+    "app.workers.tasks.apply_preference_delta": {"queue": "recs"},
+    "app.workers.tasks.reconcile_user_preferences": {"queue": "recs"},
     "app.workers.tasks.recompute_recommendations": {"queue": "recs"},
+    "app.workers.tasks.train_als_model": {"queue": "recs"},
+    "app.workers.tasks.recommend_all_users": {"queue": "recs"},
+    "app.workers.tasks.compact_recommendation_snapshots": {"queue": "recs"},
+}
+
+celery_app.conf.beat_schedule = {
+    "train-als-model": {
+        "task": "app.workers.tasks.train_als_model",
+        "schedule": settings.ALS_TRAIN_INTERVAL_MINUTES * 60,
+    },
+    "recommend-all-users": {
+        "task": "app.workers.tasks.recommend_all_users",
+        "schedule": settings.RECS_BATCH_INTERVAL_MINUTES * 60,
+    },
+    "reconcile-user-preferences": {
+        "task": "app.workers.tasks.reconcile_user_preferences",
+        "schedule": settings.RECS_PREFS_RECONCILE_MINUTES * 60,
+    },
+    "compact-recommendation-snapshots": {
+        "task": "app.workers.tasks.compact_recommendation_snapshots",
+        "schedule": settings.RECS_COMPACTION_INTERVAL_MINUTES * 60,
+    },
+    "evict-summary-cache": {
+        "task": "app.workers.tasks.evict_summary_cache",
+        "schedule": settings.SUMMARY_CACHE_EVICT_INTERVAL_MINUTES * 60,
+    },
+    "advance-summary-backfill": {
+        "task": "app.workers.tasks.advance_summary_backfill",
+        "schedule": settings.SUMMARY_BACKFILL_TICK_SECONDS,
+    },
 }
 
 celery_app.autodiscover_tasks(["app.workers"])
@@ -37,3 +76,32 @@ def _task_failure(sender=None, **kwargs):
 @signals.task_retry.connect
 def _task_retry(sender=None, **kwargs):
     TASK_RETRY.labels(task=sender.name if sender else "unknown").inc()
+
+
+@signals.before_task_publish.connect
+def _stamp_sent_at(headers=None, **kwargs):
+    if headers is not None:
+        # overwritten on retry, so the wait is measured per attempt
+        headers["sent_at"] = time.time()
+
+
+@signals.task_prerun.connect
+def _task_prerun(task=None, **kwargs):
+    sent_at = getattr(task.request, "sent_at", None) if task else None
+    if not sent_at:
+        return
+    eta = task.request.eta
+    if eta:
+        # a countdown is intended delay, not queueing
+        eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+        sent_at = max(sent_at, eta.timestamp())
+    TASK_QUEUE_WAIT_SECONDS.labels(task=task.name).observe(max(0.0, time.time() - sent_at))
+
+
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def _close_llm_provider(**kwargs):
+    # the LLM client's pooled connections live as long as the process; close them with it
+    from app.providers.llm import reset_llm_provider
+
+    reset_llm_provider()
@@ -30,12 +30,71 @@ class Settings(BaseSettings):
     MAX_UPLOAD_MB: int = 25
 
     # LLM
-    LLM_PROVIDER: str = "ollama"
+    LLM_PROVIDER: str = "ollama"  # ollama | fake (synthetic latency, for load tests)
     OLLAMA_BASE_URL: str = "http://ollama:11434"
     OLLAMA_MODEL: str = "mistral"
+    OLLAMA_TIMEOUT_SECONDS: float = 120.0
+    OLLAMA_MAX_INFLIGHT: int = 2  # requests in flight per process; match the server's OLLAMA_NUM_PARALLEL
+    OLLAMA_KEEPALIVE_SECONDS: float = 60.0  # idle pooled HTTP connections are closed after this
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a request; "" = server default
+    LLM_NUM_CTX: int = 4096  # context window requested per call (num_ctx); prompts are packed to fit it
+    FAKE_LLM_LATENCY_MS: float = 800.0  # median time to first token of the fake provider
+    FAKE_LLM_LATENCY_SIGMA: float = 0.5  # log-normal spread of that latency; 0 = constant
+    FAKE_LLM_TOKENS_PER_SECOND: float = 30.0
+    FAKE_LLM_OUTPUT_TOKENS: int = 200  # upper bound on generated tokens per call
+    FAKE_LLM_FAILURE_RATE: float = 0.0  # share of calls that raise
+    FAKE_LLM_SEED: int = 0
+    SUMMARY_PROMPT_VERSION: str = "v3"  # bump when summary prompts change; part of the summary cache key
+    SUMMARY_CHUNK_TOKENS: int = 1500  # estimated tokens per section sent to the LLM (capped by LLM_NUM_CTX)
+    SUMMARY_NUM_PREDICT: int = 400  # max tokens generated per summary call
+    SUMMARY_CONCURRENCY: int = 2  # section summaries in flight per book
+    SUMMARY_REDUCE_FANIN: int = 8  # partial summaries merged per reduce call
+    SUMMARY_MAX_INPUT_TOKENS: int = 300_000  # summaries read at most this much of the extracted text
+    EXTRACT_SPOOL_MB: int = 8  # uploads and text artifacts larger than this are spooled to disk during extraction
+    SUMMARY_CACHE_TTL_DAYS: int = 180  # cached summaries unused this long are evicted
+    SUMMARY_CACHE_MAX_ENTRIES: int = 100_000  # beyond this, least recently used entries are evicted
+    SUMMARY_CACHE_EVICT_INTERVAL_MINUTES: int = 1440
+    SUMMARY_CACHE_EVICT_BATCH: int = 1000  # rows deleted per transaction
+    SUMMARY_BACKFILL_RATE_PER_MINUTE: float = 30.0  # default enqueue rate of a re-summarization backfill
+    SUMMARY_BACKFILL_MAX_INFLIGHT: int = 4  # backfill pauses while this many summaries are pending/running
+    SUMMARY_BACKFILL_BATCH: int = 100  # most summaries enqueued per tick
+    SUMMARY_BACKFILL_TICK_SECONDS: float = 15.0
+    SUMMARY_BACKFILL_STALL_MINUTES: int = 60  # pending/running longer than this = task lost; retried
+    REVIEW_CONSENSUS_MODE: str = "incremental"  # incremental (revise with new reviews) | full (rebuild every run)
+    REVIEW_CONSENSUS_DEBOUNCE_SECONDS: float = 30.0  # reviews on one book within this window share one run; 0 = off
+    REVIEW_CONSENSUS_NUM_PREDICT: int = 300  # max tokens generated per consensus call
+    PROGRESS_TTL_SECONDS: int = 3600  # live generation progress is kept this long after its last update
+    PROGRESS_POLL_SECONDS: float = 0.25  # how often SSE streams check for new progress
+    PROGRESS_STREAM_MAX_SECONDS: int = 900  # SSE streams close after this; clients reconnect
 
     # Recommendations
     RECS_PROVIDER: str = "ml_als"  # ml_als | content
+    ALS_FACTORS: int = 64
+    ALS_ITERATIONS: int = 10
+    ALS_ALPHA: float = 40.0
+    ALS_TRAIN_INTERVAL_MINUTES: int = 60
+    ALS_MODEL_MAX_AGE_HOURS: float = 6.0  # older models trigger a retrain
+    ALS_MODEL_RELOAD_SECONDS: int = 60  # how often API/workers check for a newer model
+    ALS_MODEL_RETENTION: int = 3  # model and neighbour-table versions kept in storage; older ones are deleted after each build
+    ALS_ANN_MIN_ITEMS: int = 50_000  # build an IVF-PQ index at training time for catalogs this large
+    ALS_ANN_LISTS: int = 0  # IVF lists; 0 = sqrt(items)
+    ALS_ANN_SUBVECTORS: int = 16  # PQ codes per item
+    ALS_ANN_PROBES: int = 64  # lists scanned per query; recall@10 ~0.9 with re-ranking (test_ivfpq_recall_floor)
+    ALS_ANN_RERANK: int = 4  # exact re-rank of limit * N PQ candidates; 0 = PQ scores only
+    RECS_SNAPSHOT_TTL_SECONDS: int = 900  # older snapshots are served but refreshed in the background
+    RECS_BATCH_INTERVAL_MINUTES: int = 1440  # full "recommend for all users" run
+    RECS_BATCH_SIZE: int = 1000  # users scored per batch
+    RECS_BATCH_WRITE_CHUNK: int = 5000  # rows per multi-row INSERT
+    RECS_BATCH_LIMIT: int = 20
+    RECS_PREFS_MODE: str = "incremental"  # incremental (per-borrow deltas) | full (recompute on every borrow)
+    RECS_RECOMPUTE_DEBOUNCE_SECONDS: float = 5.0  # borrow/return bursts per user share one prefs->recs chain; 0 = off
+    RECS_PREFS_RECONCILE_MINUTES: int = 1440  # full rebuild of tag weights to correct delta drift
+    RECS_SNAPSHOT_RETENTION: int = 3  # newest snapshots kept per user by compaction
+    RECS_COMPACTION_INTERVAL_MINUTES: int = 60
+    RECS_COMPACTION_BATCH: int = 5000  # snapshots deleted per transaction
+    RECS_SIMILAR_NEIGHBOURS: int = 50  # neighbours stored per book in the "similar books" table
+    RECS_SIMILAR_BLOCK_MB: int = 256  # scratch memory per scoring block of the neighbour build
+    RECS_CACHE_DIR: str = "./cache"  # local copies of model arrays that API workers memory-map
 
     # Celery/Redis
     REDIS_URL: str = "redis://redis:6379/0"
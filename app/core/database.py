@@ -1,11 +1,16 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import logging
+from typing import Callable
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .config import settings
 
+logger = logging.getLogger(__name__)
 
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_AFTER_COMMIT = "after_commit_callbacks"
+
 
 class Base(DeclarativeBase):
     pass
@@ -21,3 +26,28 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+def after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """Run `callback` once the session's current transaction commits; dropped on rollback.
+
+    For side effects that must not see uncommitted state, such as enqueueing a
+    task that reads the rows being written or deleting files they replace.
+    Callbacks run in registration order; a failing one is logged, not raised,
+    since the transaction has already committed.
+    """
+    db.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    for callback in session.info.pop(_AFTER_COMMIT, []):
+        try:
+            callback()
+        except Exception:
+            logger.exception("after-commit callback failed")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit(session: Session) -> None:
+    session.info.pop(_AFTER_COMMIT, None)
@@ -0,0 +1,47 @@
+"""Short per-key windows used to coalesce bursts of background work.
+
+`claim(key, seconds)` returns True for the first caller in a window and False for
+everyone else until it expires. Backed by Redis `SET NX PX`, so the window is
+shared by every API process; when Redis is unavailable (local runs, tests) it
+falls back to a process-local map with the same semantics.
+"""
+import threading
+import time
+
+import redis
+
+from app.core.redis import get_redis
+
+_KEY_PREFIX = "luminalib:debounce:"
+
+_lock = threading.Lock()
+_local: dict[str, float] = {}
+
+
+def _claim_local(key: str, seconds: float) -> bool:
+    now = time.monotonic()
+    with _lock:
+        if _local.get(key, float("-inf")) > now:
+            return False
+        if len(_local) > 10_000:
+            for k in [k for k, expires in _local.items() if expires <= now]:
+                del _local[k]
+        _local[key] = now + seconds
+        return True
+
+
+def claim(key: str, seconds: float) -> bool:
+    if seconds <= 0:
+        return True
+    client = get_redis()
+    if client is not None:
+        try:
+            return bool(client.set(_KEY_PREFIX + key, b"1", nx=True, px=max(1, int(seconds * 1000))))
+        except redis.RedisError:
+            pass
+    return _claim_local(key, seconds)
+
+
+def reset_local_windows() -> None:
+    with _lock:
+        _local.clear()
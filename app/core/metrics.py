@@ -1,5 +1,100 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 TASK_SUCCESS = Counter("celery_task_success_total", "Successful Celery tasks", ["task"])
 TASK_FAILURE = Counter("celery_task_failure_total", "Failed Celery tasks", ["task"])
 TASK_RETRY = Counter("celery_task_retry_total", "Retried Celery tasks", ["task"])
+
+RECS_BATCH_USERS = Counter("recs_batch_users_total", "Users scored by the batch recommendation job", ["provider"])
+RECS_BATCH_DURATION = Histogram(
+    "recs_batch_duration_seconds",
+    "Wall time of a full batch recommendation run",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+RECS_BATCH_THROUGHPUT = Gauge("recs_batch_users_per_second", "Users/sec achieved by the last batch recommendation run")
+RECS_FOLD_IN_SECONDS = Histogram(
+    "recs_fold_in_seconds",
+    "Time to fold a user's current interactions into the ALS model",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+RECS_SNAPSHOTS_COMPACTED = Counter(
+    "recs_snapshots_compacted_total", "Recommendation snapshots deleted by retention compaction"
+)
+RECS_RECOMPUTE_COLLAPSED = Counter(
+    "recs_recompute_collapsed_total",
+    "Recompute tasks not enqueued because a pending chain already covers the user",
+    ["task"],
+)
+TEXT_EXTRACT_PAGES = Histogram(
+    "text_extract_pages",
+    "Pages extracted per book file",
+    ["format"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+TEXT_EXTRACT_SECONDS = Histogram(
+    "text_extract_seconds",
+    "Time to extract the text of one book file",
+    ["format"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+SUMMARY_CACHE_HITS = Counter("summary_cache_hits_total", "Book summaries served from the content-hash cache")
+SUMMARY_CACHE_MISSES = Counter("summary_cache_misses_total", "Book summaries that had to be generated by the LLM")
+SUMMARY_CACHE_EVICTED = Counter("summary_cache_evicted_total", "Cached summaries deleted by the retention policy")
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds",
+    "Wall time of one LLM generate call, including time queued in the server",
+    ["model", "outcome"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens processed by the LLM", ["model", "kind"])
+LLM_INFLIGHT = Gauge("llm_requests_in_flight", "LLM generate calls currently waiting on the server")
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "llm_first_token_seconds",
+    "Time from sending a streaming LLM request to its first chunk",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+REVIEW_CONSENSUS_REVIEWS = Counter(
+    "review_consensus_reviews_total",
+    "Reviews sent to the LLM by consensus runs (incremental revision or full rebuild)",
+    ["mode"],
+)
+REVIEW_CONSENSUS_COLLAPSED = Counter(
+    "review_consensus_collapsed_total", "Consensus runs not enqueued because one is already pending for the book"
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Estimated tokens of each prompt sent to the LLM",
+    ["task"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 3072, 4096, 8192, 16384),
+)
+LLM_TOKEN_ESTIMATE_RATIO = Gauge(
+    "llm_token_estimate_ratio", "Calibration factor from estimated to reported prompt tokens", ["model"]
+)
+TEXT_ARTIFACT_READS = Counter(
+    "text_artifact_reads_total",
+    "Book text reads, served from the stored artifact or extracted from the upload first",
+    ["source"],
+)
+TASK_STAGE_SECONDS = Histogram(
+    "task_stage_seconds",
+    "Time spent in each stage of a summary or consensus task (fetch, extract, generate, commit)",
+    ["task", "stage"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+SUMMARY_BACKFILL_ENQUEUED = Counter(
+    "summary_backfill_enqueued_total", "Stale summaries enqueued for regeneration by the summary backfill"
+)
+SUMMARY_BACKFILL_REMAINING = Gauge(
+    "summary_backfill_remaining", "Stale summaries the running backfill has not enqueued yet"
+)
+SUMMARY_BACKFILL_IN_FLIGHT = Gauge("summary_backfill_in_flight", "Summaries pending or running at the last backfill tick")
+SUMMARY_BACKFILL_PROGRESS = Gauge("summary_backfill_progress_ratio", "Share of the running backfill already enqueued")
+SUMMARY_BACKFILL_ETA_SECONDS = Gauge(
+    "summary_backfill_eta_seconds", "Estimated time until the running backfill has enqueued everything"
+)
+TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time from publishing a task (or its countdown/eta) to a worker starting it",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
@@ -0,0 +1,115 @@
+"""Live progress of long-running generations, read by the SSE endpoints.
+
+A channel (e.g. `summary:<book_id>`) has a small JSON state (status, stage,
+counts, error) and an append-only text buffer that the worker extends as tokens
+arrive. Readers poll with a byte offset and receive only what was appended
+since. Backed by Redis so API processes see worker progress; when Redis is
+unavailable it falls back to a process-local map (local runs, tests). Entries
+expire `PROGRESS_TTL_SECONDS` after their last write.
+"""
+import json
+import threading
+import time
+import uuid
+from typing import Any
+
+import redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+_KEY_PREFIX = "luminalib:progress:"
+
+_lock = threading.Lock()
+# channel -> (state, text, expires_at)
+_local: dict[str, tuple[dict[str, Any], bytes, float]] = {}
+
+
+def _keys(channel: str) -> tuple[str, str]:
+    return f"{_KEY_PREFIX}{channel}:state", f"{_KEY_PREFIX}{channel}:text"
+
+
+def _write(channel: str, state: dict[str, Any] | None = None, text: bytes | None = None, append: bytes = b"") -> None:
+    ttl = settings.PROGRESS_TTL_SECONDS
+    client = get_redis()
+    if client is not None:
+        state_key, text_key = _keys(channel)
+        try:
+            pipe = client.pipeline(transaction=False)
+            if state is not None:
+                pipe.set(state_key, json.dumps(state), ex=ttl)
+            if text is not None:
+                pipe.set(text_key, text, ex=ttl)
+            if append:
+                pipe.append(text_key, append)
+                pipe.expire(text_key, ttl)
+            pipe.expire(state_key, ttl)
+            pipe.execute()
+            return
+        except redis.RedisError:
+            pass
+    now = time.monotonic()
+    with _lock:
+        old_state, old_text, expires = _local.get(channel, ({}, b"", 0.0))
+        if expires <= now:
+            old_state, old_text = {}, b""
+        _local[channel] = (
+            state if state is not None else old_state,
+            (text if text is not None else old_text) + append,
+            now + ttl,
+        )
+
+
+def read(channel: str, offset: int = 0) -> tuple[dict[str, Any] | None, str, int]:
+    """(state or None when the channel is unknown, text appended after `offset`, new offset)."""
+    client = get_redis()
+    if client is not None:
+        state_key, text_key = _keys(channel)
+        try:
+            raw_state, chunk = client.pipeline(transaction=False).get(state_key).getrange(text_key, offset, -1).execute()
+            state = json.loads(raw_state) if raw_state else None
+            return state, chunk.decode("utf-8", errors="ignore"), offset + len(chunk)
+        except redis.RedisError:
+            pass
+    with _lock:
+        entry = _local.get(channel)
+    if entry is None or entry[2] <= time.monotonic():
+        return None, "", offset
+    state, text, _ = entry
+    chunk = text[offset:]
+    return dict(state), chunk.decode("utf-8", errors="ignore"), offset + len(chunk)
+
+
+class Progress:
+    """Writer side of one channel.
+
+    Every state carries the id of the run that wrote it; a retry starts a new run
+    with an empty buffer, and readers seeing a new id re-read from offset 0. A
+    later stage of the same job passes the `run` it was handed to continue it.
+    """
+
+    def __init__(self, channel: str, run: str | None = None):
+        self.channel = channel
+        self.run = run or uuid.uuid4().hex
+
+    def start(self) -> None:
+        _write(self.channel, state={"run": self.run, "status": "running"}, text=b"")
+
+    def stage(self, stage: str, done: int, total: int) -> None:
+        _write(self.channel, state={"run": self.run, "status": "running", "stage": stage, "done": done, "total": total})
+
+    def append(self, text: str) -> None:
+        if text:
+            _write(self.channel, append=text.encode("utf-8"))
+
+    def finish(self, status: str, text: str | None = None, error: str | None = None) -> None:
+        """Final state; `text` replaces the buffer with the authoritative result."""
+        state: dict[str, Any] = {"run": self.run, "status": status}
+        if error:
+            state["error"] = error
+        _write(self.channel, state=state, text=text.encode("utf-8") if text is not None else None)
+
+
+def reset_local_progress() -> None:
+    with _lock:
+        _local.clear()
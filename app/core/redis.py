@@ -0,0 +1,47 @@
+import logging
+import threading
+import time
+
+import redis
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_RETRY_SECONDS = 30.0
+
+_lock = threading.Lock()
+_client: redis.Redis | None = None
+_retry_at = float("-inf")
+
+
+def get_redis() -> redis.Redis | None:
+    """Process-wide Redis client, or None while Redis is unreachable.
+
+    A failed connection is re-probed at most every 30s, so callers can fall back
+    to process-local state without paying a connect timeout per call.
+    """
+    global _client, _retry_at
+    if _client is not None:
+        return _client
+    if time.monotonic() < _retry_at:
+        return None
+    with _lock:
+        if _client is not None:
+            return _client
+        client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.25, socket_timeout=0.25)
+        try:
+            client.ping()
+        except redis.RedisError:
+            logger.warning("Redis unavailable at %s; using process-local fallback", settings.REDIS_URL)
+            _retry_at = time.monotonic() + _RETRY_SECONDS
+            return None
+        _client = client
+        return _client
+
+
+def reset_redis() -> None:
+    global _client, _retry_at
+    with _lock:
+        _client = None
+        _retry_at = float("-inf")
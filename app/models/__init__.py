@@ -6,13 +6,15 @@ from sqlalchemy import (
     String,
     Text,
     Integer,
+    BigInteger,
     Float,
     DateTime,
     ForeignKey,
+    LargeBinary,
     UniqueConstraint,
     Index,
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -65,6 +67,13 @@ class BookFile(Base):
     mime_type = Column(String(100), nullable=True)
     size_bytes = Column(Integer, nullable=True)
     original_filename = Column(String(255), nullable=True)
+    content_sha256 = Column(String(64), nullable=True, index=True)  # of the uploaded bytes
+    # extracted text, stored gzip-compressed next to the upload (see BookTextService)
+    text_object_key = Column(String(600), nullable=True)
+    text_version = Column(String(20), nullable=True)  # extraction/normalization version that wrote it
+    text_sha256 = Column(String(64), nullable=True)  # of the normalized UTF-8 text
+    text_chars = Column(Integer, nullable=True)
+    text_page_offsets = Column(ARRAY(Integer), nullable=True)  # char offset of each PDF page
 
 
 class BookAISummary(Base):
@@ -81,6 +90,63 @@ class BookAISummary(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
+class SummaryBackfill(Base):
+    """Re-summarization of every book whose summary predates the current prompt version or model.
+
+    Advanced by the beat task `advance_summary_backfill`; `cursor` is the last
+    book_id enqueued (keyset order), so an interrupted run resumes after it.
+    """
+
+    __tablename__ = "summary_backfills"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    prompt_version = Column(String(50), nullable=False)  # target
+    model_name = Column(String(100), nullable=False)  # target
+    status = Column(String(20), nullable=False, default="running", index=True)  # running | completed | cancelled
+    cursor = Column(UUID(as_uuid=True), nullable=True)
+    total = Column(Integer, nullable=False, default=0)  # stale summaries when started
+    enqueued = Column(Integer, nullable=False, default=0)
+    rate_per_minute = Column(Float, nullable=False)
+    max_inflight = Column(Integer, nullable=False)
+    credit = Column(Float, nullable=False, default=0.0)  # unspent rate allowance, in tasks
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_tick_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BookSummaryChunk(Base):
+    """Partial map-reduce summary (level 0 = book section), kept until the final summary is saved."""
+
+    __tablename__ = "book_summary_chunks"
+    __table_args__ = (UniqueConstraint("book_id", "level", "idx", name="uq_book_summary_chunks_book_level_idx"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    book_id = Column(UUID(as_uuid=True), ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    level = Column(Integer, nullable=False)
+    idx = Column(Integer, nullable=False)
+    source_hash = Column(String(64), nullable=False)  # sha256 of prompt + input text
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SummaryCacheEntry(Base):
+    """Finished summary for a file's content, shared by every book uploaded with the same bytes."""
+
+    __tablename__ = "summary_cache"
+    __table_args__ = (
+        UniqueConstraint("content_sha256", "prompt_version", "model_name", name="uq_summary_cache_key"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    content_sha256 = Column(String(64), nullable=False)
+    prompt_version = Column(String(50), nullable=False)
+    model_name = Column(String(100), nullable=False)
+    summary = Column(Text, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 class BookReviewConsensus(Base):
     __tablename__ = "book_review_consensus"
     __table_args__ = (UniqueConstraint("book_id", name="uq_book_review_consensus_book_id"),)
@@ -92,6 +158,9 @@ class BookReviewConsensus(Base):
     prompt_version = Column(String(50), nullable=False)
     consensus = Column(Text, nullable=True)
     error_message = Column(Text, nullable=True)
+    # watermark: the consensus covers `reviews_included` reviews, created up to `reviews_through`
+    reviews_through = Column(DateTime, nullable=True)
+    reviews_included = Column(Integer, nullable=False, default=0)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
@@ -104,6 +173,8 @@ class Borrow(Base):
     borrowed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     due_at = Column(DateTime, nullable=True)
     returned_at = Column(DateTime, nullable=True)
+    # set with the incremental preference delta, so a retried task never applies it twice
+    prefs_applied_at = Column(DateTime, nullable=True)
 
 
 Index(
@@ -133,6 +204,9 @@ class Review(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
+Index("ix_reviews_book_created", Review.book_id, Review.created_at)
+
+
 class Tag(Base):
     __tablename__ = "tags"
 
@@ -168,6 +242,15 @@ class RecommendationSnapshot(Base):
     provider = Column(String(50), nullable=True)
 
 
+# newest-first per user, covering every column, so latest_snapshot is an index-only seek
+Index(
+    "ix_recommendation_snapshots_user_latest",
+    RecommendationSnapshot.user_id,
+    RecommendationSnapshot.generated_at.desc(),
+    postgresql_include=["id", "provider"],
+)
+
+
 class RecommendationItem(Base):
     __tablename__ = "recommendation_items"
     __table_args__ = (UniqueConstraint("snapshot_id", "book_id", name="uq_recommendation_items_snapshot_book"),)
@@ -177,3 +260,24 @@ class RecommendationItem(Base):
     book_id = Column(UUID(as_uuid=True), ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
     score = Column(Float, nullable=False)
     rank = Column(Integer, nullable=False)
+
+
+class UserFactorOverlay(Base):
+    """Folded-in ALS user vector, valid only for the model version it was solved against."""
+
+    __tablename__ = "user_factor_overlays"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    model_version = Column(String(50), nullable=False)
+    factors = Column(LargeBinary, nullable=False)  # float32 bytes
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class CatalogVersion(Base):
+    """Monotonic counter bumped in the same transaction as any catalog/tag change."""
+
+    __tablename__ = "catalog_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -1,8 +1,36 @@
+import os
+import threading
 from app.core.config import settings
+from .fake import FakeLLMProvider
 from .ollama import OllamaProvider
 from .base import LLMProvider
 
+_lock = threading.Lock()
+_provider: LLMProvider | None = None
+_pid: int | None = None
+
 
 def get_llm_provider() -> LLMProvider:
-    # Only Ollama (mistral) is supported per requirements
-    return OllamaProvider()
+    """Process-wide provider, so its connection pool and in-flight cap are shared
+    by every caller. Rebuilt after a fork rather than sharing the parent's sockets."""
+    global _provider, _pid
+    if _provider is None or _pid != os.getpid():
+        with _lock:
+            if _provider is None or _pid != os.getpid():
+                if settings.LLM_PROVIDER == "fake":
+                    # synthetic latency for load tests and benchmarks; see FakeLLMProvider
+                    _provider = FakeLLMProvider()
+                else:
+                    # Only Ollama (mistral) is supported per requirements
+                    _provider = OllamaProvider()
+                _pid = os.getpid()
+    return _provider
+
+
+def reset_llm_provider() -> None:
+    global _provider, _pid
+    with _lock:
+        if _provider is not None and _pid == os.getpid():
+            _provider.close()
+        _provider = None
+        _pid = None
@@ -1,7 +1,33 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, AsyncIterator, Iterator
+
+_DONE = object()
 
 
 class LLMProvider(ABC):
     @abstractmethod
     def generate(self, prompt: str, params: dict[str, Any] | None = None) -> str: ...
+
+    async def agenerate(self, prompt: str, params: dict[str, Any] | None = None) -> str:
+        """Async generation; providers without a native client run `generate` in a thread."""
+        return await asyncio.to_thread(self.generate, prompt, params)
+
+    def stream(self, prompt: str, params: dict[str, Any] | None = None) -> Iterator[str]:
+        """Generated text in pieces as it is produced; by default all of it at once."""
+        yield self.generate(prompt, params)
+
+    async def astream(self, prompt: str, params: dict[str, Any] | None = None) -> AsyncIterator[str]:
+        """`stream` driven from a thread, one piece at a time, so both paths share one client and limiter."""
+        pieces = self.stream(prompt, params)
+        try:
+            while True:
+                piece = await asyncio.to_thread(next, pieces, _DONE)
+                if piece is _DONE:
+                    return
+                yield piece
+        finally:
+            await asyncio.to_thread(pieces.close)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,128 @@
+"""Token estimates and prompt packing for the configured model.
+
+There is no tokenizer for the served model in this process, so token counts are
+estimated from characters: Latin-script text at `CHARS_PER_TOKEN`, anything
+else (CJK, Cyrillic, symbols) at one token per character, which is close for
+Llama/Mistral-family vocabularies. The estimate is then calibrated per model
+against the `prompt_eval_count` Ollama reports for real prompts.
+
+`PromptBudget` turns `LLM_NUM_CTX` into the room left for input once the
+instructions and the reserved output (`num_predict`) are accounted for, and
+packs whole units (sentences, reviews, partial summaries) into it.
+"""
+import math
+import re
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import LLM_PROMPT_TOKENS, LLM_TOKEN_ESTIMATE_RATIO
+
+# English average for Llama/Mistral-family BPE vocabularies
+CHARS_PER_TOKEN = 4
+# share of the budget held back for estimation error
+SAFETY_MARGIN = 0.1
+
+_NARROW = re.compile(r"[\u0000-\u024f]")  # ASCII and Latin-extended
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?\s")
+
+
+class TokenEstimator:
+    """Character-based token estimate for one model, scaled by a running ratio
+    of actual to estimated prompt tokens."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.ratio = 1.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def raw(text: str) -> float:
+        narrow = len(_NARROW.findall(text))
+        return narrow / CHARS_PER_TOKEN + (len(text) - narrow)
+
+    def count(self, text: str) -> int:
+        return math.ceil(self.raw(text) * self.ratio)
+
+    def observe(self, text: str, actual_tokens: int | None) -> None:
+        estimate = self.raw(text)
+        if not actual_tokens or estimate < 32:
+            return
+        sample = actual_tokens / estimate
+        # far-off samples are prompt-cache hits (Ollama only counts uncached tokens) or template noise
+        if not 0.5 <= sample <= 2.5:
+            return
+        with self._lock:
+            self.ratio = 0.9 * self.ratio + 0.1 * sample
+            LLM_TOKEN_ESTIMATE_RATIO.labels(self.model).set(self.ratio)
+
+
+_lock = threading.Lock()
+_estimators: dict[str, TokenEstimator] = {}
+
+
+def get_estimator(model: str | None = None) -> TokenEstimator:
+    model = model or settings.OLLAMA_MODEL
+    estimator = _estimators.get(model)
+    if estimator is None:
+        with _lock:
+            estimator = _estimators.setdefault(model, TokenEstimator(model))
+    return estimator
+
+
+def cut_to_tokens(text: str, max_tokens: int, estimator: TokenEstimator | None = None) -> str:
+    """Longest prefix of `text` within `max_tokens`, ending on a sentence end when
+    one falls in the second half of the window."""
+    estimator = estimator or get_estimator()
+    tokens = estimator.count(text)
+    if tokens <= max_tokens:
+        return text
+    window = max(1, int(len(text) * max_tokens / tokens))
+    ends = [m.end() for m in _SENTENCE_END.finditer(text, 0, window)]
+    cut = ends[-1] if ends and ends[-1] > window // 2 else window
+    return text[:cut].strip()
+
+
+class PromptBudget:
+    """Room for input in one call: `num_ctx` minus the output reserved with
+    `num_predict`, the instructions and a safety margin."""
+
+    def __init__(
+        self,
+        task: str,
+        instructions: str,
+        num_predict: int,
+        num_ctx: int | None = None,
+        estimator: TokenEstimator | None = None,
+    ):
+        self.task = task
+        self.instructions = instructions
+        self.num_predict = num_predict
+        self.num_ctx = num_ctx or settings.LLM_NUM_CTX
+        self.estimator = estimator or get_estimator()
+        room = self.num_ctx - num_predict - self.estimator.count(instructions)
+        self.input_tokens = max(1, int(room * (1 - SAFETY_MARGIN)))
+
+    @property
+    def params(self) -> dict[str, Any]:
+        return {"options": {"num_ctx": self.num_ctx, "num_predict": self.num_predict}}
+
+    def pack(self, units: Sequence[str], reserved: int = 0, limit: int | None = None) -> int:
+        """How many leading `units` (joined by newlines) fit next to `reserved`
+        tokens of other input; always at least one, which may need `cut_to_tokens`."""
+        room = self.input_tokens - reserved
+        used = taken = 0
+        for unit in units[:limit]:
+            cost = self.estimator.count(unit) + 1
+            if taken and used + cost > room:
+                break
+            used += cost
+            taken += 1
+        return max(taken, 1) if units else 0
+
+    def prompt(self, body: str) -> str:
+        """Instructions plus input, recording the estimated prompt size."""
+        text = f"{self.instructions}\n\n{body}"
+        LLM_PROMPT_TOKENS.labels(self.task).observe(self.estimator.count(text))
+        return text
@@ -0,0 +1,98 @@
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+from app.core.config import settings
+from app.core.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_INFLIGHT, LLM_REQUEST_SECONDS, LLM_TOKENS
+from .base import LLMProvider
+from .budget import get_estimator
+
+_WORDS = (
+    "the book follows a reader through chapters of memory loss and discovery while "
+    "characters argue about time place and meaning until the ending resolves quietly"
+).split()
+
+
+class FakeLLMProvider(LLMProvider):
+    """Stand-in for Ollama with a configurable cost model (`LLM_PROVIDER=fake`).
+
+    Each call waits a log-normally distributed time to first token (median
+    `FAKE_LLM_LATENCY_MS`, spread `FAKE_LLM_LATENCY_SIGMA`), then generates
+    `num_predict` tokens (or `FAKE_LLM_OUTPUT_TOKENS`) at `FAKE_LLM_TOKENS_PER_SECOND`,
+    and fails with probability `FAKE_LLM_FAILURE_RATE`. The output text depends
+    only on the prompt; latencies and failures come from one RNG seeded with
+    `FAKE_LLM_SEED`, so a run is reproducible for a given call order. Like the
+    Ollama client it serves async callers from threads, caps in-flight calls per
+    process at `OLLAMA_MAX_INFLIGHT` and reports the same metrics, so worker sizing
+    measured against it carries over.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float | None = None,
+        latency_sigma: float | None = None,
+        tokens_per_second: float | None = None,
+        output_tokens: int | None = None,
+        failure_rate: float | None = None,
+        seed: int | None = None,
+        max_inflight: int | None = None,
+    ) -> None:
+        self.model = "fake"
+        self.latency_ms = settings.FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        self.latency_sigma = settings.FAKE_LLM_LATENCY_SIGMA if latency_sigma is None else latency_sigma
+        self.tokens_per_second = tokens_per_second or settings.FAKE_LLM_TOKENS_PER_SECOND
+        self.output_tokens = output_tokens or settings.FAKE_LLM_OUTPUT_TOKENS
+        self.failure_rate = settings.FAKE_LLM_FAILURE_RATE if failure_rate is None else failure_rate
+        self.max_inflight = max(1, max_inflight or settings.OLLAMA_MAX_INFLIGHT)
+        self._rng = random.Random(settings.FAKE_LLM_SEED if seed is None else seed)
+        self._rng_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+
+    def _plan(self, prompt: str, params: dict[str, Any] | None) -> tuple[float, float, list[str], bool]:
+        """(seconds to first token, seconds per token, output tokens, fail)."""
+        with self._rng_lock:
+            first = self.latency_ms / 1000.0 * self._rng.lognormvariate(0.0, self.latency_sigma)
+            fail = self._rng.random() < self.failure_rate
+        n = ((params or {}).get("options") or {}).get("num_predict") or self.output_tokens
+        n = min(n, self.output_tokens)
+        offset = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:4], "big")
+        words = [_WORDS[(offset + i) % len(_WORDS)] for i in range(n)]
+        return first, 1.0 / self.tokens_per_second, words, fail
+
+    @contextmanager
+    def _measure(self, prompt: str, completion_tokens: int):
+        LLM_INFLIGHT.inc()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield started
+            outcome = "ok"
+            LLM_TOKENS.labels(self.model, "prompt").inc(get_estimator(self.model).count(prompt))
+            LLM_TOKENS.labels(self.model, "completion").inc(completion_tokens)
+        finally:
+            LLM_INFLIGHT.dec()
+            LLM_REQUEST_SECONDS.labels(self.model, outcome).observe(time.perf_counter() - started)
+
+    def _first_token(self, started: float, fail: bool) -> None:
+        if fail:
+            raise RuntimeError("Fake LLM failure")
+        LLM_FIRST_TOKEN_SECONDS.labels(self.model).observe(time.perf_counter() - started)
+
+    def generate(self, prompt: str, params: dict[str, Any] | None = None) -> str:
+        first, per_token, words, fail = self._plan(prompt, params)
+        with self._slots, self._measure(prompt, len(words)) as started:
+            time.sleep(first)
+            self._first_token(started, fail)
+            time.sleep(per_token * len(words))
+            return " ".join(words)
+
+    def stream(self, prompt: str, params: dict[str, Any] | None = None) -> Iterator[str]:
+        first, per_token, words, fail = self._plan(prompt, params)
+        with self._slots, self._measure(prompt, len(words)) as started:
+            time.sleep(first)
+            self._first_token(started, fail)
+            for i, word in enumerate(words):
+                time.sleep(per_token)
+                yield word if i == 0 else " " + word
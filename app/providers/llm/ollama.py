@@ -1,28 +1,125 @@
 import httpx
 import json
-from typing import Any
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
 from app.core.config import settings
+from app.core.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_INFLIGHT, LLM_REQUEST_SECONDS, LLM_TOKENS
 from .base import LLMProvider
+from .budget import get_estimator
 
 
 class OllamaProvider(LLMProvider):
-    def __init__(self) -> None:
-        self.client = httpx.Client(base_url=settings.OLLAMA_BASE_URL, timeout=120.0)
-        self.model = settings.OLLAMA_MODEL
+    """Client for Ollama's /api/generate.
 
-    def generate(self, prompt: str, params: dict[str, Any] | None = None) -> str:
-        payload = {"model": self.model, "prompt": prompt, "stream": False}
+    Meant to be shared per process (see `get_llm_provider`). One client keeps its
+    connections alive across calls, books and event loops; the async methods run
+    it in worker threads (the `LLMProvider` defaults), so sync and async callers
+    share one pool and one limit. At most `OLLAMA_MAX_INFLIGHT` requests are sent
+    at once per process, which should match the server's `OLLAMA_NUM_PARALLEL`;
+    anything beyond that would only queue inside Ollama while holding a connection
+    and a timeout.
+    """
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        model: str | None = None,
+        max_inflight: int | None = None,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        self.base_url = base_url or settings.OLLAMA_BASE_URL
+        self.model = model or settings.OLLAMA_MODEL
+        self.max_inflight = max(1, max_inflight or settings.OLLAMA_MAX_INFLIGHT)
+        self.client = httpx.Client(**self._client_options(transport))
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+
+    def _client_options(self, transport) -> dict[str, Any]:
+        options: dict[str, Any] = {
+            "base_url": self.base_url,
+            "timeout": httpx.Timeout(settings.OLLAMA_TIMEOUT_SECONDS, connect=10.0),
+            "limits": httpx.Limits(
+                max_connections=self.max_inflight,
+                max_keepalive_connections=self.max_inflight,
+                keepalive_expiry=settings.OLLAMA_KEEPALIVE_SECONDS,
+            ),
+        }
+        if transport is not None:
+            options["transport"] = transport
+        return options
+
+    def _payload(self, prompt: str, params: dict[str, Any] | None, stream: bool = False) -> dict[str, Any]:
+        payload = {"model": self.model, "prompt": prompt}
+        if settings.OLLAMA_KEEP_ALIVE:
+            # keeps the model loaded between calls instead of reloading it from disk
+            payload["keep_alive"] = settings.OLLAMA_KEEP_ALIVE
         if params:
             payload.update(params)
-        resp = self.client.post("/api/generate", json=payload)
+        payload["stream"] = stream
+        return payload
+
+    @contextmanager
+    def _measure(self):
+        LLM_INFLIGHT.inc()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            LLM_INFLIGHT.dec()
+            LLM_REQUEST_SECONDS.labels(self.model, outcome).observe(time.perf_counter() - started)
+
+    def _parse(self, resp: httpx.Response, prompt: str) -> str:
         resp.raise_for_status()
         try:
             data = resp.json()
-            return data.get("response", "")
         except json.JSONDecodeError:
             # Fallback for newline-delimited responses
             lines = [line for line in resp.text.splitlines() if line.strip()]
-            if lines:
-                last = json.loads(lines[-1])
-                return last.get("response", "")
-            raise
+            if not lines:
+                raise
+            data = json.loads(lines[-1])
+        self._count_tokens(data, prompt)
+        return data.get("response", "")
+
+    def _count_tokens(self, data: dict[str, Any], prompt: str) -> None:
+        LLM_TOKENS.labels(self.model, "prompt").inc(data.get("prompt_eval_count") or 0)
+        LLM_TOKENS.labels(self.model, "completion").inc(data.get("eval_count") or 0)
+        # real counts keep the prompt budget's estimate honest for this model
+        get_estimator(self.model).observe(prompt, data.get("prompt_eval_count"))
+
+    def _stream_piece(self, line: str, prompt: str, started: float, first: bool) -> str:
+        # one NDJSON object per line; the last one (done) carries the token counts
+        data = json.loads(line)
+        if data.get("error"):
+            raise RuntimeError(f"Ollama error: {data['error']}")
+        if first:
+            LLM_FIRST_TOKEN_SECONDS.labels(self.model).observe(time.perf_counter() - started)
+        if data.get("done"):
+            self._count_tokens(data, prompt)
+        return data.get("response", "")
+
+    def generate(self, prompt: str, params: dict[str, Any] | None = None) -> str:
+        payload = self._payload(prompt, params)
+        with self._slots, self._measure():
+            resp = self.client.post("/api/generate", json=payload)
+            return self._parse(resp, prompt)
+
+    def stream(self, prompt: str, params: dict[str, Any] | None = None) -> Iterator[str]:
+        payload = self._payload(prompt, params, stream=True)
+        with self._slots, self._measure():
+            started = time.perf_counter()
+            with self.client.stream("POST", "/api/generate", json=payload) as resp:
+                resp.raise_for_status()
+                first = True
+                for line in resp.iter_lines():
+                    if line.strip():
+                        piece = self._stream_piece(line, prompt, started, first)
+                        first = False
+                        if piece:
+                            yield piece
+
+    def close(self) -> None:
+        self.client.close()
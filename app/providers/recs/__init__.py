@@ -6,5 +6,11 @@ from app.core.config import settings
 
 def get_recommendation_provider() -> RecommendationProvider:
     if settings.RECS_PROVIDER == "ml_als":
-        return ALSRecommender()
+        return ALSRecommender(
+            factors=settings.ALS_FACTORS,
+            iterations=settings.ALS_ITERATIONS,
+            alpha=settings.ALS_ALPHA,
+            ann_probes=settings.ALS_ANN_PROBES,
+            ann_rerank=settings.ALS_ANN_RERANK,
+        )
     return ContentBasedRecommender()
@@ -0,0 +1,173 @@
+"""Pure-numpy IVF-PQ index for maximum inner product search over ALS item factors.
+
+Items are bucketed by a k-means coarse quantizer (IVF); each item's residual to
+its centroid is product-quantized into `n_subvectors` uint8 codes. A query
+probes the `n_probe` lists whose centroids have the highest inner product,
+scores their items from per-subspace lookup tables, and optionally re-ranks the
+best candidates against the exact factors.
+"""
+import io
+
+import numpy as np
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    # argmin ||x - c||^2 == argmin ||c||^2 - 2 x.c ; chunked to bound memory
+    c_norms = (centroids * centroids).sum(axis=1)
+    out = np.empty(x.shape[0], dtype=np.int64)
+    for start in range(0, x.shape[0], chunk):
+        block = x[start : start + chunk]
+        out[start : start + chunk] = np.argmin(c_norms[None, :] - 2.0 * block @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator, sample: int = 100_000) -> np.ndarray:
+    k = max(1, min(k, x.shape[0]))
+    train = x if x.shape[0] <= sample else x[rng.choice(x.shape[0], sample, replace=False)]
+    centroids = train[rng.choice(train.shape[0], k, replace=False)].astype(np.float32, copy=True)
+    for _ in range(iterations):
+        assign = _nearest(train, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if empty.size:
+            centroids[empty] = train[rng.choice(train.shape[0], empty.size, replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_items: np.ndarray,
+        codebooks: np.ndarray,
+        codes: np.ndarray,
+        dim: int,
+    ):
+        self.centroids = centroids  # (n_lists, dim)
+        self.list_offsets = list_offsets  # (n_lists + 1,) into list_items/codes
+        self.list_items = list_items  # item indices grouped by list
+        self.codebooks = codebooks  # (n_subvectors, n_codes, sub_dim)
+        self.codes = codes  # (n_items, n_subvectors) uint8, same order as list_items
+        self.dim = dim
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def n_items(self) -> int:
+        return self.list_items.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: int = 0,
+        n_subvectors: int = 16,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "IVFPQIndex":
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        rng = np.random.default_rng(seed)
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        centroids = _kmeans(vectors, n_lists, iterations, rng)
+        assign = _nearest(vectors, centroids)
+
+        n_subvectors = max(1, min(n_subvectors, dim))
+        sub_dim = -(-dim // n_subvectors)
+        residuals = np.zeros((n, n_subvectors * sub_dim), dtype=np.float32)
+        residuals[:, :dim] = vectors - centroids[assign]
+        residuals = residuals.reshape(n, n_subvectors, sub_dim)
+        n_codes = min(256, n)
+        codebooks = np.empty((n_subvectors, n_codes, sub_dim), dtype=np.float32)
+        codes = np.empty((n, n_subvectors), dtype=np.uint8)
+        for m in range(n_subvectors):
+            codebooks[m] = _kmeans(residuals[:, m, :], n_codes, iterations, rng)
+            codes[:, m] = _nearest(residuals[:, m, :], codebooks[m])
+
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=centroids.shape[0])
+        offsets = np.zeros(centroids.shape[0] + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(centroids, offsets, order.astype(np.int64), codebooks, codes[order], dim)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        exclude: np.ndarray | None = None,
+        n_probe: int = 16,
+        vectors: np.ndarray | None = None,
+        rerank: int = 0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k (item indices, scores) by approximate inner product.
+
+        `exclude` holds item indices that must never be returned. With `vectors`
+        and `rerank > 0`, the best `k * rerank` candidates are re-scored exactly.
+        """
+        if k <= 0 or self.n_items == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self.centroids @ query
+        n_probe = max(1, min(n_probe, self.n_lists))
+        probe = np.argpartition(-coarse, n_probe - 1)[:n_probe]
+
+        starts = self.list_offsets[probe]
+        sizes = self.list_offsets[probe + 1] - starts
+        if sizes.sum() == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = np.repeat(starts - np.concatenate(([0], np.cumsum(sizes)[:-1])), sizes) + np.arange(sizes.sum())
+        items = self.list_items[positions]
+
+        n_subvectors, _, sub_dim = self.codebooks.shape
+        padded = np.zeros(n_subvectors * sub_dim, dtype=np.float32)
+        padded[: self.dim] = query
+        lut = np.einsum("mcd,md->mc", self.codebooks, padded.reshape(n_subvectors, sub_dim))
+        scores = np.repeat(coarse[probe], sizes) + lut[np.arange(n_subvectors), self.codes[positions]].sum(axis=1)
+
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(items, exclude)
+            items, scores = items[keep], scores[keep]
+        if items.size == 0:
+            return items, scores.astype(np.float32)
+
+        if vectors is not None and rerank > 0:
+            n_cand = min(items.size, k * rerank)
+            cand = np.argpartition(-scores, n_cand - 1)[:n_cand]
+            items = items[cand]
+            scores = vectors[items] @ query
+        k = min(k, items.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return items[top], scores[top].astype(np.float32)
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez(
+            buf,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_items=self.list_items,
+            codebooks=self.codebooks,
+            codes=self.codes,
+            dim=np.asarray(self.dim),
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IVFPQIndex":
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            return cls(
+                centroids=npz["centroids"],
+                list_offsets=npz["list_offsets"],
+                list_items=npz["list_items"],
+                codebooks=npz["codebooks"],
+                codes=npz["codes"],
+                dim=int(npz["dim"]),
+            )
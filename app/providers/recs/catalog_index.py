@@ -0,0 +1,196 @@
+"""Process-local catalog index: interned tags, per-book tag ids and tag -> books postings.
+
+Books are keyed by their 16-byte UUID in one sorted `S16` array; both directions
+of the book/tag relation are CSR arrays (int64 offsets, int32 ids). At 1M books
+with a few tags each that is tens of MB, against hundreds for the dict-of-lists
+`TagRepository.get_tags_for_books()` returns. The index is rebuilt only when the
+`catalog_versions` counter moves, which costs one primary-key read per check.
+"""
+import threading
+import uuid
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import BookTag, Tag
+from app.providers.recs.content_based import BookTagMatrix
+from app.repositories.catalog_repo import CatalogRepository
+
+
+def _key(book_id) -> bytes | None:
+    try:
+        return uuid.UUID(str(book_id)).bytes
+    except ValueError:
+        return None
+
+
+class _BookIds(Sequence):
+    """str view over the sorted uuid keys, decoded on access."""
+
+    def __init__(self, keys: np.ndarray):
+        self._keys = keys
+
+    def __len__(self) -> int:
+        return self._keys.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        # numpy drops trailing NUL bytes from S16 scalars; pad them back
+        return str(uuid.UUID(bytes=bytes(self._keys[i]).ljust(16, b"\0")))
+
+
+class _BookRows(Mapping):
+    """book id -> row lookup by binary search over the sorted keys."""
+
+    def __init__(self, keys: np.ndarray):
+        self._keys = keys
+
+    def __getitem__(self, book_id) -> int:
+        key = _key(book_id)
+        if key is not None:
+            pos = int(np.searchsorted(self._keys, key))
+            if pos < self._keys.shape[0] and self._keys[pos] == key.rstrip(b"\0"):
+                return pos
+        raise KeyError(book_id)
+
+    def __iter__(self):
+        return iter(_BookIds(self._keys))
+
+    def __len__(self) -> int:
+        return self._keys.shape[0]
+
+
+class CatalogIndex:
+    def __init__(
+        self,
+        version: int,
+        book_keys: np.ndarray,
+        tag_names: list[str],
+        book_tag_indptr: np.ndarray,
+        book_tag_ids: np.ndarray,
+        tag_book_indptr: np.ndarray,
+        tag_book_rows: np.ndarray,
+    ):
+        self.version = version
+        self.book_keys = book_keys  # (n_books,) S16, sorted
+        self.tag_names = tag_names  # interned; position = tag id
+        self.tag_index = {name: i for i, name in enumerate(tag_names)}
+        self.book_tag_indptr = book_tag_indptr  # (n_books + 1,) into book_tag_ids
+        self.book_tag_ids = book_tag_ids  # int32 tag ids, grouped by book
+        self.tag_book_indptr = tag_book_indptr  # (n_tags + 1,) into tag_book_rows
+        self.tag_book_rows = tag_book_rows  # int32 book rows, grouped by tag
+        self.book_ids = _BookIds(book_keys)
+        self.book_index = _BookRows(book_keys)
+        self._matrix: BookTagMatrix | None = None
+
+    @classmethod
+    def from_pairs(
+        cls, book_keys: np.ndarray, tag_codes: np.ndarray, tag_names: list[str], version: int = 0
+    ) -> "CatalogIndex":
+        """Build from parallel (16-byte book key, tag code) arrays, one entry per
+        book_tags row, where `tag_names[code]` is the tag's name."""
+        keys, rows = np.unique(np.asarray(book_keys, dtype="S16"), return_inverse=True)
+        rows = rows.ravel().astype(np.int32)
+        tags = np.asarray(tag_codes, dtype=np.int32)
+
+        by_book = np.lexsort((tags, rows))
+        book_tag_indptr = np.zeros(keys.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=keys.shape[0]), out=book_tag_indptr[1:])
+        by_tag = np.lexsort((rows, tags))
+        tag_book_indptr = np.zeros(len(tag_names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tags, minlength=len(tag_names)), out=tag_book_indptr[1:])
+        return cls(
+            version,
+            keys,
+            list(tag_names),
+            book_tag_indptr,
+            tags[by_book],
+            tag_book_indptr,
+            rows[by_tag],
+        )
+
+    @classmethod
+    def load(cls, db: Session, version: int) -> "CatalogIndex":
+        stmt = (
+            select(BookTag.book_id, Tag.name)
+            .join(Tag, Tag.id == BookTag.tag_id)
+            .execution_options(yield_per=50_000)
+        )
+        keys = bytearray()
+        codes: list[int] = []
+        interned: dict[str, int] = {}
+        for book_id, name in db.execute(stmt):
+            keys += book_id.bytes
+            codes.append(interned.setdefault(name, len(interned)))
+        book_keys = np.frombuffer(bytes(keys), dtype="S16")
+        return cls.from_pairs(book_keys, np.asarray(codes, dtype=np.int32), list(interned), version)
+
+    @property
+    def n_books(self) -> int:
+        return self.book_keys.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            a.nbytes
+            for a in (
+                self.book_keys,
+                self.book_tag_indptr,
+                self.book_tag_ids,
+                self.tag_book_indptr,
+                self.tag_book_rows,
+            )
+        )
+
+    def tags_for_book(self, book_id: str) -> list[str]:
+        row = self.book_index.get(book_id)
+        if row is None:
+            return []
+        ids = self.book_tag_ids[self.book_tag_indptr[row] : self.book_tag_indptr[row + 1]]
+        return [self.tag_names[t] for t in ids]
+
+    def books_for_tag(self, tag: str) -> list[str]:
+        t = self.tag_index.get(tag)
+        if t is None:
+            return []
+        rows = self.tag_book_rows[self.tag_book_indptr[t] : self.tag_book_indptr[t + 1]]
+        return [self.book_ids[r] for r in rows]
+
+    def tag_matrix(self) -> BookTagMatrix:
+        """Book x tag incidence over this index's rows, built once per version."""
+        if self._matrix is None:
+            incidence = sparse.csr_matrix(
+                (np.ones(self.book_tag_ids.shape[0], dtype=np.float64), self.book_tag_ids, self.book_tag_indptr),
+                shape=(self.n_books, len(self.tag_names)),
+            )
+            self._matrix = BookTagMatrix(self.book_ids, self.tag_index, incidence, book_index=self.book_index)
+        return self._matrix
+
+
+_lock = threading.Lock()
+_cached: CatalogIndex | None = None
+
+
+def get_catalog_index(db: Session) -> CatalogIndex:
+    """Return the process-wide catalog index, reloading it only when the catalog
+    version has moved since it was built."""
+    global _cached
+    # read the version before the data: a change landing in between only causes one extra reload
+    version = CatalogRepository(db).version()
+    cached = _cached
+    if cached is not None and cached.version == version:
+        return cached
+    with _lock:
+        if _cached is None or _cached.version != version:
+            _cached = CatalogIndex.load(db, version)
+        return _cached
+
+
+def reset_catalog_cache() -> None:
+    global _cached
+    with _lock:
+        _cached = None
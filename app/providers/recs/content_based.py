@@ -1,21 +1,158 @@
-from typing import Sequence, Dict
+from typing import Iterable, Mapping, Sequence, Dict
+import numpy as np
+from scipy import sparse
 from .base import RecommendationProvider
 
 
+class BookTagMatrix:
+    """CSR book x tag incidence matrix with a tag-name -> column index.
+
+    Rows follow the iteration order of the `book_tags` mapping it was built from,
+    which is also the tie-break order for equal scores. A caller that already has
+    compact id <-> row lookups (the catalog index) passes them in as `book_ids`
+    and `book_index` instead of having a list and dict materialised here.
+    """
+
+    def __init__(
+        self,
+        book_ids: Sequence[str],
+        tag_index: Dict[str, int],
+        incidence: sparse.csr_matrix,
+        book_index: Mapping[str, int] | None = None,
+    ):
+        self.book_ids = book_ids if book_index is not None else list(book_ids)
+        self.tag_index = tag_index
+        self.incidence = incidence
+        self.book_index = book_index if book_index is not None else {b: i for i, b in enumerate(self.book_ids)}
+
+    @classmethod
+    def from_book_tags(cls, book_tags: Dict[str, list[str]]) -> "BookTagMatrix":
+        book_ids = list(book_tags)
+        tag_index: dict[str, int] = {}
+        indptr = np.zeros(len(book_ids) + 1, dtype=np.int64)
+        indices: list[int] = []
+        for i, book_id in enumerate(book_ids):
+            for tag in book_tags[book_id]:
+                indices.append(tag_index.setdefault(tag, len(tag_index)))
+            indptr[i + 1] = len(indices)
+        # a tag listed twice on a book counts twice, as in the per-book sum
+        incidence = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), np.asarray(indices, dtype=np.int64), indptr),
+            shape=(len(book_ids), len(tag_index)),
+        )
+        return cls(book_ids, tag_index, incidence)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.incidence.shape
+
+    def preference_vector(self, user_preferences: Dict[str, float]) -> np.ndarray:
+        vec = np.zeros(len(self.tag_index), dtype=np.float64)
+        for tag, weight in user_preferences.items():
+            col = self.tag_index.get(tag)
+            if col is not None:
+                vec[col] += weight
+        return vec
+
+    def preference_matrix(self, user_preferences: Sequence[Dict[str, float]]) -> sparse.csr_matrix:
+        rows: list[int] = []
+        cols: list[int] = []
+        vals: list[float] = []
+        for u, prefs in enumerate(user_preferences):
+            for tag, weight in prefs.items():
+                col = self.tag_index.get(tag)
+                if col is not None:
+                    rows.append(u)
+                    cols.append(col)
+                    vals.append(weight)
+        return sparse.csr_matrix(
+            (np.asarray(vals, dtype=np.float64), (rows, cols)), shape=(len(user_preferences), len(self.tag_index))
+        )
+
+    def exclusion_indices(self, exclude_book_ids: Iterable[str]) -> np.ndarray:
+        return np.asarray([self.book_index[b] for b in exclude_book_ids if b in self.book_index], dtype=np.int64)
+
+    def exclusion_mask(self, exclude_book_ids: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(len(self.book_ids), dtype=bool)
+        mask[self.exclusion_indices(exclude_book_ids)] = True
+        return mask
+
+    def score(self, user_preferences: Dict[str, float]) -> np.ndarray:
+        return self.incidence @ self.preference_vector(user_preferences)
+
+    def top_k(self, scores: np.ndarray, limit: int, candidates: np.ndarray | None = None) -> list[tuple[str, float]]:
+        """Highest positive scores first, ties broken by row order.
+
+        `candidates` optionally restricts selection to these row indices (with
+        `scores` aligned to them), which is how sparse batch rows are ranked.
+        """
+        if candidates is None:
+            candidates = np.arange(scores.shape[0])
+        positive = np.flatnonzero(scores > 0)
+        if limit <= 0 or positive.size == 0:
+            return []
+        if positive.size > limit:
+            part = positive[np.argpartition(-scores[positive], limit - 1)[:limit]]
+            # keep every candidate tied with the k-th score so the tie-break is exact
+            positive = positive[scores[positive] >= scores[part].min()]
+        order = positive[np.lexsort((candidates[positive], -scores[positive]))][:limit]
+        return [(self.book_ids[candidates[i]], float(scores[i])) for i in order]
+
+
 class ContentBasedRecommender(RecommendationProvider):
+    def __init__(self) -> None:
+        self._matrix: BookTagMatrix | None = None
+        self._source: Dict[str, list[str]] | None = None
+
+    def matrix_for(self, book_tags: Dict[str, list[str]]) -> BookTagMatrix:
+        """Build the incidence matrix once per `book_tags` mapping and reuse it."""
+        if self._matrix is None or self._source is not book_tags:
+            self._matrix = BookTagMatrix.from_book_tags(book_tags)
+            self._source = book_tags
+        return self._matrix
+
     def recommend(
         self,
         user_preferences: Dict[str, float],
-        book_tags: Dict[str, list[str]],
+        book_tags: Dict[str, list[str]] | BookTagMatrix,
         exclude_book_ids: set[str],
         limit: int = 10,
     ) -> Sequence[tuple[str, float]]:
-        scores = []
-        for book_id, tags in book_tags.items():
-            if book_id in exclude_book_ids:
-                continue
-            score = sum(user_preferences.get(tag, 0.0) for tag in tags)
-            if score > 0:
-                scores.append((book_id, score))
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return scores[:limit]
+        matrix = book_tags if isinstance(book_tags, BookTagMatrix) else self.matrix_for(book_tags)
+        return self.recommend_with_matrix(user_preferences, matrix, exclude_book_ids, limit)
+
+    def recommend_with_matrix(
+        self,
+        user_preferences: Dict[str, float],
+        matrix: BookTagMatrix,
+        exclude_book_ids: set[str],
+        limit: int = 10,
+    ) -> list[tuple[str, float]]:
+        if not user_preferences or matrix.shape[0] == 0:
+            return []
+        scores = matrix.score(user_preferences)
+        scores[matrix.exclusion_mask(exclude_book_ids)] = 0.0
+        return matrix.top_k(scores, limit)
+
+    def recommend_many(
+        self,
+        user_preferences: Sequence[Dict[str, float]],
+        book_tags: Dict[str, list[str]] | BookTagMatrix,
+        exclude_book_ids: Sequence[set[str]],
+        limit: int = 10,
+    ) -> list[list[tuple[str, float]]]:
+        """Score a batch of users with one sparse (users x tags) @ (tags x books) product."""
+        matrix = book_tags if isinstance(book_tags, BookTagMatrix) else self.matrix_for(book_tags)
+        if matrix.shape[0] == 0:
+            return [[] for _ in user_preferences]
+        scores = (matrix.preference_matrix(user_preferences) @ matrix.incidence.T).tocsr()
+        scores.sort_indices()
+        results = []
+        for u, excluded in enumerate(exclude_book_ids):
+            start, end = scores.indptr[u], scores.indptr[u + 1]
+            cols = scores.indices[start:end]
+            row = scores.data[start:end].copy()
+            if excluded:
+                row[np.isin(cols, matrix.exclusion_indices(excluded))] = 0.0
+            results.append(matrix.top_k(row, limit, candidates=cols))
+        return results
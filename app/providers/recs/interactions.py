@@ -0,0 +1,72 @@
+import threading
+from typing import Hashable
+
+import numpy as np
+from scipy import sparse
+
+
+class InteractionMatrix:
+    """Users x books CSR matrix with sorted id arrays for index lookups."""
+
+    def __init__(self, matrix: sparse.csr_matrix, user_ids: np.ndarray, book_ids: np.ndarray, version: Hashable = None):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.book_ids = book_ids
+        self.version = version
+
+    @classmethod
+    def from_arrays(
+        cls, users: np.ndarray, books: np.ndarray, weights: np.ndarray, version: Hashable = None
+    ) -> "InteractionMatrix":
+        user_ids, row_idx = np.unique(users, return_inverse=True)
+        book_ids, col_idx = np.unique(books, return_inverse=True)
+        # duplicate (user, book) pairs are summed, e.g. a borrow plus a review
+        matrix = sparse.csr_matrix(
+            (weights.astype(np.float32, copy=False), (row_idx.ravel(), col_idx.ravel())),
+            shape=(len(user_ids), len(book_ids)),
+        )
+        matrix.sum_duplicates()
+        return cls(matrix, user_ids, book_ids, version)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.matrix.shape
+
+    def user_index(self, user_id: str) -> int | None:
+        return self._lookup(self.user_ids, str(user_id))
+
+    def book_index(self, book_id: str) -> int | None:
+        return self._lookup(self.book_ids, str(book_id))
+
+    @staticmethod
+    def _lookup(ids: np.ndarray, key: str) -> int | None:
+        pos = int(np.searchsorted(ids, key))
+        if pos < len(ids) and ids[pos] == key:
+            return pos
+        return None
+
+
+_lock = threading.Lock()
+_cached: InteractionMatrix | None = None
+
+
+def get_interaction_matrix(rec_repo) -> InteractionMatrix:
+    """Return the process-wide interaction matrix, rebuilding it only when the
+    repository's cheap data version (row counts + newest timestamps) changes."""
+    global _cached
+    version = rec_repo.interactions_version()
+    cached = _cached
+    if cached is not None and cached.version == version:
+        return cached
+    with _lock:
+        if _cached is not None and _cached.version == version:
+            return _cached
+        users, books, weights = rec_repo.interaction_arrays()
+        _cached = InteractionMatrix.from_arrays(users, books, weights, version=version)
+        return _cached
+
+
+def reset_interaction_cache() -> None:
+    global _cached
+    with _lock:
+        _cached = None
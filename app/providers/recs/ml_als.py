@@ -5,15 +5,28 @@ import numpy as np
 from typing import Sequence, Dict, List, Tuple, Set
 from scipy import sparse
 from implicit.als import AlternatingLeastSquares
+from implicit.cpu.als import AlternatingLeastSquares as CpuAlternatingLeastSquares
 
+from app.providers.recs.ann import IVFPQIndex
 from app.providers.recs.base import RecommendationProvider
 
 
 class ALSRecommender(RecommendationProvider):
-    def __init__(self, factors: int = 64, iterations: int = 10, alpha: float = 40.0):
+    def __init__(
+        self,
+        factors: int = 64,
+        iterations: int = 10,
+        alpha: float = 40.0,
+        ann_probes: int = 64,
+        ann_rerank: int = 4,
+        regularization: float = 0.01,
+    ):
         self.factors = factors
         self.iterations = iterations
         self.alpha = alpha
+        self.regularization = regularization
+        self.ann_probes = ann_probes
+        self.ann_rerank = ann_rerank
 
     def recommend(
         self,
@@ -23,8 +36,97 @@ class ALSRecommender(RecommendationProvider):
         limit: int = 10,
     ) -> Sequence[Tuple[str, float]]:
         # This provider works off interactions passed in via user_preferences/book_tags
-        # but we need a proper interaction matrix; delegate to caller to build it via `score_with_matrix`.
-        raise NotImplementedError("Use score_with_matrix with prebuilt matrices")
+        # but we need trained factors; callers score against the persisted model via `score_with_factors`.
+        raise NotImplementedError("Use score_with_factors with a trained model")
+
+    def fit(self, interactions: sparse.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """Train on a users x books matrix and return (user_factors, item_factors)."""
+        model = AlternatingLeastSquares(
+            factors=self.factors,
+            iterations=self.iterations,
+            regularization=self.regularization,
+            alpha=self.alpha,
+            use_gpu=False,
+        )
+        model.fit(interactions, show_progress=False)
+        return np.asarray(model.user_factors, dtype=np.float32), np.asarray(model.item_factors, dtype=np.float32)
+
+    @staticmethod
+    def fold_in_solver(
+        item_factors: np.ndarray, alpha: float, regularization: float = 0.01
+    ) -> CpuAlternatingLeastSquares:
+        """An implicit model frozen at `item_factors`, used only for `recalculate_user`.
+
+        Keep one per trained model: it caches Y^T Y, so each fold-in afterwards is a
+        single small least-squares solve over the user's own items.
+        """
+        solver = CpuAlternatingLeastSquares(
+            factors=item_factors.shape[1], regularization=regularization, alpha=alpha
+        )
+        solver.item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        return solver
+
+    def score_with_factors(
+        self,
+        user_vector: np.ndarray,
+        item_factors: np.ndarray,
+        book_index_to_id: Sequence[str],
+        exclude_book_ids: Set[str],
+        limit: int = 10,
+        book_id_to_index: Dict[str, int] | None = None,
+        ann: IVFPQIndex | None = None,
+    ) -> List[Tuple[str, float]]:
+        """Rank books by factor dot product, skipping excluded ids.
+
+        With an `ann` index only the probed IVF lists are scored; otherwise every
+        item factor is.
+        """
+        if item_factors.shape[0] == 0 or limit <= 0:
+            return []
+        excluded: list[int] = []
+        if exclude_book_ids:
+            if book_id_to_index is None:
+                book_id_to_index = {b: i for i, b in enumerate(book_index_to_id)}
+            excluded = [book_id_to_index[b] for b in exclude_book_ids if b in book_id_to_index]
+        if ann is not None:
+            idx, scores = ann.search(
+                user_vector,
+                limit,
+                exclude=np.asarray(excluded, dtype=np.int64),
+                n_probe=self.ann_probes,
+                vectors=item_factors,
+                rerank=self.ann_rerank,
+            )
+            return [(book_index_to_id[i], float(s)) for i, s in zip(idx, scores)]
+        scores = item_factors @ user_vector
+        if excluded:
+            scores[excluded] = -np.inf
+        k = min(limit, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(book_index_to_id[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def recommend_batch(
+        self,
+        user_vectors: np.ndarray,
+        item_factors: np.ndarray,
+        user_items: sparse.csr_matrix,
+        limit: int = 10,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-`limit` item indices/scores for many users at once.
+
+        `user_items` holds one row per entry of `user_vectors`; items already present
+        in a row are filtered out. Padding slots come back with a negative index.
+        """
+        model = CpuAlternatingLeastSquares(factors=item_factors.shape[1])
+        model.user_factors = np.ascontiguousarray(user_vectors, dtype=np.float32)
+        model.item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        n = min(limit, item_factors.shape[0])
+        ids, scores = model.recommend(
+            np.arange(user_vectors.shape[0]), user_items, N=n, filter_already_liked_items=True
+        )
+        # when fewer than N items are left, filtered ones fill the row with a -FLT_MAX score
+        return np.where(scores <= np.finfo(np.float32).min, -1, ids), scores
 
     def score_with_matrix(
         self,
@@ -35,28 +137,11 @@ class ALSRecommender(RecommendationProvider):
         exclude_book_ids: Set[str],
         limit: int = 10,
     ) -> Sequence[Tuple[str, float]]:
+        # Ad-hoc fit + score; the API and workers use persisted factors instead.
         if interactions.shape[0] == 0 or interactions.shape[1] == 0:
             return []
-
-        model = AlternatingLeastSquares(
-            factors=self.factors,
-            iterations=self.iterations,
-            regularization=0.01,
-            use_gpu=False,
+        user_factors, item_factors = self.fit(interactions)
+        liked = {book_index_to_id[i] for i in user_items.indices}
+        return self.score_with_factors(
+            user_factors[user_id], item_factors, book_index_to_id, exclude_book_ids | liked, limit
         )
-        model.fit(interactions)
-
-        # implicit expects user-items in CSR for recommend to use as exclude baseline
-        recs = model.recommend(user_id, user_items, N=limit * 2, filter_already_liked_items=True)
-        # implicit may return (ids, scores) tuple depending on version
-        if isinstance(recs, tuple) and len(recs) == 2:
-            recs = list(zip(recs[0], recs[1]))
-        results = []
-        for idx, score in recs:
-            book_id = book_index_to_id[idx]
-            if book_id in exclude_book_ids:
-                continue
-            results.append((book_id, float(score)))
-            if len(results) >= limit:
-                break
-        return results
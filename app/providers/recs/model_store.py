@@ -0,0 +1,252 @@
+import io
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Sequence
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+from app.providers.recs.ann import IVFPQIndex
+from app.providers.recs.ml_als import ALSRecommender
+from app.providers.storage import get_storage_provider
+from app.providers.storage.base import StorageProvider
+
+logger = logging.getLogger(__name__)
+
+ALS_MODEL_PREFIX = "models/als"
+ALS_LATEST_KEY = f"{ALS_MODEL_PREFIX}/LATEST"
+# time of the last finished training run, including runs that found no interactions
+ALS_ATTEMPT_KEY = f"{ALS_MODEL_PREFIX}/ATTEMPTED"
+
+
+def prune_versions(storage: StorageProvider, prefix: str, keep: int, latest: str | None) -> list[str]:
+    """Delete the objects of every `<prefix>/<version>/` but the newest `keep`
+    versions and `latest`. Versions are UTC timestamps, so they sort by age.
+    Returns the versions deleted."""
+    versions: dict[str, list[str]] = {}
+    for name in storage.list(f"{prefix}/"):
+        version, sep, _ = name[len(prefix) + 1 :].partition("/")
+        if sep:
+            versions.setdefault(version, []).append(name)
+    kept = set(sorted(versions, reverse=True)[: max(1, keep)]) | {latest}
+    removed = []
+    for version in sorted(versions):
+        if version in kept:
+            continue
+        for name in versions[version]:
+            storage.delete(name)
+        removed.append(version)
+    return removed
+
+
+class ALSModelArtifact:
+    """Trained ALS factors plus the id mappings needed to score against them."""
+
+    def __init__(
+        self,
+        version: str,
+        user_factors: np.ndarray,
+        item_factors: np.ndarray,
+        user_ids: Sequence[str],
+        book_ids: Sequence[str],
+        trained_at: datetime,
+        params: dict | None = None,
+        ann: IVFPQIndex | None = None,
+    ):
+        self.version = version
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_ids = list(user_ids)
+        self.book_ids = list(book_ids)
+        self.trained_at = trained_at
+        self.params = params or {}
+        self.ann = ann
+        self._solver = None
+        self.user_index = {u: i for i, u in enumerate(self.user_ids)}
+        self.book_index = {b: i for i, b in enumerate(self.book_ids)}
+
+    def age_seconds(self) -> float:
+        return (datetime.utcnow() - self.trained_at).total_seconds()
+
+    def is_stale(self) -> bool:
+        return self.age_seconds() > settings.ALS_MODEL_MAX_AGE_HOURS * 3600
+
+    def user_vector(self, user_id: str) -> np.ndarray | None:
+        idx = self.user_index.get(str(user_id))
+        if idx is None:
+            return None
+        return self.user_factors[idx]
+
+    def fold_in(self, interactions: dict[str, float]) -> np.ndarray | None:
+        """Solve a user vector from their current interaction row (book_id -> weight)
+        against the fixed item factors. Books this model has not seen are ignored;
+        returns None when none are left."""
+        known = [(self.book_index[b], w) for b, w in interactions.items() if b in self.book_index]
+        if not known:
+            return None
+        cols, weights = zip(*known)
+        user_items = sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float32), (np.zeros(len(cols), dtype=np.int64), np.asarray(cols))),
+            shape=(1, len(self.book_ids)),
+        )
+        if self._solver is None:
+            self._solver = ALSRecommender.fold_in_solver(
+                self.item_factors,
+                alpha=self.params.get("alpha", 1.0),
+                regularization=self.params.get("regularization", 0.01),
+            )
+        return self._solver.recalculate_user(0, user_items)
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez_compressed(
+            buf,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors,
+            user_ids=np.asarray(self.user_ids, dtype=str),
+            book_ids=np.asarray(self.book_ids, dtype=str),
+            meta=np.asarray(
+                json.dumps(
+                    {
+                        "version": self.version,
+                        "trained_at": self.trained_at.isoformat(),
+                        "params": self.params,
+                    }
+                )
+            ),
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ALSModelArtifact":
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            return cls(
+                version=meta["version"],
+                user_factors=npz["user_factors"],
+                item_factors=npz["item_factors"],
+                user_ids=npz["user_ids"].tolist(),
+                book_ids=npz["book_ids"].tolist(),
+                trained_at=datetime.fromisoformat(meta["trained_at"]),
+                params=meta.get("params"),
+            )
+
+
+class ALSModelStore:
+    """Versioned ALS artifacts persisted through the storage provider.
+
+    Each training run writes `models/als/<version>/model.npz` (plus `ann.npz` when
+    an index was built) and then flips the `models/als/LATEST` pointer, so readers
+    never observe a half-written model. Every finished run, trained or not, stamps
+    `models/als/ATTEMPTED`, and `prune` deletes versions beyond the newest few.
+    """
+
+    def __init__(self, storage: StorageProvider | None = None):
+        self.storage = storage or get_storage_provider()
+
+    @staticmethod
+    def new_version() -> str:
+        return datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+
+    @staticmethod
+    def object_key(version: str, name: str = "model.npz") -> str:
+        return f"{ALS_MODEL_PREFIX}/{version}/{name}"
+
+    def save(self, artifact: ALSModelArtifact) -> str:
+        self.storage.put(io.BytesIO(artifact.to_bytes()), self.object_key(artifact.version))
+        if artifact.ann is not None:
+            self.storage.put(io.BytesIO(artifact.ann.to_bytes()), self.object_key(artifact.version, "ann.npz"))
+        self.storage.put(io.BytesIO(artifact.version.encode("utf-8")), ALS_LATEST_KEY)
+        return artifact.version
+
+    def latest_version(self) -> str | None:
+        try:
+            return self.storage.get(ALS_LATEST_KEY).decode("utf-8").strip() or None
+        except Exception:
+            # no model trained yet (or storage unavailable); callers fall back
+            return None
+
+    def record_attempt(self, at: datetime | None = None) -> None:
+        at = at or datetime.utcnow()
+        self.storage.put(io.BytesIO(at.isoformat().encode("utf-8")), ALS_ATTEMPT_KEY)
+
+    def last_attempt(self) -> datetime | None:
+        try:
+            return datetime.fromisoformat(self.storage.get(ALS_ATTEMPT_KEY).decode("utf-8").strip())
+        except Exception:
+            return None
+
+    def prune(self, keep: int) -> list[str]:
+        """Delete all but the newest `keep` model versions (never the LATEST one)."""
+        return prune_versions(self.storage, ALS_MODEL_PREFIX, keep, self.latest_version())
+
+    def load(self, version: str) -> ALSModelArtifact:
+        artifact = ALSModelArtifact.from_bytes(self.storage.get(self.object_key(version)))
+        if artifact.params.get("ann"):
+            artifact.ann = IVFPQIndex.from_bytes(self.storage.get(self.object_key(version, "ann.npz")))
+        return artifact
+
+
+_lock = threading.Lock()
+_cached_model: ALSModelArtifact | None = None
+_checked_at = float("-inf")
+_attempted_at: datetime | None = None
+_retrain_requested_at = float("-inf")
+
+
+def get_latest_model(store: ALSModelStore | None = None) -> ALSModelArtifact | None:
+    """Return the newest trained model, polling the LATEST pointer at most every
+    `ALS_MODEL_RELOAD_SECONDS` per process."""
+    global _cached_model, _checked_at, _attempted_at
+    now = time.monotonic()
+    if now - _checked_at < settings.ALS_MODEL_RELOAD_SECONDS:
+        return _cached_model
+    with _lock:
+        if now - _checked_at < settings.ALS_MODEL_RELOAD_SECONDS:
+            return _cached_model
+        store = store or ALSModelStore()
+        version = store.latest_version()
+        if version and (_cached_model is None or _cached_model.version != version):
+            try:
+                _cached_model = store.load(version)
+                logger.info("Loaded ALS model %s", version)
+            except Exception:
+                logger.exception("Failed to load ALS model %s", version)
+        _attempted_at = store.last_attempt()
+        _checked_at = time.monotonic()
+        return _cached_model
+
+
+def retrain_wanted(model: ALSModelArtifact | None) -> bool:
+    """A missing or stale model wants a retrain, unless a training run finished
+    within `ALS_MODEL_MAX_AGE_HOURS`: that run found no interactions, and the beat
+    schedule brings the next one. Call after `get_latest_model`."""
+    if model is not None and not model.is_stale():
+        return False
+    attempted_at = _attempted_at
+    if attempted_at is None:
+        return True
+    return datetime.utcnow() - attempted_at > timedelta(hours=settings.ALS_MODEL_MAX_AGE_HOURS)
+
+
+def claim_retrain_request() -> bool:
+    """True at most once per reload interval, so a stale model triggers one retrain, not one per request."""
+    global _retrain_requested_at
+    with _lock:
+        now = time.monotonic()
+        if now - _retrain_requested_at < settings.ALS_MODEL_RELOAD_SECONDS:
+            return False
+        _retrain_requested_at = now
+        return True
+
+
+def reset_model_cache() -> None:
+    global _cached_model, _checked_at, _attempted_at
+    with _lock:
+        _cached_model = None
+        _checked_at = float("-inf")
+        _attempted_at = None
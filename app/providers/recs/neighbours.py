@@ -0,0 +1,384 @@
+"""Precomputed item-item neighbour table for "similar books".
+
+Built offline from ALS item factors (cosine), with the book x tag matrix as the
+fallback for books the model has not seen. The table is a set of fixed-width
+`.npy` arrays that API workers memory-map from a local cache, so a lookup is one
+binary search over the sorted ids plus a row slice, with no DB query.
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+from app.providers.recs.ann import IVFPQIndex
+from app.providers.recs.content_based import BookTagMatrix
+from app.providers.recs.model_store import prune_versions
+from app.providers.storage import get_storage_provider
+from app.providers.storage.base import StorageProvider
+
+logger = logging.getLogger(__name__)
+
+NEIGHBOURS_PREFIX = "models/similar"
+NEIGHBOURS_LATEST_KEY = f"{NEIGHBOURS_PREFIX}/LATEST"
+
+SOURCE_CONTENT = 0
+SOURCE_ALS = 1
+SOURCE_NAMES = {SOURCE_CONTENT: "content", SOURCE_ALS: "ml_als"}
+
+
+def _top_k_rows(sims: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # best-first top-k per row; non-positive similarities become -1 padding
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    keep = top_scores > 0
+    return np.where(keep, top, -1).astype(np.int32), np.where(keep, top_scores, 0.0).astype(np.float32)
+
+
+DEFAULT_BUDGET_BYTES = 256 * 1024 * 1024
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _dense_block_rows(n_cols: int, budget_bytes: int) -> int:
+    # per row: float32 similarities, the negated copy and int64 order argpartition makes, a bool mask
+    return max(1, budget_bytes // (17 * max(1, n_cols)))
+
+
+def cosine_neighbours(
+    vectors: np.ndarray, k: int, budget_bytes: int = DEFAULT_BUDGET_BYTES
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k cosine neighbours of every row of a dense matrix, excluding itself.
+
+    Exact, O(n^2); rows are scored in blocks sized so each block's scratch stays
+    within `budget_bytes`.
+    """
+    n = vectors.shape[0]
+    indices = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    k_eff = min(k, n - 1)
+    if k_eff <= 0:
+        return indices, scores
+    unit = _unit_rows(vectors)
+    block = _dense_block_rows(n, budget_bytes)
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        sims = unit[start:end] @ unit.T
+        sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+        indices[start:end, :k_eff], scores[start:end, :k_eff] = _top_k_rows(sims, k_eff)
+    return indices, scores
+
+
+def ann_cosine_neighbours(
+    vectors: np.ndarray,
+    k: int,
+    index: IVFPQIndex,
+    n_probe: int,
+    budget_bytes: int = DEFAULT_BUDGET_BYTES,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Approximate top-k cosine neighbours of every row, from the IVF lists of `index`.
+
+    `index` must be built over these rows (as the ALS model's is over its item
+    factors). The books of each IVF list are scored together, exactly, against the
+    books of the `n_probe` lists whose centroids point the most the same way, so
+    the work is about `n_probe / n_lists` of the exact pass and stays in BLAS.
+    """
+    n = vectors.shape[0]
+    indices = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if n < 2 or k <= 0:
+        return indices, scores
+    unit = _unit_rows(vectors)
+    centroids = _unit_rows(index.centroids)
+    offsets, items = index.list_offsets, index.list_items
+    n_probe = max(1, min(n_probe, index.n_lists))
+    for lst in range(index.n_lists):
+        queries = items[offsets[lst] : offsets[lst + 1]]
+        if queries.size == 0:
+            continue
+        # the list itself scores 1.0 against its own centroid, so it is always probed
+        probe = np.argpartition(-(centroids @ centroids[lst]), n_probe - 1)[:n_probe]
+        cands = np.concatenate([items[offsets[p] : offsets[p + 1]] for p in probe])
+        k_eff = min(k, cands.size)
+        cand_unit = unit[cands]
+        block = _dense_block_rows(cands.size, budget_bytes)
+        for start in range(0, queries.size, block):
+            rows = queries[start : start + block]
+            sims = unit[rows] @ cand_unit.T
+            sims[rows[:, None] == cands[None, :]] = -np.inf
+            idx, sc = _top_k_rows(sims, k_eff)
+            indices[rows, :k_eff] = np.where(idx >= 0, cands[np.maximum(idx, 0)], -1)
+            scores[rows, :k_eff] = sc
+    return indices, scores
+
+
+def sparse_cosine_neighbours(
+    matrix: sparse.spmatrix, k: int, budget_bytes: int = DEFAULT_BUDGET_BYTES
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k cosine neighbours of every row of a sparse matrix, excluding itself.
+
+    Only rows sharing at least one column are candidates. Books sharing popular
+    tags make the product dense, so blocks are cut from an upper bound on each
+    row's product size (the summed sizes of its columns) to stay within
+    `budget_bytes`.
+    """
+    n = matrix.shape[0]
+    indices = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if n < 2 or k <= 0:
+        return indices, scores
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    unit = (sparse.diags(1.0 / np.maximum(norms, 1e-12)) @ matrix).tocsr()
+    unit_t = unit.T.tocsc()
+    pattern = unit.copy()
+    pattern.data[:] = 1.0
+    bound = np.minimum(pattern @ np.bincount(unit.indices, minlength=unit.shape[1]).astype(np.float64), n)
+    # per product entry: float32 value and int32 column, about doubled while scipy builds it
+    ends = np.cumsum(bound * 16)
+    start = 0
+    while start < n:
+        spent = ends[start - 1] if start else 0.0
+        end = max(start + 1, int(np.searchsorted(ends, spent + budget_bytes, side="right")))
+        sims = (unit[start:end] @ unit_t).tocsr()
+        for r in range(sims.shape[0]):
+            row = start + r
+            lo, hi = sims.indptr[r], sims.indptr[r + 1]
+            cols, vals = sims.indices[lo:hi], sims.data[lo:hi]
+            keep = (cols != row) & (vals > 0)
+            cols, vals = cols[keep], vals[keep]
+            if cols.size == 0:
+                continue
+            if cols.size > k:
+                part = np.argpartition(-vals, k - 1)[:k]
+                cols, vals = cols[part], vals[part]
+            order = np.lexsort((cols, -vals))
+            indices[row, : order.size] = cols[order]
+            scores[row, : order.size] = vals[order]
+        start = end
+    return indices, scores
+
+
+class NeighbourTable:
+    """Top-N similar books per book as fixed-width arrays.
+
+    `book_ids` is sorted; row i of `indices` (int32 rows into `book_ids`, -1
+    padded) and `scores` (float32 cosine) lists book i's neighbours best first,
+    and `sources[i]` records whether they came from ALS factors or shared tags.
+    """
+
+    FILES = ("book_ids", "indices", "scores", "sources")
+
+    def __init__(
+        self,
+        version: str,
+        book_ids: np.ndarray,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        sources: np.ndarray,
+    ):
+        self.version = version
+        self.book_ids = book_ids
+        self.indices = indices
+        self.scores = scores
+        self.sources = sources
+
+    @classmethod
+    def build(
+        cls,
+        version: str,
+        n_neighbours: int,
+        item_factors: np.ndarray | None = None,
+        factor_book_ids: Sequence[str] = (),
+        tag_matrix: BookTagMatrix | None = None,
+        ann: IVFPQIndex | None = None,
+        ann_probes: int = 64,
+        budget_bytes: int = DEFAULT_BUDGET_BYTES,
+    ) -> "NeighbourTable":
+        """ALS neighbours for every book with factors; tag-overlap neighbours for
+        the rest, and for modelled books whose ALS row came out empty. With the
+        model's `ann` index (large catalogs) ALS candidates come from its IVF lists
+        instead of every book."""
+        tag_book_ids = tag_matrix.book_ids if tag_matrix is not None else []
+        book_ids = np.unique(np.asarray(list(factor_book_ids) + list(tag_book_ids), dtype=str))
+        n = book_ids.shape[0]
+        indices = np.full((n, n_neighbours), -1, dtype=np.int32)
+        scores = np.zeros((n, n_neighbours), dtype=np.float32)
+        sources = np.full(n, SOURCE_CONTENT, dtype=np.int8)
+
+        if tag_matrix is not None and tag_matrix.shape[0]:
+            rows = np.searchsorted(book_ids, np.asarray(tag_book_ids, dtype=str)).astype(np.int32)
+            idx, sc = sparse_cosine_neighbours(tag_matrix.incidence, n_neighbours, budget_bytes)
+            indices[rows] = np.where(idx >= 0, rows[idx], -1)
+            scores[rows] = sc
+
+        if item_factors is not None and len(factor_book_ids):
+            rows = np.searchsorted(book_ids, np.asarray(factor_book_ids, dtype=str)).astype(np.int32)
+            if ann is not None:
+                idx, sc = ann_cosine_neighbours(item_factors, n_neighbours, ann, ann_probes, budget_bytes)
+            else:
+                idx, sc = cosine_neighbours(item_factors, n_neighbours, budget_bytes)
+            found = idx[:, 0] >= 0
+            indices[rows[found]] = np.where(idx[found] >= 0, rows[idx[found]], -1)
+            scores[rows[found]] = sc[found]
+            sources[rows[found]] = SOURCE_ALS
+        return cls(version, book_ids, indices, scores, sources)
+
+    @property
+    def n_neighbours(self) -> int:
+        return self.indices.shape[1]
+
+    def row(self, book_id: str) -> int | None:
+        pos = int(np.searchsorted(self.book_ids, str(book_id)))
+        if pos < self.book_ids.shape[0] and self.book_ids[pos] == str(book_id):
+            return pos
+        return None
+
+    def similar(self, book_id: str, limit: int = 10) -> tuple[list[tuple[str, float]], str | None]:
+        """(neighbours best first, source name); empty with no source for unknown books."""
+        row = self.row(book_id)
+        if row is None:
+            return [], None
+        idx = np.asarray(self.indices[row, :limit])
+        sc = np.asarray(self.scores[row, :limit])
+        keep = idx >= 0
+        items = [(str(self.book_ids[i]), float(s)) for i, s in zip(idx[keep], sc[keep])]
+        return items, SOURCE_NAMES[int(self.sources[row])]
+
+    @classmethod
+    def load_dir(cls, version: str, path: Path) -> "NeighbourTable":
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r", allow_pickle=False) for name in cls.FILES}
+        return cls(version, **arrays)
+
+
+class NeighbourStore:
+    """Versioned neighbour tables persisted through the storage provider.
+
+    Each build writes `models/similar/<version>/<array>.npy`, plus `source.json`
+    naming the catalog and model versions it was built from, and then flips
+    `models/similar/LATEST`. Readers copy a version into `RECS_CACHE_DIR` once and
+    memory-map it from there, so every worker process on a host shares the pages.
+    """
+
+    def __init__(self, storage: StorageProvider | None = None, cache_dir: str | None = None):
+        self.storage = storage or get_storage_provider()
+        self.cache_dir = Path(cache_dir or settings.RECS_CACHE_DIR) / "similar"
+
+    @staticmethod
+    def new_version() -> str:
+        return datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+
+    @staticmethod
+    def object_key(version: str, name: str) -> str:
+        return f"{NEIGHBOURS_PREFIX}/{version}/{name}.npy"
+
+    def save(self, table: NeighbourTable, source: dict | None = None) -> str:
+        for name in NeighbourTable.FILES:
+            buf = io.BytesIO()
+            np.save(buf, getattr(table, name), allow_pickle=False)
+            buf.seek(0)
+            self.storage.put(buf, self.object_key(table.version, name))
+        if source is not None:
+            key = f"{NEIGHBOURS_PREFIX}/{table.version}/source.json"
+            self.storage.put(io.BytesIO(json.dumps(source).encode("utf-8")), key)
+        self.storage.put(io.BytesIO(table.version.encode("utf-8")), NEIGHBOURS_LATEST_KEY)
+        return table.version
+
+    def latest_source(self) -> dict | None:
+        """What the LATEST table was built from, as passed to `save`."""
+        version = self.latest_version()
+        if version is None:
+            return None
+        try:
+            return json.loads(self.storage.get(f"{NEIGHBOURS_PREFIX}/{version}/source.json"))
+        except Exception:
+            return None
+
+    def prune(self, keep: int) -> list[str]:
+        """Delete all but the newest `keep` tables from storage (never the LATEST one).
+        Local copies go in `load`."""
+        return prune_versions(self.storage, NEIGHBOURS_PREFIX, keep, self.latest_version())
+
+    def latest_version(self) -> str | None:
+        try:
+            return self.storage.get(NEIGHBOURS_LATEST_KEY).decode("utf-8").strip() or None
+        except Exception:
+            # nothing built yet (or storage unavailable)
+            return None
+
+    def load(self, version: str) -> NeighbourTable:
+        local = self.cache_dir / version
+        if not all((local / f"{name}.npy").exists() for name in NeighbourTable.FILES):
+            self._download(version, local)
+        table = NeighbourTable.load_dir(version, local)
+        self._prune(keep=version)
+        return table
+
+    def _download(self, version: str, target: Path) -> None:
+        # stage into a private dir and rename, so concurrent workers never map a partial file
+        staging = self.cache_dir / f".{version}.{os.getpid()}"
+        staging.mkdir(parents=True, exist_ok=True)
+        for name in NeighbourTable.FILES:
+            with (staging / f"{name}.npy").open("wb") as f:
+                for chunk in self.storage.get_stream(self.object_key(version, name)):
+                    f.write(chunk)
+        try:
+            staging.rename(target)
+        except OSError:
+            # another worker got there first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _prune(self, keep: str) -> None:
+        # unlinking a mapped file is safe on POSIX; processes still on it keep their pages
+        for path in self.cache_dir.iterdir():
+            if path.is_dir() and path.name != keep and not path.name.startswith("."):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+_lock = threading.Lock()
+_cached_table: NeighbourTable | None = None
+_checked_at = float("-inf")
+
+
+def get_neighbour_table(store: NeighbourStore | None = None) -> NeighbourTable | None:
+    """Return the newest neighbour table, polling LATEST at most every
+    `ALS_MODEL_RELOAD_SECONDS` per process."""
+    global _cached_table, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < settings.ALS_MODEL_RELOAD_SECONDS:
+        return _cached_table
+    with _lock:
+        if now - _checked_at < settings.ALS_MODEL_RELOAD_SECONDS:
+            return _cached_table
+        store = store or NeighbourStore()
+        version = store.latest_version()
+        if version and (_cached_table is None or _cached_table.version != version):
+            try:
+                _cached_table = store.load(version)
+                logger.info("Loaded neighbour table %s", version)
+            except Exception:
+                logger.exception("Failed to load neighbour table %s", version)
+        _checked_at = time.monotonic()
+        return _cached_table
+
+
+def reset_neighbour_cache() -> None:
+    global _cached_table, _checked_at
+    with _lock:
+        _cached_table = None
+        _checked_at = float("-inf")
@@ -16,3 +16,7 @@ class StorageProvider(ABC):
 
     @abstractmethod
     def delete(self, object_name: str) -> None: ...
+
+    def list(self, prefix: str) -> Iterable[str]:
+        """Names of the objects under `prefix`; needed only by callers that prune old versions."""
+        raise NotImplementedError
@@ -29,6 +29,12 @@ class LocalStorageProvider(StorageProvider):
                     break
                 yield chunk
 
+    def list(self, prefix: str):
+        root = self.base / prefix
+        if not root.is_dir():
+            return []
+        return sorted(path.relative_to(self.base).as_posix() for path in root.rglob("*") if path.is_file())
+
     def delete(self, object_name: str) -> None:
         path = self.base / object_name
         if path.exists():
@@ -41,5 +41,9 @@ class MinioStorageProvider(StorageProvider):
             response.close()
             response.release_conn()
 
+    def list(self, prefix: str):
+        for obj in self.client.list_objects(settings.STORAGE_BUCKET, prefix=prefix, recursive=True):
+            yield obj.object_name
+
     def delete(self, object_name: str) -> None:
         self.client.remove_object(settings.STORAGE_BUCKET, object_name)
@@ -1,7 +1,10 @@
 from typing import Optional, Sequence
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from app.models import Book, BookFile, BookAISummary
+from datetime import datetime
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models import Book, BookFile, BookAISummary, BookSummaryChunk, SummaryCacheEntry
+from app.repositories.catalog_repo import CatalogRepository
 
 
 class BookRepository:
@@ -15,6 +18,7 @@ class BookRepository:
     def create(self, **kwargs) -> Book:
         book = Book(**kwargs)
         self.db.add(book)
+        CatalogRepository(self.db).bump()
         self.db.flush()
         return book
 
@@ -27,6 +31,7 @@ class BookRepository:
 
     def delete(self, book: Book):
         self.db.delete(book)
+        CatalogRepository(self.db).bump()
 
     def update(self, book: Book, **kwargs) -> Book:
         for k, v in kwargs.items():
@@ -77,3 +82,88 @@ class BookSummaryRepository:
         self.db.add(summary)
         self.db.flush()
         return summary
+
+
+class BookSummaryChunkRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def completed(self, book_id: str, level: int) -> dict[int, tuple[str, str]]:
+        """idx -> (source_hash, summary) of the chunks already summarized at this level."""
+        stmt = select(BookSummaryChunk.idx, BookSummaryChunk.source_hash, BookSummaryChunk.summary).where(
+            BookSummaryChunk.book_id == book_id, BookSummaryChunk.level == level
+        )
+        return {idx: (source_hash, summary) for idx, source_hash, summary in self.db.execute(stmt)}
+
+    def save(self, book_id: str, level: int, idx: int, source_hash: str, summary: str) -> None:
+        stmt = pg_insert(BookSummaryChunk).values(
+            book_id=book_id,
+            level=level,
+            idx=idx,
+            source_hash=source_hash,
+            summary=summary,
+            created_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_book_summary_chunks_book_level_idx",
+            set_={"source_hash": stmt.excluded.source_hash, "summary": stmt.excluded.summary, "created_at": stmt.excluded.created_at},
+        )
+        self.db.execute(stmt)
+
+    def clear(self, book_id: str) -> None:
+        self.db.execute(delete(BookSummaryChunk).where(BookSummaryChunk.book_id == book_id))
+
+
+class SummaryCacheRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, content_sha256: str, prompt_version: str, model_name: str) -> Optional[str]:
+        """Cached summary for this content/prompt/model, marking the entry as used."""
+        stmt = (
+            update(SummaryCacheEntry)
+            .where(
+                SummaryCacheEntry.content_sha256 == content_sha256,
+                SummaryCacheEntry.prompt_version == prompt_version,
+                SummaryCacheEntry.model_name == model_name,
+            )
+            .values(last_used_at=datetime.utcnow(), hit_count=SummaryCacheEntry.hit_count + 1)
+            .returning(SummaryCacheEntry.summary)
+        )
+        return self.db.execute(stmt).scalar_one_or_none()
+
+    def put(self, content_sha256: str, prompt_version: str, model_name: str, summary: str) -> None:
+        now = datetime.utcnow()
+        stmt = pg_insert(SummaryCacheEntry).values(
+            content_sha256=content_sha256,
+            prompt_version=prompt_version,
+            model_name=model_name,
+            summary=summary,
+            hit_count=0,
+            created_at=now,
+            last_used_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_summary_cache_key",
+            set_={"summary": stmt.excluded.summary, "last_used_at": stmt.excluded.last_used_at},
+        )
+        self.db.execute(stmt)
+
+    def evict(self, unused_since: datetime, max_entries: int, batch_size: int) -> int:
+        """Delete up to `batch_size` entries: first those unused since `unused_since`,
+        then the least recently used beyond `max_entries`. Returns rows deleted."""
+        expired = (
+            select(SummaryCacheEntry.id)
+            .where(SummaryCacheEntry.last_used_at < unused_since)
+            .limit(batch_size)
+        )
+        deleted = self.db.execute(delete(SummaryCacheEntry).where(SummaryCacheEntry.id.in_(expired))).rowcount
+        if deleted >= batch_size:
+            return deleted
+        overflow = (
+            select(SummaryCacheEntry.id)
+            .order_by(SummaryCacheEntry.last_used_at.desc())
+            .offset(max_entries)
+            .limit(batch_size - deleted)
+        )
+        return deleted + self.db.execute(delete(SummaryCacheEntry).where(SummaryCacheEntry.id.in_(overflow))).rowcount
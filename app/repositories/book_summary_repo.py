@@ -1,8 +1,11 @@
+from datetime import datetime
 from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select, update
 from app.models import BookAISummary, BookReviewConsensus
 
+IN_FLIGHT_STATUSES = ("pending", "running")
+
 
 class BookSummaryRepository:
     def __init__(self, db: Session):
@@ -15,3 +18,44 @@ class BookSummaryRepository:
     def get_consensus(self, book_id: str) -> Optional[BookReviewConsensus]:
         stmt = select(BookReviewConsensus).where(BookReviewConsensus.book_id == book_id)
         return self.db.scalar(stmt)
+
+    @staticmethod
+    def _stale(prompt_version: str, model_name: str, stalled_before: datetime):
+        # summaries from another prompt/model that are not already being regenerated;
+        # rows left pending/running since `stalled_before` lost their task and count as stale
+        return and_(
+            or_(BookAISummary.prompt_version != prompt_version, BookAISummary.model_name != model_name),
+            or_(BookAISummary.status.notin_(IN_FLIGHT_STATUSES), BookAISummary.updated_at < stalled_before),
+        )
+
+    def stale_book_ids(
+        self, prompt_version: str, model_name: str, stalled_before: datetime, after=None, limit: int = 100
+    ) -> list:
+        """Next `limit` stale book ids after `after`, in book_id (keyset) order."""
+        stmt = select(BookAISummary.book_id).where(self._stale(prompt_version, model_name, stalled_before))
+        if after is not None:
+            stmt = stmt.where(BookAISummary.book_id > after)
+        return list(self.db.scalars(stmt.order_by(BookAISummary.book_id).limit(limit)))
+
+    def count_stale(self, prompt_version: str, model_name: str, stalled_before: datetime, after=None) -> int:
+        stmt = select(func.count()).select_from(BookAISummary).where(self._stale(prompt_version, model_name, stalled_before))
+        if after is not None:
+            stmt = stmt.where(BookAISummary.book_id > after)
+        return self.db.scalar(stmt) or 0
+
+    def count_in_flight(self, since: datetime) -> int:
+        """Summaries queued or generating, updated since `since` (older ones are presumed lost)."""
+        stmt = (
+            select(func.count())
+            .select_from(BookAISummary)
+            .where(BookAISummary.status.in_(IN_FLIGHT_STATUSES), BookAISummary.updated_at >= since)
+        )
+        return self.db.scalar(stmt) or 0
+
+    def mark_pending(self, book_ids: list) -> None:
+        # the current summary stays readable until the new one replaces it
+        self.db.execute(
+            update(BookAISummary)
+            .where(BookAISummary.book_id.in_(book_ids))
+            .values(status="pending", error_message=None, updated_at=datetime.utcnow())
+        )
@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models import CatalogVersion
+
+CATALOG = "catalog"
+
+
+class CatalogRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def version(self) -> int:
+        stmt = select(CatalogVersion.version).where(CatalogVersion.name == CATALOG)
+        return self.db.scalar(stmt) or 0
+
+    def bump(self) -> None:
+        # transactional: readers only see the new version once the catalog change commits
+        stmt = pg_insert(CatalogVersion).values(name=CATALOG, version=1, updated_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CatalogVersion.name],
+            set_={"version": CatalogVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+        )
+        self.db.execute(stmt)
@@ -1,8 +1,37 @@
 from typing import List, Sequence
 import uuid
+from datetime import datetime
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import select, delete, desc
-from app.models import RecommendationSnapshot, RecommendationItem, UserTagPreference, Borrow, Book, Tag, Review
+from sqlalchemy import (
+    select,
+    insert,
+    update,
+    delete,
+    desc,
+    func,
+    cast,
+    literal,
+    union,
+    union_all,
+    exists,
+    String,
+    Float,
+    DateTime,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models import (
+    RecommendationSnapshot,
+    RecommendationItem,
+    UserTagPreference,
+    UserFactorOverlay,
+    Borrow,
+    Book,
+    BookTag,
+    Tag,
+    Review,
+    User,
+)
 
 
 class RecommendationRepository:
@@ -10,8 +39,11 @@ class RecommendationRepository:
         self.db = db
 
     def latest_snapshot(self, user_id: str) -> RecommendationSnapshot | None:
-        stmt = select(RecommendationSnapshot).where(RecommendationSnapshot.user_id == user_id).order_by(
-            desc(RecommendationSnapshot.generated_at)
+        stmt = (
+            select(RecommendationSnapshot)
+            .where(RecommendationSnapshot.user_id == user_id)
+            .order_by(desc(RecommendationSnapshot.generated_at))
+            .limit(1)
         )
         return self.db.scalars(stmt).first()
 
@@ -24,16 +56,58 @@ class RecommendationRepository:
     def replace_items(self, snapshot_id: str, items: List[tuple[str, float]]):
         self.db.execute(delete(RecommendationItem).where(RecommendationItem.snapshot_id == snapshot_id))
         ranked = sorted(items, key=lambda x: x[1], reverse=True)
-        for rank, (book_id, score) in enumerate(ranked, start=1):
-            self.db.add(
-                RecommendationItem(
-                    snapshot_id=snapshot_id,
-                    book_id=book_id,
-                    score=score,
-                    rank=rank,
-                )
+        if ranked:
+            self.db.execute(
+                insert(RecommendationItem),
+                [
+                    {"id": uuid.uuid4(), "snapshot_id": snapshot_id, "book_id": book_id, "score": score, "rank": rank}
+                    for rank, (book_id, score) in enumerate(ranked, start=1)
+                ],
             )
-        self.db.flush()
+
+    def compact_snapshots(self, keep: int, batch_size: int = 5000) -> int:
+        """Delete up to `batch_size` snapshots beyond each user's newest `keep`
+        (items go with them via ON DELETE CASCADE). Returns the number deleted;
+        callers loop until it drops below `batch_size`."""
+        ranked = select(
+            RecommendationSnapshot.id,
+            func.row_number()
+            .over(
+                partition_by=RecommendationSnapshot.user_id,
+                order_by=desc(RecommendationSnapshot.generated_at),
+            )
+            .label("rn"),
+        ).subquery()
+        expired = select(ranked.c.id).where(ranked.c.rn > keep).limit(batch_size)
+        result = self.db.execute(
+            delete(RecommendationSnapshot)
+            .where(RecommendationSnapshot.id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    def bulk_create_snapshots(
+        self,
+        results: Sequence[tuple[str, str | None, List[tuple[str, float]]]],
+        chunk_size: int = 5000,
+    ) -> int:
+        """Insert one snapshot plus ranked items per (user_id, provider, scores) with multi-row INSERTs."""
+        generated_at = datetime.utcnow()
+        snapshots = []
+        items = []
+        for user_id, provider, scores in results:
+            snapshot_id = uuid.uuid4()
+            snapshots.append({"id": snapshot_id, "user_id": user_id, "generated_at": generated_at, "provider": provider})
+            ranked = sorted(scores, key=lambda x: x[1], reverse=True)
+            for rank, (book_id, score) in enumerate(ranked, start=1):
+                items.append(
+                    {"id": uuid.uuid4(), "snapshot_id": snapshot_id, "book_id": book_id, "score": score, "rank": rank}
+                )
+        for start in range(0, len(snapshots), chunk_size):
+            self.db.execute(insert(RecommendationSnapshot), snapshots[start : start + chunk_size])
+        for start in range(0, len(items), chunk_size):
+            self.db.execute(insert(RecommendationItem), items[start : start + chunk_size])
+        return len(snapshots)
 
     def user_preferences(self, user_id: str) -> Sequence[UserTagPreference]:
         stmt = select(UserTagPreference).where(UserTagPreference.user_id == user_id)
@@ -47,32 +121,196 @@ class RecommendationRepository:
         )
         return {name: weight for name, weight in self.db.execute(stmt)}
 
-    def user_borrowed_book_ids(self, user_id: str) -> set[str]:
-        try:
-            u = uuid.UUID(str(user_id))
-        except Exception:
-            u = user_id
-        stmt = select(Borrow.book_id).where(Borrow.user_id == u)
-        return {str(row[0]) for row in self.db.execute(stmt)}
+    def all_user_preferences_with_names(self) -> dict[str, dict[str, float]]:
+        stmt = select(UserTagPreference.user_id, Tag.name, UserTagPreference.weight).join(
+            Tag, Tag.id == UserTagPreference.tag_id
+        )
+        prefs: dict[str, dict[str, float]] = {}
+        for user_id, name, weight in self.db.execute(stmt):
+            prefs.setdefault(str(user_id), {})[name] = weight
+        return prefs
+
+    def recompute_preferences(self, user_ids: Sequence[str] | None = None) -> None:
+        """Rebuild tag weights from borrow history in one aggregate upsert.
+
+        Weight = number of distinct borrowed books carrying the tag. Covers the given
+        users (all users when None); tags a user no longer has are removed.
+        """
+        users = [uuid.UUID(str(u)) for u in user_ids] if user_ids is not None else None
+        counts = (
+            select(
+                func.gen_random_uuid(),
+                Borrow.user_id,
+                BookTag.tag_id,
+                cast(func.count(func.distinct(Borrow.book_id)), Float),
+                literal(datetime.utcnow(), DateTime),
+            )
+            .join(BookTag, BookTag.book_id == Borrow.book_id)
+            .group_by(Borrow.user_id, BookTag.tag_id)
+        )
+        if users is not None:
+            counts = counts.where(Borrow.user_id.in_(users))
+        stmt = pg_insert(UserTagPreference).from_select(["id", "user_id", "tag_id", "weight", "updated_at"], counts)
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_user_tag_pref_user_tag",
+            set_={"weight": stmt.excluded.weight, "updated_at": stmt.excluded.updated_at},
+        )
+        self.db.execute(stmt)
+
+        still_held = (
+            select(literal(1))
+            .select_from(Borrow)
+            .join(BookTag, BookTag.book_id == Borrow.book_id)
+            .where(Borrow.user_id == UserTagPreference.user_id, BookTag.tag_id == UserTagPreference.tag_id)
+        )
+        stale = delete(UserTagPreference).where(~exists(still_held))
+        if users is not None:
+            stale = stale.where(UserTagPreference.user_id.in_(users))
+        self.db.execute(stale.execution_options(synchronize_session=False))
+
+    def apply_borrow_delta(self, user_id: str, book_id: str, borrow_id: str | None = None) -> bool:
+        """Add 1.0 to the user's weight for each of the book's tags with one atomic
+        upsert. A repeat borrow of the same book is skipped, matching the distinct
+        count of `recompute_preferences`. With `borrow_id`, the borrow is marked in
+        the same transaction and a delta already applied for it is skipped; returns
+        whether it was applied."""
+        u, b = uuid.UUID(str(user_id)), uuid.UUID(str(book_id))
+        if borrow_id is not None:
+            claimed = self.db.execute(
+                update(Borrow)
+                .where(Borrow.id == uuid.UUID(str(borrow_id)), Borrow.prefs_applied_at.is_(None))
+                .values(prefs_applied_at=datetime.utcnow())
+            ).rowcount
+            if not claimed:
+                return False
+        repeat = (
+            select(func.count())
+            .select_from(Borrow)
+            .where(Borrow.user_id == u, Borrow.book_id == b)
+            .scalar_subquery()
+        )
+        deltas = select(
+            func.gen_random_uuid(),
+            literal(u, UserTagPreference.user_id.type),
+            BookTag.tag_id,
+            literal(1.0, Float),
+            literal(datetime.utcnow(), DateTime),
+        ).where(BookTag.book_id == b, repeat <= 1)
+        stmt = pg_insert(UserTagPreference).from_select(["id", "user_id", "tag_id", "weight", "updated_at"], deltas)
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_user_tag_pref_user_tag",
+            set_={"weight": UserTagPreference.weight + stmt.excluded.weight, "updated_at": stmt.excluded.updated_at},
+        )
+        self.db.execute(stmt)
+        return True
+
+    def user_ids_page(self, after: str | None = None, limit: int = 1000) -> list[str]:
+        """Keyset page of user ids, for jobs that sweep every user in batches."""
+        stmt = select(User.id).order_by(User.id).limit(limit)
+        if after is not None:
+            stmt = stmt.where(User.id > uuid.UUID(str(after)))
+        return [str(u) for u in self.db.scalars(stmt)]
+
+    def interacted_book_ids(self, user_ids: Sequence[str]) -> dict[str, set[str]]:
+        """Books each user borrowed or reviewed (their interaction row), in one query."""
+        users = [uuid.UUID(str(u)) for u in user_ids]
+        stmt = union(
+            select(Borrow.user_id, Borrow.book_id).where(Borrow.user_id.in_(users)),
+            select(Review.user_id, Review.book_id).where(Review.user_id.in_(users)),
+        )
+        books: dict[str, set[str]] = {str(u): set() for u in users}
+        for user_id, book_id in self.db.execute(stmt):
+            books[str(user_id)].add(str(book_id))
+        return books
 
     # --- ML prep helpers ---
-    def interactions(self) -> list[tuple[str, str, float]]:
-        rows: list[tuple[str, str, float]] = []
-        # borrows as implicit positives
-        for user_id, book_id in self.db.execute(select(Borrow.user_id, Borrow.book_id)):
-            rows.append((str(user_id), str(book_id), 1.0))
-        # reviews add rating/5 capped at +1
-        for user_id, book_id, rating in self.db.execute(select(Review.user_id, Review.book_id, Review.rating)):
-            bonus = min(1.0, (rating or 0) / 5.0)
-            rows.append((str(user_id), str(book_id), bonus))
-        return rows
-
-    def index_mappings(self, interactions: list[tuple[str, str, float]]):
-        user_ids = sorted({u for u, _, _ in interactions})
-        book_ids = sorted({b for _, b, _ in interactions})
-        user_to_idx = {u: i for i, u in enumerate(user_ids)}
-        book_to_idx = {b: i for i, b in enumerate(book_ids)}
-        return user_to_idx, book_to_idx, user_ids, book_ids
+    def interactions_version(self) -> tuple:
+        """Cheap fingerprint of the interaction data: row counts and newest timestamps.
+
+        Read once per matrix request (training and batch scoring), so borrow and
+        review writes never contend on a shared counter row.
+        """
+        stmt = select(
+            select(func.count()).select_from(Borrow).scalar_subquery(),
+            select(func.max(Borrow.borrowed_at)).scalar_subquery(),
+            select(func.count()).select_from(Review).scalar_subquery(),
+            select(func.max(Review.created_at)).scalar_subquery(),
+        )
+        return tuple(self.db.execute(stmt).one())
+
+    def _interaction_rows(self, user_id: str | None = None):
+        # borrows count as implicit positives (1.0); reviews add rating/5 capped at +1
+        borrows = select(
+            cast(Borrow.user_id, String).label("user_id"),
+            cast(Borrow.book_id, String).label("book_id"),
+            literal(1.0, Float).label("weight"),
+        )
+        reviews = select(
+            cast(Review.user_id, String),
+            cast(Review.book_id, String),
+            func.least(1.0, func.coalesce(Review.rating, 0) / 5.0),
+        )
+        if user_id is not None:
+            borrows = borrows.where(Borrow.user_id == user_id)
+            reviews = reviews.where(Review.user_id == user_id)
+        return union_all(borrows, reviews)
+
+    def interaction_arrays(self, batch_size: int = 50_000) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Stream every (user_id, book_id, weight) row as arrays."""
+        result = self.db.execute(self._interaction_rows().execution_options(yield_per=batch_size))
+        users: list[np.ndarray] = []
+        books: list[np.ndarray] = []
+        weights: list[np.ndarray] = []
+        for chunk in result.partitions():
+            u, b, w = zip(*chunk)
+            users.append(np.asarray(u, dtype=str))
+            books.append(np.asarray(b, dtype=str))
+            weights.append(np.asarray(w, dtype=np.float32))
+        if not users:
+            return np.empty(0, dtype=str), np.empty(0, dtype=str), np.empty(0, dtype=np.float32)
+        return np.concatenate(users), np.concatenate(books), np.concatenate(weights)
+
+    def user_interactions(self, user_id: str) -> dict[str, float]:
+        """One user's interaction row as book_id -> summed weight."""
+        row: dict[str, float] = {}
+        for _, book_id, weight in self.db.execute(self._interaction_rows(user_id)):
+            row[book_id] = row.get(book_id, 0.0) + float(weight)
+        return row
+
+    def factor_overlay(self, user_id: str, model_version: str) -> np.ndarray | None:
+        stmt = select(UserFactorOverlay.factors).where(
+            UserFactorOverlay.user_id == user_id, UserFactorOverlay.model_version == model_version
+        )
+        data = self.db.scalar(stmt)
+        return np.frombuffer(data, dtype=np.float32) if data is not None else None
+
+    def factor_overlays(self, model_version: str) -> dict[str, np.ndarray]:
+        stmt = select(UserFactorOverlay.user_id, UserFactorOverlay.factors).where(
+            UserFactorOverlay.model_version == model_version
+        )
+        return {str(u): np.frombuffer(f, dtype=np.float32) for u, f in self.db.execute(stmt)}
+
+    def upsert_factor_overlay(self, user_id: str, model_version: str, factors: np.ndarray) -> None:
+        stmt = pg_insert(UserFactorOverlay).values(
+            user_id=user_id,
+            model_version=model_version,
+            factors=np.asarray(factors, dtype=np.float32).tobytes(),
+            updated_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserFactorOverlay.user_id],
+            set_={
+                "model_version": stmt.excluded.model_version,
+                "factors": stmt.excluded.factors,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        self.db.execute(stmt)
+
+    def purge_factor_overlays(self, keep_version: str) -> int:
+        """Drop overlays solved against older models; a retrain has absorbed them."""
+        result = self.db.execute(delete(UserFactorOverlay).where(UserFactorOverlay.model_version != keep_version))
+        return result.rowcount or 0
 
     def list_books(self) -> Sequence[Book]:
         stmt = select(Book)
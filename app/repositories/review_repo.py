@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import func, select
 from app.models import Review
 
 
@@ -21,3 +22,14 @@ class ReviewRepository:
     def list_for_book(self, book_id: str):
         stmt = select(Review).where(Review.book_id == book_id)
         return list(self.db.scalars(stmt))
+
+    def created_after(self, book_id: str, after: datetime | None) -> list[Review]:
+        """Reviews of the book created after `after` (all of them when None), oldest first."""
+        stmt = select(Review).where(Review.book_id == book_id)
+        if after is not None:
+            stmt = stmt.where(Review.created_at > after)
+        return list(self.db.scalars(stmt.order_by(Review.created_at, Review.id)))
+
+    def count_through(self, book_id: str, through: datetime) -> int:
+        stmt = select(func.count()).select_from(Review).where(Review.book_id == book_id, Review.created_at <= through)
+        return self.db.scalar(stmt) or 0
@@ -2,6 +2,7 @@ from typing import List, Sequence
 from sqlalchemy.orm import Session
 from sqlalchemy import select, delete
 from app.models import Tag, BookTag
+from app.repositories.catalog_repo import CatalogRepository
 
 
 class TagRepository:
@@ -24,6 +25,7 @@ class TagRepository:
             tag = self.get_or_create(name.strip())
             bt = BookTag(book_id=book_id, tag_id=tag.id)
             self.db.merge(bt)
+        CatalogRepository(self.db).bump()
         self.db.flush()
 
     def get_tags_for_book(self, book_id: str) -> Sequence[Tag]:
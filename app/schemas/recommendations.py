@@ -1,3 +1,4 @@
+from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel, ConfigDict
 
@@ -12,4 +13,14 @@ class RecommendationItemOut(BaseModel):
 
 class RecommendationsOut(BaseModel):
     items: list[RecommendationItemOut]
+    generated_at: datetime | None = None
+    provider: str | None = None
+    stale: bool = False
+    message: str | None = None
+
+
+class SimilarBooksOut(BaseModel):
+    book_id: UUID
+    items: list[RecommendationItemOut]
+    provider: str | None = None
     message: str | None = None
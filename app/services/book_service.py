@@ -1,5 +1,7 @@
+import hashlib
+import logging
 import os
-from typing import Optional, Tuple
+from typing import BinaryIO, Optional, Tuple
 from fastapi import HTTPException, status, UploadFile
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
@@ -8,6 +10,25 @@ from app.repositories.tag_repo import TagRepository
 from app.providers.storage import get_storage_provider
 from app.core.config import settings
 from app.core.celery_app import celery_app
+from app.core.database import after_commit
+
+logger = logging.getLogger(__name__)
+
+
+class _HashingReader:
+    """Read-only file wrapper that sha256-hashes the bytes as they are read."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self._sha256.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
 
 
 class BookService:
@@ -55,19 +76,11 @@ class BookService:
             if tag_list:
                 self.tags.set_book_tags(str(book.id), tag_list)
 
-        object_key = f"{book.id}/{file.filename or 'upload'}"
-        stored_key = self.storage.put(file.file, object_key)
-        self.book_files.upsert(
-            book_id=str(book.id),
-            storage_provider=settings.STORAGE_PROVIDER,
-            object_key=stored_key,
-            file_type=file_type,
-            mime_type=file.content_type,
-            original_filename=file.filename,
-            size_bytes=self._file_size(file),
-        )
+        self._store_file(book, file, file_type)
 
-        self.book_summaries.ensure_pending(book_id=str(book.id), model_name=settings.OLLAMA_MODEL, prompt_version="v1")
+        self.book_summaries.ensure_pending(
+            book_id=str(book.id), model_name=settings.OLLAMA_MODEL, prompt_version=settings.SUMMARY_PROMPT_VERSION
+        )
         self._enqueue_summary(book_id=str(book.id))
         self._flush_or_raise_conflict()
         self.db.refresh(book)
@@ -112,19 +125,11 @@ class BookService:
             size = self._file_size(file)
             if size is not None and size > settings.MAX_UPLOAD_MB * 1024 * 1024:
                 raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
-            object_key = f"{book.id}/{file.filename or 'upload'}"
-            stored_key = self.storage.put(file.file, object_key)
-            self.book_files.upsert(
-                book_id=str(book.id),
-                storage_provider=settings.STORAGE_PROVIDER,
-                object_key=stored_key,
-                file_type=file_type,
-                mime_type=file.content_type,
-                original_filename=file.filename,
-                size_bytes=self._file_size(file),
+            self._store_file(book, file, file_type)
+            # re-run summary on content change (an unchanged file is served from the summary cache)
+            self.book_summaries.ensure_pending(
+                book_id=str(book.id), model_name=settings.OLLAMA_MODEL, prompt_version=settings.SUMMARY_PROMPT_VERSION
             )
-            # re-run summary on content change
-            self.book_summaries.ensure_pending(book_id=str(book.id), model_name=settings.OLLAMA_MODEL, prompt_version="v1")
             self._enqueue_summary(book_id=str(book.id))
         if tags is not None:
             tag_list = [t.strip() for t in tags.split(",") if t.strip()]
@@ -137,14 +142,57 @@ class BookService:
         book = self.books.get(book_id)
         if not book:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
-        # Best-effort delete file
-        # Note: we don't hard fail if storage delete fails
-        # Could be enhanced with file lookup and delete
+        bf = self.book_files.get_by_book(str(book.id))
         self.books.delete(book)
+        if bf:
+            # the upload and its extracted text go once the rows are gone
+            self._delete_objects_after_commit(bf.object_key, bf.text_object_key)
         return
 
+    def _store_file(self, book, file: UploadFile, file_type: str):
+        # hash while storage reads the upload, so the summary cache key costs no extra pass
+        reader = _HashingReader(file.file)
+        object_key = f"{book.id}/{file.filename or 'upload'}"
+        previous = self.book_files.get_by_book(str(book.id))
+        superseded = (previous.object_key, previous.text_object_key) if previous else ()
+        stored_key = self.storage.put(reader, object_key)
+        # an upload under the same name was overwritten in place; only remove what the new row stops pointing at
+        self._delete_objects_after_commit(*(key for key in superseded if key != stored_key))
+        return self.book_files.upsert(
+            book_id=str(book.id),
+            storage_provider=settings.STORAGE_PROVIDER,
+            object_key=stored_key,
+            file_type=file_type,
+            mime_type=file.content_type,
+            original_filename=file.filename,
+            size_bytes=self._file_size(file),
+            content_sha256=reader.hexdigest(),
+            # text extracted from the previous upload no longer applies
+            text_object_key=None,
+            text_version=None,
+            text_sha256=None,
+            text_chars=None,
+            text_page_offsets=None,
+        )
+
+    def _delete_objects_after_commit(self, *keys: Optional[str]):
+        def delete():
+            for key in keys:
+                try:
+                    self.storage.delete(key)
+                except Exception:
+                    # best effort: an orphaned object is harmless, a failed request is not
+                    logger.warning("could not delete %s from storage", key, exc_info=True)
+
+        keys = tuple(key for key in keys if key)
+        if keys:
+            # registered before the summary task, so a re-extraction never races the delete
+            after_commit(self.db, delete)
+
     def _enqueue_summary(self, book_id: str):
-        celery_app.send_task("app.workers.tasks.summarize_book", args=[book_id])
+        # only once the new file row is committed; a worker started earlier would
+        # miss the book or summarize the previous upload's content
+        after_commit(self.db, lambda: celery_app.send_task("app.workers.tasks.summarize_book", args=[book_id]))
 
     @staticmethod
     def _file_size(upload: UploadFile) -> Optional[int]:
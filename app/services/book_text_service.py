@@ -0,0 +1,45 @@
+from sqlalchemy.orm import Session
+from app.core.metrics import TEXT_ARTIFACT_READS
+from app.models import BookFile
+from app.providers.storage import get_storage_provider
+from app.providers.storage.base import StorageProvider
+from app.services.text_extraction import TEXT_ARTIFACT_VERSION, read_text_artifact, write_text_artifact
+
+
+def text_artifact_key(bf: BookFile) -> str:
+    return f"{bf.object_key}.{TEXT_ARTIFACT_VERSION}.txt.gz"
+
+
+class BookTextService:
+    """Extracted text of a book's file, for every consumer that needs it.
+
+    The first read extracts and normalizes the upload once and stores the text
+    gzip-compressed next to it, recording its hash, length and PDF page offsets on
+    `book_files`. Later reads (summary re-runs after a prompt change, retries)
+    only decompress that artifact. A new upload clears the record, and an artifact
+    written by an older `TEXT_ARTIFACT_VERSION` is rebuilt.
+    """
+
+    def __init__(self, db: Session, storage: StorageProvider | None = None):
+        self.db = db
+        self.storage = storage or get_storage_provider()
+
+    def ensure(self, bf: BookFile) -> BookFile:
+        if bf.text_object_key and bf.text_version == TEXT_ARTIFACT_VERSION:
+            TEXT_ARTIFACT_READS.labels("artifact").inc()
+            return bf
+        artifact = write_text_artifact(self.storage, bf.object_key, bf.mime_type or "", text_artifact_key(bf))
+        bf.text_object_key = artifact.object_key
+        bf.text_version = TEXT_ARTIFACT_VERSION
+        bf.text_sha256 = artifact.sha256
+        bf.text_chars = artifact.chars
+        bf.text_page_offsets = artifact.page_offsets
+        # committed on its own, so a failure further down the caller's work keeps the artifact
+        self.db.commit()
+        TEXT_ARTIFACT_READS.labels("extracted").inc()
+        return bf
+
+    def read(self, bf: BookFile, max_chars: int | None = None) -> str:
+        """Normalized text of the file, cut off at `max_chars` (all of it when None)."""
+        self.ensure(bf)
+        return read_text_artifact(self.storage, bf.text_object_key, max_chars=max_chars)
@@ -3,6 +3,13 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from app.repositories.borrow_repo import BorrowRepository
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import after_commit
+from app.core.debounce import claim
+from app.core.metrics import RECS_RECOMPUTE_COLLAPSED
+
+PREFS_TASK = "app.workers.tasks.recompute_user_preferences"
+RECS_TASK = "app.workers.tasks.recompute_recommendations"
 
 
 class BorrowService:
@@ -16,7 +23,7 @@ class BorrowService:
         if self.repo.get_active_by_user(user_id):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already has an active borrow")
         borrow = self.repo.create(user_id=user_id, book_id=book_id)
-        self._enqueue_recompute(user_id)
+        self._enqueue_recompute(user_id, borrow=borrow)
         return borrow
 
     def return_book(self, user_id: str, book_id: str):
@@ -27,6 +34,24 @@ class BorrowService:
         self._enqueue_recompute(user_id)
         return borrow
 
-    def _enqueue_recompute(self, user_id: str):
-        celery_app.send_task("app.workers.tasks.recompute_user_preferences", args=[user_id])
-        celery_app.send_task("app.workers.tasks.recompute_recommendations", args=[user_id])
+    def _enqueue_recompute(self, user_id: str, borrow=None):
+        incremental = settings.RECS_PREFS_MODE == "incremental"
+        if incremental and borrow is not None:
+            # deltas are not idempotent, so every borrow sends its own (marked on the borrow
+            # when applied); only the chain below is coalesced. Sent after commit, so the
+            # worker's repeat-borrow check sees this borrow.
+            args = [user_id, str(borrow.book_id), str(borrow.id)]
+            after_commit(self.db, lambda: celery_app.send_task("app.workers.tasks.apply_preference_delta", args=args))
+        tasks = [RECS_TASK] if incremental else [PREFS_TASK, RECS_TASK]
+
+        window = settings.RECS_RECOMPUTE_DEBOUNCE_SECONDS
+        if not claim(f"recompute:{user_id}", window):
+            # the chain scheduled at the start of this window runs after it closes and covers this event
+            for name in tasks:
+                RECS_RECOMPUTE_COLLAPSED.labels(task=name).inc()
+            return
+        # one ordered chain per window: recs is linked to run only after prefs finished
+        link = celery_app.signature(RECS_TASK, args=[user_id], immutable=True) if len(tasks) > 1 else None
+        after_commit(
+            self.db, lambda: celery_app.send_task(tasks[0], args=[user_id], countdown=window or None, link=link)
+        )
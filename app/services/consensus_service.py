@@ -0,0 +1,106 @@
+from pathlib import Path
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import TASK_STAGE_SECONDS, REVIEW_CONSENSUS_REVIEWS
+from app.models import BookReviewConsensus, Review
+from app.providers.llm import get_llm_provider
+from app.providers.llm.base import LLMProvider
+from app.providers.llm.budget import PromptBudget, cut_to_tokens
+from app.repositories.review_repo import ReviewRepository
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "core" / "prompts"
+CONSENSUS_PROMPT_PATH = PROMPTS_DIR / "review_consensus.txt"
+REVISE_PROMPT_PATH = PROMPTS_DIR / "review_consensus_revise.txt"
+PROMPT_VERSION = "v1"
+
+
+def _stage(stage: str):
+    return TASK_STAGE_SECONDS.labels("update_review_consensus", stage).time()
+
+
+def _review_line(review: Review) -> str:
+    return f"Rating: {review.rating}. Review: {review.review_text or ''}"
+
+
+class ConsensusService:
+    """Review consensus kept up to date with a rolling watermark.
+
+    In incremental mode a run revises the stored consensus with only the reviews
+    created after `reviews_through`, so its cost follows the new reviews rather
+    than the book's history. A full rebuild happens in full mode, for the first
+    consensus, and whenever the number of reviews up to the watermark no longer
+    matches `reviews_included` (a review committed late, or one deleted). Each call
+    carries as many whole reviews as fit the model context next to the current
+    consensus, and the watermark is committed after every call, so no review is
+    dropped and a failed run resumes where it stopped.
+    """
+
+    def __init__(self, db: Session, llm: LLMProvider | None = None):
+        self.db = db
+        self.llm = llm or get_llm_provider()
+        self.reviews = ReviewRepository(db)
+
+    def update(self, book_id: str) -> BookReviewConsensus:
+        with _stage("fetch"):
+            row = self.db.execute(
+                select(BookReviewConsensus).where(BookReviewConsensus.book_id == book_id)
+            ).scalar_one_or_none()
+            if not row:
+                row = BookReviewConsensus(book_id=book_id, model_name=settings.OLLAMA_MODEL, prompt_version=PROMPT_VERSION)
+                self.db.add(row)
+            row.status = "running"
+            row.error_message = None
+            self.db.flush()
+
+            if self._can_revise(book_id, row):
+                mode = "incremental"
+                consensus, through, included = row.consensus, row.reviews_through, row.reviews_included
+            else:
+                mode = "rebuild"
+                consensus, through, included = None, None, 0
+            new_reviews = self.reviews.created_after(book_id, through)
+        if not new_reviews and consensus is None:
+            raise RuntimeError("No reviews found")
+
+        num_predict = settings.REVIEW_CONSENSUS_NUM_PREDICT
+        initial = PromptBudget("review_consensus", CONSENSUS_PROMPT_PATH.read_text(encoding="utf-8"), num_predict)
+        revise = PromptBudget("review_consensus_revise", REVISE_PROMPT_PATH.read_text(encoding="utf-8"), num_predict)
+        lines = [_review_line(r) for r in new_reviews]
+        start = 0
+        while start < len(lines):
+            if consensus is None:
+                budget, header = initial, ""
+            else:
+                budget, header = revise, f"Current consensus (from {included} reviews):\n{consensus}\n\nNew reviews:\n"
+            reserved = budget.estimator.count(header)
+            n = budget.pack(lines[start:], reserved=reserved)
+            # only a single review longer than the whole budget gets shortened
+            room = max(1, budget.input_tokens - reserved)
+            body = "\n".join(cut_to_tokens(line, room, budget.estimator) for line in lines[start : start + n])
+            with _stage("generate"):
+                consensus = self.llm.generate(budget.prompt(header + body), budget.params)
+            batch = new_reviews[start : start + n]
+            start += n
+            through = batch[-1].created_at
+            included += len(batch)
+            with _stage("commit"):
+                row.consensus = consensus
+                row.reviews_through = through
+                row.reviews_included = included
+                row.model_name = settings.OLLAMA_MODEL
+                row.prompt_version = PROMPT_VERSION
+                self.db.commit()
+            REVIEW_CONSENSUS_REVIEWS.labels(mode).inc(len(batch))
+
+        with _stage("commit"):
+            row.status = "completed"
+            self.db.commit()
+        return row
+
+    def _can_revise(self, book_id: str, row: BookReviewConsensus) -> bool:
+        if settings.REVIEW_CONSENSUS_MODE != "incremental":
+            return False
+        if not row.consensus or row.reviews_through is None or row.model_name != settings.OLLAMA_MODEL:
+            return False
+        return self.reviews.count_through(book_id, row.reviews_through) == row.reviews_included
@@ -1,90 +1,196 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import sparse
 from sqlalchemy.orm import Session
 from app.repositories.recommendation_repo import RecommendationRepository
-from app.repositories.tag_repo import TagRepository
 from app.providers.recs import get_recommendation_provider
-from app.providers.recs.content_based import ContentBasedRecommender
+from app.providers.recs.content_based import BookTagMatrix, ContentBasedRecommender
+from app.providers.recs.catalog_index import get_catalog_index
 from app.providers.recs.ml_als import ALSRecommender
-from scipy import sparse
+from app.providers.recs.interactions import get_interaction_matrix
+from app.providers.recs.model_store import get_latest_model, claim_retrain_request, retrain_wanted
+from app.providers.recs.neighbours import get_neighbour_table
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.debounce import claim
+from app.core.metrics import RECS_FOLD_IN_SECONDS
 
 
 class RecommendationService:
     def __init__(self, db: Session):
         self.db = db
         self.rec_repo = RecommendationRepository(db)
-        self.tag_repo = TagRepository(db)
         self.provider = get_recommendation_provider()
+        self.content = ContentBasedRecommender()
+
+    def get_recommendations(self, user_id: str, limit: int = 10):
+        """Serve the newest snapshot, refreshing it in the background once it is older
+        than `RECS_SNAPSHOT_TTL_SECONDS`. Only a user with no snapshot at all is
+        computed synchronously; an empty one (no signal yet) is served like any
+        other until the TTL or a borrow replaces it. Returns (snapshot, items, stale)."""
+        snap = self.rec_repo.latest_snapshot(user_id)
+        if snap is None:
+            snap, items = self.compute_and_get(user_id, limit=limit)
+            return snap, items, False
+        items = self.rec_repo.items_for_snapshot(snap.id)
+        ttl = settings.RECS_SNAPSHOT_TTL_SECONDS
+        stale = datetime.utcnow() - snap.generated_at > timedelta(seconds=ttl)
+        # one background refresh per user per TTL, however often the stale snapshot is read
+        if stale and claim(f"recs-refresh:{user_id}", ttl):
+            celery_app.send_task("app.workers.tasks.recompute_recommendations", args=[user_id])
+        return snap, items[:limit], stale
+
+    def similar_books(self, book_id: str, limit: int = 10) -> tuple[list[tuple[str, float]], str | None]:
+        """Neighbours from the precomputed item-item table; ([], None) until one has been
+        built or when the book is newer than it."""
+        table = get_neighbour_table()
+        if table is None:
+            return [], None
+        return table.similar(book_id, limit)
 
     def compute_and_get(self, user_id: str, limit: int = 10):
         # compute fresh recommendations synchronously
         user_pref_map = self.rec_repo.user_preferences_with_names(user_id)
         if not user_pref_map:
-            self._compute_preferences(user_id)
-            user_pref_map = self.rec_repo.user_preferences_with_names(user_id)
-        book_tags = self.tag_repo.get_tags_for_books()
-        exclude = self.rec_repo.user_borrowed_book_ids(user_id)
-        scores, provider_name = self._recommend(user_id, book_tags, exclude, limit)
+            self.rec_repo.recompute_preferences([user_id])
+        snap = self.refresh(user_id, limit=limit)
+        self.db.commit()
+        return snap, self.rec_repo.items_for_snapshot(snap.id)
+
+    def refresh(
+        self,
+        user_id: str,
+        limit: int = 10,
+        tag_matrix: BookTagMatrix | None = None,
+        fold_in: bool = False,
+    ):
+        """Score the user and persist a new snapshot (caller commits).
+
+        With `fold_in`, the user's ALS vector is first re-solved from their current
+        interactions and stored as an overlay until the next full training run.
+        """
+        if tag_matrix is None:
+            tag_matrix = get_catalog_index(self.db).tag_matrix()
+        exclude = self.exclusions([user_id])[str(user_id)]
+        scores, provider_name = self._recommend(user_id, tag_matrix, exclude, limit, fold_in=fold_in)
         snap = self.rec_repo.create_snapshot(user_id, provider=provider_name)
         self.rec_repo.replace_items(snap.id, scores)
-        self.db.commit()
-        return self.rec_repo.items_for_snapshot(snap.id), user_pref_map, book_tags
-
-    def _compute_preferences(self, user_id: str):
-        from app.models import UserTagPreference
-        tag_counts: dict[str, float] = {}
-        book_tags = self.tag_repo.get_tags_for_books()
-        user_borrows = self.rec_repo.user_borrowed_book_ids(user_id)
-        for bid in user_borrows:
-            for t in book_tags.get(bid, []):
-                tag_counts[t] = tag_counts.get(t, 0.0) + 1.0
-        self.db.query(UserTagPreference).filter(UserTagPreference.user_id == user_id).delete()
-        for tag_name, weight in tag_counts.items():
-            tag_obj = self.tag_repo.get_or_create(tag_name)
-            self.db.add(UserTagPreference(user_id=user_id, tag_id=tag_obj.id, weight=weight))
-        self.db.flush()
-
-    def _recommend(self, user_id: str, book_tags: dict[str, list[str]], exclude: set[str], limit: int):
+        return snap
+
+    def exclusions(self, user_ids: list[str]) -> dict[str, set[str]]:
+        """Books never recommended back to each user: everything they borrowed or
+        reviewed. `refresh` and `recommend_all` both use it, so on-demand and batch
+        snapshots agree."""
+        return self.rec_repo.interacted_book_ids(user_ids)
+
+    def recommend_all(self, limit: int = 20, batch_size: int = 1000, write_chunk: int = 5000) -> dict[str, int]:
+        """Score every active user in batches and bulk-write their snapshots.
+
+        Active users are those with interactions or tag preferences. Each batch is
+        committed on its own so a failure part-way keeps the finished batches.
+        """
+        data = get_interaction_matrix(self.rec_repo)
+        prefs = self.rec_repo.all_user_preferences_with_names()
+        tag_matrix = get_catalog_index(self.db).tag_matrix()
+        user_ids = sorted(set(data.user_ids.tolist()) | set(prefs))
+
+        model = get_latest_model() if isinstance(self.provider, ALSRecommender) else None
+        if model is not None:
+            overlays = self.rec_repo.factor_overlays(model.version)
+
+        counts = {"ml_als": 0, "content": 0}
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start : start + batch_size]
+            exclusions = self.exclusions(batch)
+            excludes = [exclusions[u] for u in batch]
+
+            als_scores: dict[str, list[tuple[str, float]]] = {}
+            if model is not None:
+                members = [u for u in batch if u in overlays or u in model.user_index]
+                if members:
+                    # the exclusions double as the "already liked" rows the batch recommender filters
+                    rows, cols = [], []
+                    for i, u in enumerate(members):
+                        known = [model.book_index[b] for b in exclusions[u] if b in model.book_index]
+                        rows.extend([i] * len(known))
+                        cols.extend(known)
+                    user_items = sparse.csr_matrix(
+                        (np.ones(len(cols), dtype=np.float32), (rows, cols)),
+                        shape=(len(members), len(model.book_ids)),
+                    )
+                    vectors = np.vstack(
+                        [overlays[u] if u in overlays else model.user_factors[model.user_index[u]] for u in members]
+                    )
+                    ids, scores = self.provider.recommend_batch(vectors, model.item_factors, user_items, limit=limit)
+                    for u, id_row, score_row in zip(members, ids, scores):
+                        als_scores[u] = [
+                            (model.book_ids[i], float(s)) for i, s in zip(id_row, score_row) if i >= 0 and np.isfinite(s)
+                        ]
+
+            cb_scores = self.content.recommend_many([prefs.get(u, {}) for u in batch], tag_matrix, excludes, limit=limit)
+            results = []
+            for u, cb in zip(batch, cb_scores):
+                scores = als_scores.get(u)
+                if scores:
+                    seen = set(b for b, _ in scores)
+                    scores = (scores + [(b, s) for b, s in cb if b not in seen])[:limit]
+                    results.append((u, "ml_als", scores))
+                else:
+                    results.append((u, "content", cb))
+            self.rec_repo.bulk_create_snapshots(results, chunk_size=write_chunk)
+            self.db.commit()
+            for _, provider_name, _ in results:
+                counts[provider_name] += 1
+        return counts
+
+    def _user_vector(self, model, user_id: str, fold_in: bool):
+        if fold_in:
+            started = time.perf_counter()
+            vector = model.fold_in(self.rec_repo.user_interactions(user_id))
+            if vector is not None:
+                self.rec_repo.upsert_factor_overlay(user_id, model.version, vector)
+                RECS_FOLD_IN_SECONDS.observe(time.perf_counter() - started)
+                return vector
+        else:
+            overlay = self.rec_repo.factor_overlay(user_id, model.version)
+            if overlay is not None:
+                return overlay
+        return model.user_vector(user_id)
+
+    def _recommend(
+        self, user_id: str, tag_matrix: BookTagMatrix, exclude: set[str], limit: int, fold_in: bool = False
+    ):
         # Try provider-specific logic; fall back to content-based when empty
         provider = self.provider
         if isinstance(provider, ALSRecommender):
-            rows = self.rec_repo.interactions()
-            if not rows:
-                return [], "content"
-            user_to_idx, book_to_idx, _, book_ids = self.rec_repo.index_mappings(rows)
-            data = []
-            row_idx = []
-            col_idx = []
-            for u, b, w in rows:
-                row_idx.append(user_to_idx[u])
-                col_idx.append(book_to_idx[b])
-                data.append(w)
-            interactions = sparse.coo_matrix((data, (row_idx, col_idx)), shape=(len(user_to_idx), len(book_to_idx))).tocsr()
-            # user_items for exclusion/filtering
-            user_items = interactions[user_to_idx.get(str(user_id), -1)] if str(user_id) in user_to_idx else sparse.csr_matrix((1, len(book_to_idx)))
-            if str(user_id) not in user_to_idx:
-                # cold start for ALS -> fallback to content-based
-                scores = ContentBasedRecommender().recommend(self.rec_repo.user_preferences_with_names(user_id), book_tags, exclude_book_ids=exclude, limit=limit)
-                return scores, "content"
-            scores = provider.score_with_matrix(
-                user_id=user_to_idx[str(user_id)],
-                interactions=interactions,
-                user_items=user_items,
-                book_index_to_id=book_ids,
-                exclude_book_ids=exclude,
-                limit=limit,
-            )
-            if scores:
-                # merge content-based to ensure tagged recs surface
-                cb_scores = ContentBasedRecommender().recommend(
-                    self.rec_repo.user_preferences_with_names(user_id),
-                    book_tags,
+            model = get_latest_model()
+            if retrain_wanted(model) and claim_retrain_request():
+                celery_app.send_task("app.workers.tasks.train_als_model")
+            user_vector = self._user_vector(model, user_id, fold_in) if model else None
+            if user_vector is not None:
+                scores = provider.score_with_factors(
+                    user_vector,
+                    model.item_factors,
+                    model.book_ids,
                     exclude_book_ids=exclude,
                     limit=limit,
+                    book_id_to_index=model.book_index,
+                    ann=model.ann,
                 )
-                seen = set(b for b, _ in scores)
-                for b, s in cb_scores:
-                    if b not in seen:
-                        scores.append((b, s))
-                return scores[:limit], "ml_als"
-            # fallback when ALS returns empty
-        scores = ContentBasedRecommender().recommend(self.rec_repo.user_preferences_with_names(user_id), book_tags, exclude_book_ids=exclude, limit=limit)
+                if scores:
+                    # merge content-based to ensure tagged recs surface
+                    cb_scores = self.content.recommend(
+                        self.rec_repo.user_preferences_with_names(user_id),
+                        tag_matrix,
+                        exclude_book_ids=exclude,
+                        limit=limit,
+                    )
+                    seen = set(b for b, _ in scores)
+                    for b, s in cb_scores:
+                        if b not in seen:
+                            scores.append((b, s))
+                    return scores[:limit], "ml_als"
+            # no model yet, user without any modelled interactions, or empty ALS output
+        scores = self.content.recommend(self.rec_repo.user_preferences_with_names(user_id), tag_matrix, exclude_book_ids=exclude, limit=limit)
         return scores, "content"
@@ -4,6 +4,11 @@ from sqlalchemy.orm import Session
 from app.repositories.review_repo import ReviewRepository
 from app.repositories.borrow_repo import BorrowRepository
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.debounce import claim
+from app.core.metrics import REVIEW_CONSENSUS_COLLAPSED
+
+CONSENSUS_TASK = "app.workers.tasks.update_review_consensus"
 
 
 class ReviewService:
@@ -28,4 +33,9 @@ class ReviewService:
         return self.reviews.list_for_book(book_id)
 
     def _enqueue_consensus(self, book_id: str):
-        celery_app.send_task("app.workers.tasks.update_review_consensus", args=[book_id])
+        window = settings.REVIEW_CONSENSUS_DEBOUNCE_SECONDS
+        if not claim(f"consensus:{book_id}", window):
+            # the run scheduled at the start of this window reads every review newer than its watermark
+            REVIEW_CONSENSUS_COLLAPSED.inc()
+            return
+        celery_app.send_task(CONSENSUS_TASK, args=[book_id], countdown=window or None)
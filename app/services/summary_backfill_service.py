@@ -0,0 +1,178 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.metrics import (
+    SUMMARY_BACKFILL_ENQUEUED,
+    SUMMARY_BACKFILL_ETA_SECONDS,
+    SUMMARY_BACKFILL_IN_FLIGHT,
+    SUMMARY_BACKFILL_PROGRESS,
+    SUMMARY_BACKFILL_REMAINING,
+)
+from app.models import SummaryBackfill
+from app.repositories.book_summary_repo import BookSummaryRepository
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TASK = "app.workers.tasks.summarize_book"
+
+
+class SummaryBackfillService:
+    """Regenerates summaries written with another prompt version or model, at a
+    bounded pace.
+
+    `start` records a backfill targeting the current `SUMMARY_PROMPT_VERSION` and
+    `OLLAMA_MODEL`. Every tick of the beat task `advance_summary_backfill` then
+    enqueues the next stale summaries in book_id (keyset) order. Enqueues are
+    limited to the backfill's rate, via a token bucket carried in `credit`, and
+    to keeping at most `max_inflight` summaries pending or running overall,
+    uploads included. All state is in the row: an interrupted worker or beat
+    resumes after `cursor`, and concurrent ticks skip a row another tick holds.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.summaries = BookSummaryRepository(db)
+
+    @staticmethod
+    def _stalled_before(now: datetime) -> datetime:
+        return now - timedelta(minutes=settings.SUMMARY_BACKFILL_STALL_MINUTES)
+
+    def _running(self):
+        return select(SummaryBackfill).where(SummaryBackfill.status == "running").order_by(SummaryBackfill.started_at)
+
+    def latest(self) -> Optional[SummaryBackfill]:
+        stmt = select(SummaryBackfill).order_by(SummaryBackfill.started_at.desc()).limit(1)
+        return self.db.scalar(stmt)
+
+    def start(self, rate_per_minute: float | None = None, max_inflight: int | None = None) -> SummaryBackfill:
+        """Backfill towards the current prompt/model; an existing one for the same
+        target is resumed (with new limits, if given) rather than restarted."""
+        now = datetime.utcnow()
+        target = (settings.SUMMARY_PROMPT_VERSION, settings.OLLAMA_MODEL)
+        job = None
+        for running in self.db.scalars(self._running().with_for_update()):
+            if (running.prompt_version, running.model_name) == target and job is None:
+                job = running
+            else:
+                running.status = "cancelled"
+                running.finished_at = now
+        if job is None:
+            job = SummaryBackfill(
+                prompt_version=target[0],
+                model_name=target[1],
+                status="running",
+                total=self.summaries.count_stale(*target, self._stalled_before(now)),
+                enqueued=0,
+                credit=0.0,
+                rate_per_minute=settings.SUMMARY_BACKFILL_RATE_PER_MINUTE,
+                max_inflight=settings.SUMMARY_BACKFILL_MAX_INFLIGHT,
+                started_at=now,
+            )
+            self.db.add(job)
+        if rate_per_minute:
+            job.rate_per_minute = rate_per_minute
+        if max_inflight:
+            job.max_inflight = max_inflight
+        self.db.commit()
+        logger.info("Summary backfill %s towards %s/%s: %d stale summaries", job.id, *target, job.total)
+        return job
+
+    def cancel(self) -> int:
+        result = self.db.execute(
+            update(SummaryBackfill)
+            .where(SummaryBackfill.status == "running")
+            .values(status="cancelled", finished_at=datetime.utcnow())
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def advance(self, now: datetime | None = None) -> int:
+        """One tick: enqueue what the rate and in-flight cap allow. Returns the number enqueued."""
+        now = now or datetime.utcnow()
+        job = self.db.scalars(self._running().limit(1).with_for_update(skip_locked=True)).first()
+        if job is None:
+            self.db.rollback()
+            return 0
+        if (job.prompt_version, job.model_name) != (settings.SUMMARY_PROMPT_VERSION, settings.OLLAMA_MODEL):
+            # settings moved on; a new backfill has to be started for the new target
+            logger.warning("Summary backfill %s targets %s/%s; cancelling", job.id, job.prompt_version, job.model_name)
+            job.status = "cancelled"
+            job.finished_at = now
+            self.db.commit()
+            return 0
+
+        per_second = job.rate_per_minute / 60.0
+        elapsed = (now - job.last_tick_at).total_seconds() if job.last_tick_at else settings.SUMMARY_BACKFILL_TICK_SECONDS
+        # no more than two ticks' worth at once, so a stalled beat does not resume with a burst
+        burst = max(1.0, per_second * settings.SUMMARY_BACKFILL_TICK_SECONDS * 2)
+        job.credit = min(burst, job.credit + per_second * max(0.0, elapsed))
+        job.last_tick_at = now
+
+        stalled_before = self._stalled_before(now)
+        in_flight = self.summaries.count_in_flight(since=stalled_before)
+        n = min(int(job.credit), job.max_inflight - in_flight, settings.SUMMARY_BACKFILL_BATCH)
+        book_ids = []
+        if n > 0:
+            book_ids = self.summaries.stale_book_ids(
+                job.prompt_version, job.model_name, stalled_before, after=job.cursor, limit=n
+            )
+            if book_ids:
+                self.summaries.mark_pending(book_ids)
+                job.cursor = book_ids[-1]
+                job.enqueued += len(book_ids)
+                job.credit -= len(book_ids)
+            if len(book_ids) < n:
+                job.status = "completed"
+                job.finished_at = now
+        remaining = 0
+        if job.status == "running":
+            remaining = self.summaries.count_stale(job.prompt_version, job.model_name, stalled_before, after=job.cursor)
+        self.db.commit()
+
+        # only after the commit, so no task can read its summary before it is marked pending
+        for i, book_id in enumerate(book_ids):
+            celery_app.send_task(SUMMARY_TASK, args=[str(book_id)], countdown=i / per_second)
+        SUMMARY_BACKFILL_ENQUEUED.inc(len(book_ids))
+        progress = self.progress(job, remaining, in_flight + len(book_ids), now)
+        SUMMARY_BACKFILL_REMAINING.set(remaining)
+        SUMMARY_BACKFILL_IN_FLIGHT.set(progress["in_flight"])
+        SUMMARY_BACKFILL_PROGRESS.set(progress["progress"])
+        SUMMARY_BACKFILL_ETA_SECONDS.set(progress["eta_seconds"])
+        if job.status == "completed":
+            logger.info("Summary backfill %s completed: %d summaries enqueued", job.id, job.enqueued)
+        return len(book_ids)
+
+    def progress(
+        self, job: SummaryBackfill, remaining: int | None = None, in_flight: int | None = None, now: datetime | None = None
+    ) -> dict[str, Any]:
+        """Counts, completed share and ETA (from the enqueue rate achieved so far)."""
+        now = now or datetime.utcnow()
+        stalled_before = self._stalled_before(now)
+        if remaining is None:
+            remaining = 0
+            if job.status == "running":
+                remaining = self.summaries.count_stale(
+                    job.prompt_version, job.model_name, stalled_before, after=job.cursor
+                )
+        if in_flight is None:
+            in_flight = self.summaries.count_in_flight(since=stalled_before)
+        elapsed = ((job.finished_at or now) - job.started_at).total_seconds()
+        achieved = job.enqueued / elapsed if job.enqueued and elapsed > 0 else job.rate_per_minute / 60.0
+        # the in-flight cap, not the rate, may be what limits a backfill
+        per_second = min(achieved, job.rate_per_minute / 60.0)
+        return {
+            "id": str(job.id),
+            "status": job.status,
+            "prompt_version": job.prompt_version,
+            "model_name": job.model_name,
+            "total": job.total,
+            "enqueued": job.enqueued,
+            "remaining": remaining,
+            "in_flight": in_flight,
+            "progress": job.enqueued / (job.enqueued + remaining) if job.enqueued + remaining else 1.0,
+            "eta_seconds": remaining / per_second if per_second > 0 else 0.0,
+        }
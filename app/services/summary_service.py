@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import re
+from pathlib import Path
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.progress import Progress
+from app.providers.llm import get_llm_provider
+from app.providers.llm.base import LLMProvider
+from app.providers.llm.budget import PromptBudget, TokenEstimator, cut_to_tokens, get_estimator
+from app.repositories.book_repo import BookSummaryChunkRepository
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "core" / "prompts"
+SUMMARY_PROMPT_PATH = PROMPTS_DIR / "summary.txt"
+MAP_PROMPT_PATH = PROMPTS_DIR / "summary_map.txt"
+REDUCE_PROMPT_PATH = PROMPTS_DIR / "summary_reduce.txt"
+
+
+def split_sections(text: str, max_tokens: int, estimator: TokenEstimator | None = None) -> list[str]:
+    """Split text into sections of at most `max_tokens` (estimated), on paragraph
+    boundaries where possible and sentence boundaries inside long paragraphs."""
+    estimator = estimator or get_estimator()
+    max_tokens = max(1, max_tokens)
+    sections: list[str] = []
+    current: list[str] = []
+    size = 0
+    for para in re.split(r"\n\s*\n", text):
+        para = " ".join(para.split())
+        tokens = estimator.count(para)
+        while tokens > max_tokens:
+            piece = cut_to_tokens(para, max_tokens, estimator)
+            if current:
+                sections.append("\n\n".join(current))
+                current, size = [], 0
+            sections.append(piece)
+            para = para[len(piece) :].strip()
+            tokens = estimator.count(para)
+        if not para:
+            continue
+        if current and size + tokens > max_tokens:
+            sections.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(para)
+        size += tokens + 1
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def summary_progress_channel(book_id: str) -> str:
+    return f"summary:{book_id}"
+
+
+class SummaryService:
+    """Map-reduce book summaries.
+
+    Every section is summarized; none are dropped, the input is bounded upstream
+    by `SUMMARY_MAX_INPUT_TOKENS`. Sections go concurrently through the provider's
+    async API (at most `SUMMARY_CONCURRENCY` calls per book, within the provider's
+    process-wide cap), then are merged as many as fit the context (at most
+    `SUMMARY_REDUCE_FANIN`) at a time until one summary is left. Every partial
+    result is committed as it arrives, keyed by a hash of its prompt and input, so
+    a retried task only redoes the calls that failed.
+    """
+
+    def __init__(self, db: Session, llm: LLMProvider | None = None, progress: Progress | None = None):
+        self.db = db
+        self.llm = llm or get_llm_provider()
+        self.chunks = BookSummaryChunkRepository(db)
+        # when set, stage counts and the tokens of the final call are published as they arrive
+        self.progress = progress
+
+    def summarize(self, book_id: str, text: str) -> str:
+        single = PromptBudget("summary", SUMMARY_PROMPT_PATH.read_text(encoding="utf-8"), settings.SUMMARY_NUM_PREDICT)
+        mapper = PromptBudget("summary_map", MAP_PROMPT_PATH.read_text(encoding="utf-8"), settings.SUMMARY_NUM_PREDICT)
+        # a section must fit whichever prompt ends up carrying it
+        chunk_tokens = min(settings.SUMMARY_CHUNK_TOKENS, single.input_tokens, mapper.input_tokens)
+        sections = split_sections(text, chunk_tokens)
+        if not sections:
+            raise RuntimeError("No text extracted")
+        if len(sections) == 1:
+            prompt = single.prompt(sections[0])
+            if self.progress is None:
+                return self.llm.generate(prompt, single.params)
+            parts = []
+            for piece in self.llm.stream(prompt, single.params):
+                parts.append(piece)
+                self.progress.append(piece)
+            return "".join(parts)
+        # the provider's async calls share its process-wide client and in-flight limit
+        return asyncio.run(self._map_reduce(book_id, sections, mapper))
+
+    async def _map_reduce(self, book_id: str, sections: list[str], mapper: PromptBudget) -> str:
+        summaries = await self._run_level(book_id, 0, mapper, sections, "map")
+        reducer = PromptBudget("summary_reduce", REDUCE_PROMPT_PATH.read_text(encoding="utf-8"), settings.SUMMARY_NUM_PREDICT)
+        fanin = max(2, settings.SUMMARY_REDUCE_FANIN)
+        level = 1
+        while len(summaries) > 1:
+            groups = []
+            start = 0
+            while start < len(summaries):
+                # as many partial summaries as fit the context, at least two so each level shrinks
+                n = max(2, reducer.pack(summaries[start:], limit=fanin))
+                group = summaries[start : start + n]
+                share = reducer.input_tokens // len(group)
+                groups.append("\n\n".join(f"Part {i + 1}: {cut_to_tokens(s, share)}" for i, s in enumerate(group)))
+                start += n
+            summaries = await self._run_level(book_id, level, reducer, groups, "reduce")
+            level += 1
+        self.chunks.clear(book_id)
+        return summaries[0]
+
+    async def _run_level(
+        self, book_id: str, level: int, budget: PromptBudget, inputs: list[str], stage: str
+    ) -> list[str]:
+        hashes = [hashlib.sha256(f"{budget.instructions}\0{text}".encode("utf-8")).hexdigest() for text in inputs]
+        done = self.chunks.completed(book_id, level)
+        results: list[str | None] = [None] * len(inputs)
+        todo = []
+        for i, h in enumerate(hashes):
+            if i in done and done[i][0] == h:
+                results[i] = done[i][1]
+            else:
+                todo.append(i)
+        if not todo:
+            return results
+
+        slots = asyncio.Semaphore(max(1, settings.SUMMARY_CONCURRENCY))
+        # the last reduce call produces the summary itself; stream that one to readers
+        stream_final = self.progress is not None and len(inputs) == 1
+
+        async def run(i: int) -> tuple[int, str]:
+            async with slots:
+                prompt = budget.prompt(inputs[i])
+                if not stream_final:
+                    return i, await self.llm.agenerate(prompt, budget.params)
+                parts = []
+                async for piece in self.llm.astream(prompt, budget.params):
+                    parts.append(piece)
+                    self.progress.append(piece)
+                return i, "".join(parts)
+
+        done_count = len(inputs) - len(todo)
+        if self.progress is not None:
+            self.progress.stage(stage, done_count, len(inputs))
+
+        error: Exception | None = None
+        # persist as results arrive; the sync session is only touched between awaits
+        for fut in asyncio.as_completed([run(i) for i in todo]):
+            try:
+                i, results[i] = await fut
+            except Exception as e:
+                error = error or e
+                continue
+            self.chunks.save(book_id, level, i, hashes[i], results[i])
+            self.db.commit()
+            done_count += 1
+            if self.progress is not None:
+                self.progress.stage(stage, done_count, len(inputs))
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,189 @@
+"""Text extraction for uploaded book files, and the compressed text artifact.
+
+A file is extracted once: pages are parsed one at a time and the normalized
+text is streamed through gzip into a spooled temp file, then stored next to the
+upload. Later readers decompress that artifact incrementally and stop as soon as
+their character budget is met, so neither step holds the whole upload plus its
+text in memory and re-runs never touch the original file or pypdf again.
+"""
+import codecs
+import hashlib
+import logging
+import re
+import tempfile
+import time
+import unicodedata
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+from pypdf import PdfReader
+
+from app.core.config import settings
+from app.core.metrics import TEXT_EXTRACT_PAGES, TEXT_EXTRACT_SECONDS
+from app.providers.storage.base import StorageProvider
+
+logger = logging.getLogger(__name__)
+
+# plain-text files are decoded in "pages" of this many bytes
+TEXT_PAGE_BYTES = 64 * 1024
+# bump when extraction or normalization changes; older artifacts are rebuilt on read
+TEXT_ARTIFACT_VERSION = "v1"
+# gzip container, so artifacts can be inspected with zcat
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+_TRAILING_SPACE = re.compile(r"[ \t\f\v]+\n")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+
+@dataclass
+class TextArtifact:
+    object_key: str
+    sha256: str  # of the normalized UTF-8 text
+    chars: int
+    page_offsets: list[int] | None  # char offset where each PDF page starts
+    compressed_bytes: int
+
+
+def _is_pdf(mime_type: str) -> bool:
+    return bool(mime_type) and mime_type.endswith("pdf")
+
+
+def _pdf_pages(chunks: Iterable[bytes]) -> Iterator[str]:
+    with tempfile.SpooledTemporaryFile(max_size=settings.EXTRACT_SPOOL_MB * 1024 * 1024) as spool:
+        # the xref table sits at the end of a PDF, so the whole file has to be local first
+        for chunk in chunks:
+            spool.write(chunk)
+        spool.seek(0)
+        reader = PdfReader(spool)
+        for i in range(len(reader.pages)):
+            yield (reader.pages[i].extract_text() or "") + "\n"
+            # pypdf caches every object it resolves (fonts, image streams); drop them
+            # per page so a long scanned book does not accumulate all of them
+            reader.resolved_objects.clear()
+
+
+def _text_pages(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= TEXT_PAGE_BYTES:
+            yield decoder.decode(buf[:TEXT_PAGE_BYTES])
+            buf = buf[TEXT_PAGE_BYTES:]
+    tail = decoder.decode(buf, final=True)
+    if tail:
+        yield tail
+
+
+def _gzip_text_pages(chunks: Iterable[bytes]) -> Iterator[str]:
+    inflater = zlib.decompressobj(_GZIP_WBITS)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        while chunk:
+            # bounded output per step: repetitive text inflates by orders of magnitude
+            block = inflater.decompress(chunk, TEXT_PAGE_BYTES)
+            chunk = inflater.unconsumed_tail
+            yield decoder.decode(block)
+    yield decoder.decode(inflater.flush(), final=True)
+
+
+def iter_pages(chunks: Iterable[bytes], mime_type: str) -> Iterator[str]:
+    """Yield the text of each page (PDF, newline-terminated) or fixed-size block
+    (anything else); concatenating them gives the whole document."""
+    if _is_pdf(mime_type):
+        return _pdf_pages(chunks)
+    return _text_pages(chunks)
+
+
+def normalize(text: str) -> str:
+    """NFC, `\\n` line ends, no NULs or trailing spaces, at most one blank line in a row."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+    return _BLANK_RUNS.sub("\n\n", _TRAILING_SPACE.sub("\n", text))
+
+
+def write_text_artifact(storage: StorageProvider, object_key: str, mime_type: str, artifact_key: str) -> TextArtifact:
+    """Extract the whole stored file, normalize it and store it gzip-compressed
+    under `artifact_key`."""
+    kind = "pdf" if _is_pdf(mime_type) else "text"
+    started = time.perf_counter()
+    sha256 = hashlib.sha256()
+    deflater = zlib.compressobj(6, zlib.DEFLATED, _GZIP_WBITS)
+    offsets: list[int] = []
+    chars = 0
+    with tempfile.SpooledTemporaryFile(max_size=settings.EXTRACT_SPOOL_MB * 1024 * 1024) as out:
+
+        def emit(text: str) -> None:
+            nonlocal chars
+            data = text.encode("utf-8")
+            sha256.update(data)
+            out.write(deflater.compress(data))
+            chars += len(text)
+
+        chunks = storage.get_stream(object_key)
+        pages = iter_pages(chunks, mime_type)
+        # trailing whitespace waits for the next page, so CRLFs, trailing spaces and
+        # blank-line runs split across page (or block) boundaries normalize the same
+        carry = ""
+        try:
+            for page in pages:
+                raw = carry + page
+                body = raw.rstrip()
+                carry = raw[len(body) :]
+                text = normalize(body)
+                offsets.append(chars + len(text) - len(text.lstrip()))
+                emit(text)
+        finally:
+            pages.close()
+            if hasattr(chunks, "close"):
+                chunks.close()
+        emit(normalize(carry))
+        out.write(deflater.flush())
+        compressed = out.tell()
+        out.seek(0)
+        storage.put(out, artifact_key)
+
+    elapsed = time.perf_counter() - started
+    TEXT_EXTRACT_PAGES.labels(kind).observe(len(offsets))
+    TEXT_EXTRACT_SECONDS.labels(kind).observe(elapsed)
+    logger.info(
+        "Extracted %d chars from %d %s pages of %s in %.2fs (%d bytes compressed)",
+        chars,
+        len(offsets),
+        kind,
+        object_key,
+        elapsed,
+        compressed,
+    )
+    return TextArtifact(
+        object_key=artifact_key,
+        sha256=sha256.hexdigest(),
+        chars=chars,
+        page_offsets=offsets if kind == "pdf" else None,
+        compressed_bytes=compressed,
+    )
+
+
+def read_text_artifact(storage: StorageProvider, artifact_key: str, max_chars: int | None = None) -> str:
+    """Text of a stored artifact, cut off at `max_chars` (all of it when None).
+
+    Decompression stops at the block that fills the budget and the rest of the
+    object is never downloaded.
+    """
+    chunks = storage.get_stream(artifact_key)
+    pages = _gzip_text_pages(chunks)
+    parts: list[str] = []
+    size = 0
+    try:
+        for page in pages:
+            parts.append(page)
+            size += len(page)
+            if max_chars is not None and size >= max_chars:
+                break
+    finally:
+        # for an early stop, closes the storage response
+        pages.close()
+        if hasattr(chunks, "close"):
+            chunks.close()
+    text = "".join(parts)
+    return text[:max_chars] if max_chars is not None else text
@@ -0,0 +1,40 @@
+"""Start, inspect or cancel the summary re-generation backfill.
+
+    python -m app.workers.summary_backfill start --rate-per-minute 20 --max-inflight 2
+    python -m app.workers.summary_backfill status
+    python -m app.workers.summary_backfill cancel
+
+`start` regenerates every summary whose prompt version or model differs from
+the current `SUMMARY_PROMPT_VERSION` / `OLLAMA_MODEL`. Run it with the same
+settings as the workers. The beat task `advance_summary_backfill` does the
+enqueueing, so beat and a worker on the default queue must be running.
+Starting again for the same target resumes the running backfill, optionally
+with new limits. Every command prints the backfill's progress as JSON.
+"""
+import argparse
+import json
+
+from app.core.database import SessionLocal
+from app.services.summary_backfill_service import SummaryBackfillService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["start", "status", "cancel"])
+    parser.add_argument("--rate-per-minute", type=float, help="default SUMMARY_BACKFILL_RATE_PER_MINUTE")
+    parser.add_argument("--max-inflight", type=int, help="default SUMMARY_BACKFILL_MAX_INFLIGHT")
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        service = SummaryBackfillService(db)
+        if args.command == "start":
+            job = service.start(rate_per_minute=args.rate_per_minute, max_inflight=args.max_inflight)
+        else:
+            if args.command == "cancel":
+                service.cancel()
+            job = service.latest()
+        report = service.progress(job) if job else {"status": "none"}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,110 @@
-import io
 import logging
-from pathlib import Path
+import time
+from datetime import datetime, timedelta
 from app.core.celery_app import celery_app
 from app.core.config import settings
 from app.core.database import SessionLocal
+from app.core.progress import Progress
 from app.providers.storage import get_storage_provider
-from app.providers.llm import get_llm_provider
-from app.providers.recs import get_recommendation_provider
-from app.providers.recs.content_based import ContentBasedRecommender
 from app.providers.recs.ml_als import ALSRecommender
-from app.models import BookFile, BookAISummary, BookReviewConsensus, Review
-from app.repositories.tag_repo import TagRepository
+from app.providers.recs.ann import IVFPQIndex
+from app.providers.recs.interactions import get_interaction_matrix
+from app.providers.recs.model_store import ALSModelArtifact, ALSModelStore
+from app.providers.recs.content_based import BookTagMatrix
+from app.providers.recs.catalog_index import get_catalog_index
+from app.providers.recs.neighbours import NeighbourTable, NeighbourStore
+from app.core.metrics import (
+    RECS_BATCH_USERS,
+    RECS_BATCH_DURATION,
+    RECS_BATCH_THROUGHPUT,
+    RECS_SNAPSHOTS_COMPACTED,
+    SUMMARY_CACHE_HITS,
+    SUMMARY_CACHE_MISSES,
+    SUMMARY_CACHE_EVICTED,
+    TASK_STAGE_SECONDS,
+)
+from app.models import BookFile, BookAISummary, BookReviewConsensus
+from app.repositories.book_repo import SummaryCacheRepository
+from app.repositories.catalog_repo import CatalogRepository
 from app.repositories.recommendation_repo import RecommendationRepository
-from app.repositories.borrow_repo import BorrowRepository
+from app.services.consensus_service import ConsensusService
+from app.services.recommendation_service import RecommendationService
+from app.services.summary_backfill_service import SummaryBackfillService
+from app.providers.llm.budget import CHARS_PER_TOKEN
+from app.services.summary_service import SummaryService, summary_progress_channel
+from app.services.book_text_service import BookTextService
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from pypdf import PdfReader
 
 logger = logging.getLogger(__name__)
 
-SUMMARY_PROMPT_PATH = Path(__file__).resolve().parent.parent / "core" / "prompts" / "summary.txt"
-CONSENSUS_PROMPT_PATH = Path(__file__).resolve().parent.parent / "core" / "prompts" / "review_consensus.txt"
+
+SUMMARY_GENERATE_TASK = "app.workers.tasks.generate_summary"
+# what summarize_book returns when it hands the book over to generate_summary
+EXTRACTED = "extracted"
+
+
+def _stage(task: str, stage: str):
+    """Times one stage of a task into `task_stage_seconds`."""
+    return TASK_STAGE_SECONDS.labels(task, stage).time()
+
+
+def _load_summary(db: Session, book_id: str) -> tuple[BookAISummary | None, BookFile]:
+    summary_row = db.execute(select(BookAISummary).where(BookAISummary.book_id == book_id)).scalar_one_or_none()
+    if summary_row:
+        summary_row.status = "running"
+        summary_row.error_message = None
+        db.flush()
+    bf = db.execute(select(BookFile).where(BookFile.book_id == book_id)).scalar_one_or_none()
+    if not bf:
+        raise RuntimeError("Book file not found")
+    return summary_row, bf
+
+
+def _summary_cache_key(bf: BookFile) -> tuple[str, str, str]:
+    return bf.content_sha256, settings.SUMMARY_PROMPT_VERSION, settings.OLLAMA_MODEL
+
+
+def _save_summary(db: Session, book_id: str, summary_row: BookAISummary | None, summary: str) -> None:
+    if not summary_row:
+        summary_row = BookAISummary(
+            book_id=book_id,
+            status="completed",
+            model_name=settings.OLLAMA_MODEL,
+            prompt_version=settings.SUMMARY_PROMPT_VERSION,
+            summary=summary,
+        )
+        db.add(summary_row)
+    else:
+        summary_row.status = "completed"
+        summary_row.model_name = settings.OLLAMA_MODEL
+        summary_row.prompt_version = settings.SUMMARY_PROMPT_VERSION
+        summary_row.summary = summary
+    db.commit()
+
+
+def _retries_exhausted(task) -> bool:
+    """Whether autoretry will give up on the exception being handled."""
+    return task.request.retries >= task.max_retries
+
+
+def _summary_failed(task, db: Session, book_id: str, progress: Progress, error: Exception) -> None:
+    logger.exception("%s failed for %s", task.name.rsplit(".", 1)[-1], book_id)
+    exhausted = _retries_exhausted(task)
+    # "retrying" keeps stream readers attached until autoretry gives up
+    progress.finish("failed" if exhausted else "retrying", error=str(error))
+    try:
+        db.rollback()
+        # until autoretry gives up the row keeps its in-progress status for the retry
+        if exhausted:
+            summary_row = db.execute(select(BookAISummary).where(BookAISummary.book_id == book_id)).scalar_one_or_none()
+            if summary_row:
+                summary_row.status = "failed"
+                summary_row.error_message = str(error)
+            db.commit()
+    except SQLAlchemyError:
+        db.rollback()
 
 
 @celery_app.task(
@@ -32,60 +115,76 @@ CONSENSUS_PROMPT_PATH = Path(__file__).resolve().parent.parent / "core" / "promp
     retry_kwargs={"max_retries": 3},
 )
 def summarize_book(self, book_id: str) -> str:
+    """CPU-bound first stage, on the `extract` queue: serve the summary from the
+    cache, or extract the text into its storage artifact and hand the book over
+    to `generate_summary` on the `llm` queue."""
     storage = get_storage_provider()
-    llm = get_llm_provider()
-    prompt = SUMMARY_PROMPT_PATH.read_text(encoding="utf-8")
+    progress = Progress(summary_progress_channel(book_id))
+    progress.start()
     with SessionLocal() as db:
         try:
-            summary_row = db.execute(select(BookAISummary).where(BookAISummary.book_id == book_id)).scalar_one_or_none()
-            if summary_row:
-                summary_row.status = "running"
-                summary_row.error_message = None
-                db.flush()
-
-            bf = db.execute(select(BookFile).where(BookFile.book_id == book_id)).scalar_one_or_none()
-            if not bf:
-                raise RuntimeError("Book file not found")
-
-            file_bytes = storage.get(bf.object_key)
-            text = _extract_text(file_bytes, bf.mime_type or "")
-            full_prompt = f"{prompt}\n\n{text[:6000]}"
-            summary = llm.generate(full_prompt)
-
-            if not summary_row:
-                summary_row = BookAISummary(
-                    book_id=book_id,
-                    status="completed",
-                    model_name=settings.OLLAMA_MODEL,
-                    prompt_version="v1",
-                    summary=summary,
-                )
-                db.add(summary_row)
-            else:
-                summary_row.status = "completed"
-                summary_row.model_name = settings.OLLAMA_MODEL
-                summary_row.prompt_version = "v1"
-                summary_row.summary = summary
-            db.commit()
-            return "ok"
+            with _stage("summarize_book", "fetch"):
+                summary_row, bf = _load_summary(db, book_id)
+                # files uploaded before content hashing have no key and always miss
+                summary = SummaryCacheRepository(db).get(*_summary_cache_key(bf)) if bf.content_sha256 else None
+            if summary is not None:
+                SUMMARY_CACHE_HITS.inc()
+                with _stage("summarize_book", "commit"):
+                    _save_summary(db, book_id, summary_row, summary)
+                progress.finish("completed", text=summary)
+                return "ok"
+
+            SUMMARY_CACHE_MISSES.inc()
+            with _stage("summarize_book", "extract"):
+                # parsing happens here; the llm stage only decompresses the stored text
+                BookTextService(db, storage).ensure(bf)
+            # the llm stage continues this progress run, so stream readers see one job
+            celery_app.send_task(SUMMARY_GENERATE_TASK, args=[book_id], kwargs={"run": progress.run})
+            return EXTRACTED
         except Exception as e:
-            logger.exception("summarize_book failed for %s", book_id)
-            try:
-                summary_row = db.execute(select(BookAISummary).where(BookAISummary.book_id == book_id)).scalar_one_or_none()
-                if summary_row:
-                    summary_row.status = "failed"
-                    summary_row.error_message = str(e)
-                db.commit()
-            except SQLAlchemyError:
-                db.rollback()
-            return f"error: {e}"
+            _summary_failed(self, db, book_id, progress, e)
+            raise
+
 
+@celery_app.task(
+    name="app.workers.tasks.generate_summary",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def generate_summary(self, book_id: str, run: str | None = None) -> str:
+    """IO-bound second stage, on the `llm` queue: summarize the extracted text.
 
-def _extract_text(file_bytes: bytes, mime_type: str) -> str:
-    if mime_type and mime_type.endswith("pdf"):
-        reader = PdfReader(io.BytesIO(file_bytes))
-        return "\n".join([page.extract_text() or "" for page in reader.pages])
-    return file_bytes.decode("utf-8", errors="ignore")
+    `run` is the progress run started by `summarize_book`. A retry starts a new
+    one, since text streamed by the failed attempt is discarded.
+    """
+    storage = get_storage_provider()
+    if run and not self.request.retries:
+        progress = Progress(summary_progress_channel(book_id), run=run)
+    else:
+        progress = Progress(summary_progress_channel(book_id))
+        progress.start()
+    with SessionLocal() as db:
+        try:
+            with _stage("generate_summary", "fetch"):
+                summary_row, bf = _load_summary(db, book_id)
+                max_chars = settings.SUMMARY_MAX_INPUT_TOKENS * CHARS_PER_TOKEN
+                # a re-upload since the extract stage clears the artifact; it is then rebuilt here
+                text = BookTextService(db, storage).read(bf, max_chars=max_chars)
+            with _stage("generate_summary", "generate"):
+                # sections already summarized by an earlier attempt are reused
+                summary = SummaryService(db, progress=progress).summarize(book_id, text)
+            with _stage("generate_summary", "commit"):
+                if bf.content_sha256:
+                    SummaryCacheRepository(db).put(*_summary_cache_key(bf), summary)
+                _save_summary(db, book_id, summary_row, summary)
+            progress.finish("completed", text=summary)
+            return "ok"
+        except Exception as e:
+            _summary_failed(self, db, book_id, progress, e)
+            # let autoretry re-run it; finished sections are persisted and skipped
+            raise
 
 
 @celery_app.task(
@@ -96,55 +195,25 @@ def _extract_text(file_bytes: bytes, mime_type: str) -> str:
     retry_kwargs={"max_retries": 3},
 )
 def update_review_consensus(self, book_id: str) -> str:
-    llm = get_llm_provider()
-    prompt = CONSENSUS_PROMPT_PATH.read_text(encoding="utf-8")
     with SessionLocal() as db:
         try:
-            row = db.execute(select(BookReviewConsensus).where(BookReviewConsensus.book_id == book_id)).scalar_one_or_none()
-            if row:
-                row.status = "running"
-                row.error_message = None
-                db.flush()
-
-            reviews = db.execute(select(Review).where(Review.book_id == book_id)).scalars().all()
-            if not reviews:
-                raise RuntimeError("No reviews found")
-
-            text_parts = []
-            for r in reviews:
-                piece = f"Rating: {r.rating}. Review: {r.review_text or ''}"
-                text_parts.append(piece)
-            combined = "\n".join(text_parts)
-            full_prompt = f"{prompt}\n\n{combined[:6000]}"
-            consensus = llm.generate(full_prompt)
-
-            if not row:
-                row = BookReviewConsensus(
-                    book_id=book_id,
-                    status="completed",
-                    model_name=settings.OLLAMA_MODEL,
-                    prompt_version="v1",
-                    consensus=consensus,
-                )
-                db.add(row)
-            else:
-                row.status = "completed"
-                row.model_name = settings.OLLAMA_MODEL
-                row.prompt_version = "v1"
-                row.consensus = consensus
-            db.commit()
+            # revises the stored consensus with reviews newer than its watermark
+            ConsensusService(db).update(book_id)
             return "ok"
         except Exception as e:
             logger.exception("update_review_consensus failed for %s", book_id)
             try:
-                row = db.execute(select(BookReviewConsensus).where(BookReviewConsensus.book_id == book_id)).scalar_one_or_none()
-                if row:
-                    row.status = "failed"
-                    row.error_message = str(e)
-                db.commit()
+                db.rollback()
+                if _retries_exhausted(self):
+                    row = db.execute(select(BookReviewConsensus).where(BookReviewConsensus.book_id == book_id)).scalar_one_or_none()
+                    if row:
+                        row.status = "failed"
+                        row.error_message = str(e)
+                    db.commit()
             except SQLAlchemyError:
                 db.rollback()
-            return f"error: {e}"
+            # let autoretry re-run it; the watermark is committed per call, so it resumes from there
+            raise
 
 
 @celery_app.task(
@@ -156,27 +225,53 @@ def update_review_consensus(self, book_id: str) -> str:
 )
 def recompute_user_preferences(self, user_id: str) -> str:
     with SessionLocal() as db:
-        tags_repo = TagRepository(db)
-        rec_repo = RecommendationRepository(db)
-        from app.models import UserTagPreference
-
-        # Count tag occurrences across all borrows
-        tag_counts: dict[str, float] = {}
-        user_borrow_book_ids = rec_repo.user_borrowed_book_ids(user_id)
-        book_tags = tags_repo.get_tags_for_books()
-        for bid in user_borrow_book_ids:
-            for t in book_tags.get(bid, []):
-                tag_counts[t] = tag_counts.get(t, 0.0) + 1.0
-
-        # Reset and insert preferences
-        db.query(UserTagPreference).filter(UserTagPreference.user_id == user_id).delete()
-        for tag_name, weight in tag_counts.items():
-            tag_obj = tags_repo.get_or_create(tag_name)
-            db.add(UserTagPreference(user_id=user_id, tag_id=tag_obj.id, weight=weight))
+        RecommendationRepository(db).recompute_preferences([user_id])
         db.commit()
     return f"preferences recomputed for {user_id}"
 
 
+@celery_app.task(
+    name="app.workers.tasks.apply_preference_delta",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def apply_preference_delta(self, user_id: str, book_id: str, borrow_id: str | None = None) -> str:
+    with SessionLocal() as db:
+        # the borrow is marked in the same commit, so an autoretry after it is a no-op
+        applied = RecommendationRepository(db).apply_borrow_delta(user_id, book_id, borrow_id)
+        db.commit()
+    if not applied:
+        return f"preference delta already applied for {user_id}"
+    return f"preference delta applied for {user_id}"
+
+
+@celery_app.task(
+    name="app.workers.tasks.reconcile_user_preferences",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def reconcile_user_preferences(self) -> str:
+    # rebuild from borrows + book_tags, one batch of users per transaction
+    total = 0
+    last = None
+    while True:
+        with SessionLocal() as db:
+            repo = RecommendationRepository(db)
+            user_ids = repo.user_ids_page(after=last, limit=settings.RECS_BATCH_SIZE)
+            if not user_ids:
+                break
+            repo.recompute_preferences(user_ids)
+            db.commit()
+        total += len(user_ids)
+        last = user_ids[-1]
+    logger.info("Reconciled tag preferences for %d users", total)
+    return f"preferences reconciled for {total} users"
+
+
 @celery_app.task(
     name="app.workers.tasks.recompute_recommendations",
     bind=True,
@@ -186,53 +281,209 @@ def recompute_user_preferences(self, user_id: str) -> str:
 )
 def recompute_recommendations(self, user_id: str) -> str:
     with SessionLocal() as db:
-        rec_repo = RecommendationRepository(db)
-        tag_repo = TagRepository(db)
-        provider = get_recommendation_provider()
-
-        user_pref_map = rec_repo.user_preferences_with_names(user_id)
-        book_tags = tag_repo.get_tags_for_books()
-        exclude = rec_repo.user_borrowed_book_ids(user_id)
-
-        provider_name = "content"
-        if isinstance(provider, ALSRecommender):
-            rows = rec_repo.interactions()
-            scores = []
-            if rows:
-                user_to_idx, book_to_idx, _, book_ids = rec_repo.index_mappings(rows)
-                data = []
-                row_idx = []
-                col_idx = []
-                for u, b, w in rows:
-                    row_idx.append(user_to_idx[u])
-                    col_idx.append(book_to_idx[b])
-                    data.append(w)
-                interactions = sparse.coo_matrix((data, (row_idx, col_idx)), shape=(len(user_to_idx), len(book_to_idx))).tocsr()
-                if str(user_id) in user_to_idx:
-                    user_items = interactions[user_to_idx[str(user_id)]]
-                    scores = provider.score_with_matrix(
-                        user_id=user_to_idx[str(user_id)],
-                        interactions=interactions,
-                        user_items=user_items,
-                        book_index_to_id=book_ids,
-                        exclude_book_ids=exclude,
-                        limit=20,
-                    )
-                    provider_name = "ml_als" if scores else provider_name
-            if not scores:
-                scores = ContentBasedRecommender().recommend(user_pref_map, book_tags, exclude_book_ids=exclude, limit=20)
-                provider_name = "content"
-            else:
-                cb_scores = ContentBasedRecommender().recommend(user_pref_map, book_tags, exclude_book_ids=exclude, limit=20)
-                seen = set(b for b, _ in scores)
-                for b, s in cb_scores:
-                    if b not in seen:
-                        scores.append((b, s))
-                scores = scores[:20]
-        else:
-            scores = provider.recommend(user_pref_map, book_tags, exclude_book_ids=exclude, limit=20)
-            provider_name = "content"
-        snap = rec_repo.create_snapshot(user_id, provider=provider_name)
-        rec_repo.replace_items(snap.id, scores)
+        RecommendationService(db).refresh(user_id, limit=20, fold_in=True)
         db.commit()
     return f"recommendations recomputed for {user_id}"
+
+
+@celery_app.task(
+    name="app.workers.tasks.train_als_model",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def train_als_model(self) -> str:
+    with SessionLocal() as db:
+        data = get_interaction_matrix(RecommendationRepository(db))
+        # read before the tag matrix, so the table is never labelled newer than its data
+        catalog_version = CatalogRepository(db).version()
+        tag_matrix = get_catalog_index(db).tag_matrix()
+    interactions = data.matrix
+    store = ALSModelStore()
+    if interactions.nnz == 0:
+        # lets API processes stop asking for a retrain until the next scheduled run
+        store.record_attempt()
+        # similar books can still be served from shared tags
+        _build_similar_books(NeighbourStore.new_version(), tag_matrix, catalog_version)
+        return "no interactions; model not trained"
+
+    recommender = ALSRecommender(
+        factors=settings.ALS_FACTORS,
+        iterations=settings.ALS_ITERATIONS,
+        alpha=settings.ALS_ALPHA,
+    )
+    started = time.monotonic()
+    user_factors, item_factors = recommender.fit(interactions)
+    ann = None
+    if item_factors.shape[0] >= settings.ALS_ANN_MIN_ITEMS:
+        ann = IVFPQIndex.build(
+            item_factors, n_lists=settings.ALS_ANN_LISTS, n_subvectors=settings.ALS_ANN_SUBVECTORS
+        )
+    artifact = ALSModelArtifact(
+        version=store.new_version(),
+        user_factors=user_factors,
+        item_factors=item_factors,
+        user_ids=data.user_ids.tolist(),
+        book_ids=data.book_ids.tolist(),
+        trained_at=datetime.utcnow(),
+        params={
+            "factors": recommender.factors,
+            "iterations": recommender.iterations,
+            "alpha": recommender.alpha,
+            "regularization": recommender.regularization,
+            "nnz": int(interactions.nnz),
+            "ann": ann is not None,
+        },
+        ann=ann,
+    )
+    store.save(artifact)
+    store.record_attempt()
+    pruned = store.prune(keep=settings.ALS_MODEL_RETENTION)
+    with SessionLocal() as db:
+        RecommendationRepository(db).purge_factor_overlays(keep_version=artifact.version)
+        db.commit()
+    logger.info(
+        "Trained ALS model %s on %d users x %d books in %.2fs (%d old versions deleted)",
+        artifact.version,
+        interactions.shape[0],
+        interactions.shape[1],
+        time.monotonic() - started,
+        len(pruned),
+    )
+    _build_similar_books(
+        artifact.version,
+        tag_matrix,
+        catalog_version,
+        item_factors,
+        artifact.book_ids,
+        model_version=artifact.version,
+        ann=ann,
+    )
+    return f"trained ALS model {artifact.version}"
+
+
+def _build_similar_books(
+    version: str,
+    tag_matrix: BookTagMatrix,
+    catalog_version: int,
+    item_factors=None,
+    factor_book_ids=(),
+    model_version: str | None = None,
+    ann: IVFPQIndex | None = None,
+) -> None:
+    store = NeighbourStore()
+    source = {"catalog_version": catalog_version, "model_version": model_version}
+    if store.latest_source() == source:
+        # same tags and factors as the current table; rebuilding would only upload a copy
+        logger.info("Neighbour table unchanged (catalog version %d), not rebuilt", catalog_version)
+        return
+    started = time.monotonic()
+    table = NeighbourTable.build(
+        version,
+        n_neighbours=settings.RECS_SIMILAR_NEIGHBOURS,
+        item_factors=item_factors,
+        factor_book_ids=factor_book_ids,
+        tag_matrix=tag_matrix,
+        ann=ann,
+        ann_probes=settings.ALS_ANN_PROBES,
+        budget_bytes=settings.RECS_SIMILAR_BLOCK_MB * 1024 * 1024,
+    )
+    store.save(table, source)
+    pruned = store.prune(keep=settings.ALS_MODEL_RETENTION)
+    logger.info(
+        "Built neighbour table %s for %d books in %.2fs (%d old versions deleted)",
+        version,
+        table.book_ids.shape[0],
+        time.monotonic() - started,
+        len(pruned),
+    )
+
+
+@celery_app.task(
+    name="app.workers.tasks.recommend_all_users",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def recommend_all_users(self) -> str:
+    started = time.monotonic()
+    with SessionLocal() as db:
+        counts = RecommendationService(db).recommend_all(
+            limit=settings.RECS_BATCH_LIMIT,
+            batch_size=settings.RECS_BATCH_SIZE,
+            write_chunk=settings.RECS_BATCH_WRITE_CHUNK,
+        )
+    elapsed = time.monotonic() - started
+    total = sum(counts.values())
+    for provider_name, n in counts.items():
+        RECS_BATCH_USERS.labels(provider=provider_name).inc(n)
+    RECS_BATCH_DURATION.observe(elapsed)
+    RECS_BATCH_THROUGHPUT.set(total / elapsed if elapsed > 0 else 0.0)
+    logger.info("Batch recommendations for %d users in %.2fs (%s)", total, elapsed, counts)
+    return f"recommendations recomputed for {total} users"
+
+
+@celery_app.task(
+    name="app.workers.tasks.compact_recommendation_snapshots",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def compact_recommendation_snapshots(self) -> str:
+    # one short transaction per batch so compaction never holds long locks
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            deleted = RecommendationRepository(db).compact_snapshots(
+                keep=settings.RECS_SNAPSHOT_RETENTION, batch_size=settings.RECS_COMPACTION_BATCH
+            )
+            db.commit()
+        total += deleted
+        RECS_SNAPSHOTS_COMPACTED.inc(deleted)
+        if deleted < settings.RECS_COMPACTION_BATCH:
+            break
+    logger.info("Compacted %d recommendation snapshots", total)
+    return f"deleted {total} snapshots"
+
+
+@celery_app.task(
+    name="app.workers.tasks.evict_summary_cache",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def evict_summary_cache(self) -> str:
+    unused_since = datetime.utcnow() - timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS)
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            deleted = SummaryCacheRepository(db).evict(
+                unused_since=unused_since,
+                max_entries=settings.SUMMARY_CACHE_MAX_ENTRIES,
+                batch_size=settings.SUMMARY_CACHE_EVICT_BATCH,
+            )
+            db.commit()
+        total += deleted
+        SUMMARY_CACHE_EVICTED.inc(deleted)
+        if deleted < settings.SUMMARY_CACHE_EVICT_BATCH:
+            break
+    logger.info("Evicted %d cached summaries", total)
+    return f"evicted {total} summaries"
+
+
+@celery_app.task(
+    name="app.workers.tasks.advance_summary_backfill",
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def advance_summary_backfill(self) -> str:
+    # one tick; state lives in summary_backfills, so a missed tick only delays the run
+    with SessionLocal() as db:
+        enqueued = SummaryBackfillService(db).advance()
+    return f"enqueued {enqueued} summaries"
@@ -0,0 +1,30 @@
+"""
+add user_factor_overlays for incremental ALS fold-in
+
+Revision ID: 0003_user_factor_overlays
+Revises: 0002_add_provider
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0003_user_factor_overlays"
+down_revision = "0002_add_provider"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_factor_overlays",
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("model_version", sa.String(length=50), nullable=False),
+        sa.Column("factors", sa.LargeBinary(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_factor_overlays")
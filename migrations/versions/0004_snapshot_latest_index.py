@@ -0,0 +1,28 @@
+"""
+covering index for the latest recommendation snapshot per user
+
+Revision ID: 0004_snapshot_latest_index
+Revises: 0003_user_factor_overlays
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_snapshot_latest_index"
+down_revision = "0003_user_factor_overlays"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_recommendation_snapshots_user_latest",
+        "recommendation_snapshots",
+        ["user_id", sa.text("generated_at DESC")],
+        postgresql_include=["id", "provider"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_recommendation_snapshots_user_latest", table_name="recommendation_snapshots")
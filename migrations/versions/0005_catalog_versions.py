@@ -0,0 +1,29 @@
+"""
+add catalog_versions counter for process-local catalog index invalidation
+
+Revision ID: 0005_catalog_versions
+Revises: 0004_snapshot_latest_index
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_catalog_versions"
+down_revision = "0004_snapshot_latest_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "catalog_versions",
+        sa.Column("name", sa.String(length=50), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.execute("INSERT INTO catalog_versions (name, version, updated_at) VALUES ('catalog', 0, now())")
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_versions")
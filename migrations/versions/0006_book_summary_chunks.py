@@ -0,0 +1,34 @@
+"""
+add book_summary_chunks for resumable map-reduce summarization
+
+Revision ID: 0006_book_summary_chunks
+Revises: 0005_catalog_versions
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006_book_summary_chunks"
+down_revision = "0005_catalog_versions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "book_summary_chunks",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("book_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("books.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("idx", sa.Integer(), nullable=False),
+        sa.Column("source_hash", sa.String(length=64), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("book_id", "level", "idx", name="uq_book_summary_chunks_book_level_idx"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("book_summary_chunks")
@@ -0,0 +1,41 @@
+"""
+add content hash to book_files and a content-addressed summary cache
+
+Revision ID: 0007_summary_cache
+Revises: 0006_book_summary_chunks
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0007_summary_cache"
+down_revision = "0006_book_summary_chunks"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("book_files", sa.Column("content_sha256", sa.String(length=64), nullable=True))
+    op.create_index("ix_book_files_content_sha256", "book_files", ["content_sha256"])
+    op.create_table(
+        "summary_cache",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("content_sha256", sa.String(length=64), nullable=False),
+        sa.Column("prompt_version", sa.String(length=50), nullable=False),
+        sa.Column("model_name", sa.String(length=100), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("content_sha256", "prompt_version", "model_name", name="uq_summary_cache_key"),
+    )
+    op.create_index("ix_summary_cache_last_used_at", "summary_cache", ["last_used_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_summary_cache_last_used_at", table_name="summary_cache")
+    op.drop_table("summary_cache")
+    op.drop_index("ix_book_files_content_sha256", table_name="book_files")
+    op.drop_column("book_files", "content_sha256")
@@ -0,0 +1,30 @@
+"""
+add review watermark to book_review_consensus for incremental revisions
+
+Revision ID: 0008_consensus_watermark
+Revises: 0007_summary_cache
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_consensus_watermark"
+down_revision = "0007_summary_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("book_review_consensus", sa.Column("reviews_through", sa.DateTime(), nullable=True))
+    op.add_column(
+        "book_review_consensus",
+        sa.Column("reviews_included", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_reviews_book_created", "reviews", ["book_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reviews_book_created", table_name="reviews")
+    op.drop_column("book_review_consensus", "reviews_included")
+    op.drop_column("book_review_consensus", "reviews_through")
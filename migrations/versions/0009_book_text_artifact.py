@@ -0,0 +1,32 @@
+"""
+record the extracted-text artifact of each book file
+
+Revision ID: 0009_book_text_artifact
+Revises: 0008_consensus_watermark
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0009_book_text_artifact"
+down_revision = "0008_consensus_watermark"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("book_files", sa.Column("text_object_key", sa.String(length=600), nullable=True))
+    op.add_column("book_files", sa.Column("text_version", sa.String(length=20), nullable=True))
+    op.add_column("book_files", sa.Column("text_sha256", sa.String(length=64), nullable=True))
+    op.add_column("book_files", sa.Column("text_chars", sa.Integer(), nullable=True))
+    op.add_column("book_files", sa.Column("text_page_offsets", postgresql.ARRAY(sa.Integer()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("book_files", "text_page_offsets")
+    op.drop_column("book_files", "text_chars")
+    op.drop_column("book_files", "text_sha256")
+    op.drop_column("book_files", "text_version")
+    op.drop_column("book_files", "text_object_key")
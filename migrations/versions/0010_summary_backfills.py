@@ -0,0 +1,41 @@
+"""
+add summary_backfills for throttled re-summarization after prompt/model changes
+
+Revision ID: 0010_summary_backfills
+Revises: 0009_book_text_artifact
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0010_summary_backfills"
+down_revision = "0009_book_text_artifact"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "summary_backfills",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("prompt_version", sa.String(length=50), nullable=False),
+        sa.Column("model_name", sa.String(length=100), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="running"),
+        sa.Column("cursor", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("enqueued", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rate_per_minute", sa.Float(), nullable=False),
+        sa.Column("max_inflight", sa.Integer(), nullable=False),
+        sa.Column("credit", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("last_tick_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_summary_backfills_status", "summary_backfills", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_summary_backfills_status", table_name="summary_backfills")
+    op.drop_table("summary_backfills")
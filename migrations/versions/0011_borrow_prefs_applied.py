@@ -0,0 +1,23 @@
+"""
+record when a borrow's incremental preference delta was applied
+
+Revision ID: 0011_borrow_prefs_applied
+Revises: 0010_summary_backfills
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011_borrow_prefs_applied"
+down_revision = "0010_summary_backfills"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("borrows", sa.Column("prefs_applied_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("borrows", "prefs_applied_at")
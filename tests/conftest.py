@@ -18,8 +18,12 @@ def clean_db():
         db.execute(text("TRUNCATE book_ai_summaries RESTART IDENTITY CASCADE"))
         db.execute(text("TRUNCATE book_review_consensus RESTART IDENTITY CASCADE"))
         db.execute(text("TRUNCATE book_files RESTART IDENTITY CASCADE"))
+        db.execute(text("TRUNCATE summary_cache RESTART IDENTITY CASCADE"))
+        db.execute(text("TRUNCATE summary_backfills RESTART IDENTITY CASCADE"))
         db.execute(text("TRUNCATE books RESTART IDENTITY CASCADE"))
         db.execute(text("TRUNCATE refresh_tokens RESTART IDENTITY CASCADE"))
         db.execute(text("TRUNCATE users RESTART IDENTITY CASCADE"))
+        # out-of-band catalog writes must bump the version like the repositories do
+        db.execute(text("UPDATE catalog_versions SET version = version + 1"))
         db.commit()
     yield
@@ -1,4 +1,5 @@
 import io
+import json
 import uuid
 import os
 import pytest
@@ -51,6 +52,18 @@ def create_book(client, access_token, content=b"hello", filename="book.txt", mim
     return resp
 
 
+def run_summary(book_id):
+    """Both summary stages, as the extract and llm workers would run them in turn."""
+    from unittest import mock
+    from app.core.celery_app import celery_app
+    from app.workers import tasks
+
+    handoff = {}
+    with mock.patch.object(celery_app, "send_task", lambda name, args=None, kwargs=None, **k: handoff.update(kwargs or {})):
+        result = tasks.summarize_book.run(book_id)
+    return tasks.generate_summary.run(book_id, **handoff) if result == tasks.EXTRACTED else result
+
+
 def test_health():
     client = _client()
     resp = client.get("/api/health")
@@ -147,6 +160,16 @@ def test_recommendations_with_tags_and_no_signal_message():
     b2 = create_book(client, access, filename="t2.txt", tags="scifi").json()["id"]
     client.post(f"/api/books/{b1}/borrow", headers={"Authorization": f"Bearer {access}"})
 
+    # the empty snapshot is served as-is; the borrow's background refresh replaces it
+    still_empty = client.get("/api/recommendations", headers={"Authorization": f"Bearer {access}"})
+    assert still_empty.json().get("items") == []
+    assert still_empty.json()["generated_at"] == rec_empty.json()["generated_at"]
+    from app.workers.tasks import apply_preference_delta, recompute_recommendations
+
+    user_id = security.decode_token(access)["sub"]
+    apply_preference_delta.run(user_id, b1)
+    recompute_recommendations.run(user_id)
+
     rec = client.get("/api/recommendations", headers={"Authorization": f"Bearer {access}"})
     assert rec.status_code == 200
     items = rec.json().get("items", [])
@@ -154,3 +177,779 @@ def test_recommendations_with_tags_and_no_signal_message():
     item_ids = {i["book_id"] for i in items}
     assert b2 in item_ids
     assert b1 not in item_ids
+
+
+def test_recommendations_served_from_snapshot_and_refreshed_when_stale(monkeypatch):
+    from datetime import timedelta
+    from sqlalchemy import text
+    from app.core.database import SessionLocal
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    headers = {"Authorization": f"Bearer {access}"}
+    b1 = create_book(client, access, filename="s1.txt", tags="mystery").json()["id"]
+    create_book(client, access, filename="s2.txt", tags="mystery")
+    client.post(f"/api/books/{b1}/borrow", headers=headers)
+
+    first = client.get("/api/recommendations", headers=headers).json()
+    assert first["items"] and first["generated_at"] and first["provider"]
+    assert first["stale"] is False
+
+    # fresh snapshot is served as-is, nothing recomputed or enqueued
+    sent = []
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda name, *a, **k: sent.append(name))
+    second = client.get("/api/recommendations", headers=headers).json()
+    assert second["generated_at"] == first["generated_at"]
+    assert "app.workers.tasks.recompute_recommendations" not in sent
+
+    # stale snapshot is still served, with a background refresh enqueued
+    with SessionLocal() as db:
+        db.execute(
+            text("UPDATE recommendation_snapshots SET generated_at = generated_at - :age"),
+            {"age": timedelta(seconds=settings.RECS_SNAPSHOT_TTL_SECONDS + 60)},
+        )
+        db.commit()
+    third = client.get("/api/recommendations", headers=headers).json()
+    assert third["stale"] is True
+    assert [i["book_id"] for i in third["items"]] == [i["book_id"] for i in first["items"]]
+    assert sent.count("app.workers.tasks.recompute_recommendations") == 1
+    # further reads of the same stale snapshot do not enqueue again
+    client.get("/api/recommendations", headers=headers)
+    client.get("/api/recommendations", headers=headers)
+    assert sent.count("app.workers.tasks.recompute_recommendations") == 1
+
+    # an empty snapshot reports staleness too, so the client knows a refresh is pending
+    _, other, _ = signup_and_login(client)
+    other_headers = {"Authorization": f"Bearer {other}"}
+    empty = client.get("/api/recommendations", headers=other_headers).json()
+    assert empty["items"] == [] and empty["stale"] is False
+    with SessionLocal() as db:
+        db.execute(
+            text("UPDATE recommendation_snapshots SET generated_at = generated_at - :age"),
+            {"age": timedelta(seconds=settings.RECS_SNAPSHOT_TTL_SECONDS + 60)},
+        )
+        db.commit()
+    assert client.get("/api/recommendations", headers=other_headers).json()["stale"] is True
+
+
+def test_snapshot_compaction_keeps_newest_per_user(monkeypatch):
+    from sqlalchemy import select, func
+    from app.core.database import SessionLocal
+    from app.models import RecommendationSnapshot, RecommendationItem, User
+    from app.services.recommendation_service import RecommendationService
+    from app.workers.tasks import compact_recommendation_snapshots
+
+    monkeypatch.setattr(settings, "RECS_PROVIDER", "content", raising=False)
+    monkeypatch.setattr(settings, "RECS_SNAPSHOT_RETENTION", 2, raising=False)
+    monkeypatch.setattr(settings, "RECS_COMPACTION_BATCH", 3, raising=False)
+    client = _client()
+    email, access, _ = signup_and_login(client)
+    headers = {"Authorization": f"Bearer {access}"}
+    b1 = create_book(client, access, filename="c1.txt", tags="poetry").json()["id"]
+    create_book(client, access, filename="c2.txt", tags="poetry")
+    client.post(f"/api/books/{b1}/borrow", headers=headers)
+
+    with SessionLocal() as db:
+        user_id = str(db.scalar(select(User.id).where(User.email == email)))
+        svc = RecommendationService(db)
+        for _ in range(7):
+            newest = svc.refresh(user_id).id
+        db.commit()
+
+    compact_recommendation_snapshots.run()
+
+    with SessionLocal() as db:
+        snaps = db.scalars(select(RecommendationSnapshot).where(RecommendationSnapshot.user_id == user_id)).all()
+        assert len(snaps) == 2
+        assert newest in {s.id for s in snaps}
+        orphans = db.scalar(
+            select(func.count())
+            .select_from(RecommendationItem)
+            .where(RecommendationItem.snapshot_id.not_in([s.id for s in snaps]))
+        )
+        assert orphans == 0
+
+
+def test_borrow_emits_preference_delta_in_incremental_mode(monkeypatch):
+    from app.core.database import SessionLocal
+    from app.models import Borrow
+    from app.repositories.recommendation_repo import RecommendationRepository
+    from app.workers.tasks import apply_preference_delta
+
+    monkeypatch.setattr(settings, "RECS_PREFS_MODE", "incremental", raising=False)
+    monkeypatch.setattr(settings, "RECS_RECOMPUTE_DEBOUNCE_SECONDS", 0, raising=False)
+    sent = []
+    visible = []
+
+    def send_task(name, args=None, **kwargs):
+        sent.append((name, args))
+        if name == "app.workers.tasks.apply_preference_delta":
+            # what a worker picking the delta up right away would see
+            with SessionLocal() as db:
+                visible.append(db.query(Borrow).filter(Borrow.id == args[2]).count())
+
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", send_task)
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    headers = {"Authorization": f"Bearer {access}"}
+    book_id = create_book(client, access, filename="d1.txt", tags="history,maps").json()["id"]
+
+    client.post(f"/api/books/{book_id}/borrow", headers=headers)
+    deltas = [args for name, args in sent if name == "app.workers.tasks.apply_preference_delta"]
+    assert len(deltas) == 1 and deltas[0][1] == book_id and visible == [1]
+    assert not any(name == "app.workers.tasks.recompute_user_preferences" for name, _ in sent)
+
+    user_id = deltas[0][0]
+    apply_preference_delta.run(*deltas[0])
+    # an autoretry after the delta committed does not add it again
+    apply_preference_delta.run(*deltas[0])
+    with SessionLocal() as db:
+        assert RecommendationRepository(db).user_preferences_with_names(user_id) == {"history": 1.0, "maps": 1.0}
+
+    sent.clear()
+    client.post(f"/api/books/{book_id}/return", headers=headers)
+    assert [name for name, _ in sent] == ["app.workers.tasks.recompute_recommendations"]
+
+
+def test_recompute_chain_coalesced_per_user(monkeypatch):
+    monkeypatch.setattr(settings, "RECS_PREFS_MODE", "full", raising=False)
+    monkeypatch.setattr(settings, "RECS_RECOMPUTE_DEBOUNCE_SECONDS", 30, raising=False)
+    sent = []
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda name, *a, **k: sent.append((name, k)))
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    headers = {"Authorization": f"Bearer {access}"}
+    b1 = create_book(client, access, filename="e1.txt", tags="travel").json()["id"]
+    b2 = create_book(client, access, filename="e2.txt", tags="travel").json()["id"]
+
+    for book_id in (b1, b2):
+        client.post(f"/api/books/{book_id}/borrow", headers=headers)
+        client.post(f"/api/books/{book_id}/return", headers=headers)
+
+    # four events, one delayed prefs task with recs linked behind it
+    recompute = [(name, k) for name, k in sent if "recompute" in name]
+    assert [name for name, _ in recompute] == ["app.workers.tasks.recompute_user_preferences"]
+    options = recompute[0][1]
+    assert options["countdown"] == 30
+    assert options["link"]["task"] == "app.workers.tasks.recompute_recommendations"
+
+
+def test_map_reduce_summary_resumes_from_persisted_sections(monkeypatch):
+    from app.core.database import SessionLocal
+    from app.models import BookSummaryChunk
+    from app.providers.llm.base import LLMProvider
+    from app.services.summary_service import SummaryService
+
+    monkeypatch.setattr(settings, "SUMMARY_CHUNK_TOKENS", 50, raising=False)
+    monkeypatch.setattr(settings, "SUMMARY_REDUCE_FANIN", 3, raising=False)
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    book_id = create_book(client, access, filename="long.txt").json()["id"]
+    text = "\n\n".join(f"Chapter {i}. " + "Something happens in this chapter. " * 5 for i in range(8))
+
+    class FlakyLLM(LLMProvider):
+        def __init__(self, fail_on=None):
+            self.prompts = []
+            self.fail_on = fail_on
+
+        def generate(self, prompt, params=None):
+            self.prompts.append(prompt)
+            if self.fail_on and self.fail_on in prompt:
+                raise RuntimeError("ollama timeout")
+            return f"summary #{len(self.prompts)}"
+
+    with SessionLocal() as db:
+        first = FlakyLLM(fail_on="Chapter 5.")
+        with pytest.raises(RuntimeError):
+            SummaryService(db, llm=first).summarize(book_id, text)
+        saved = db.query(BookSummaryChunk).filter(BookSummaryChunk.book_id == book_id).count()
+        assert saved == 7
+
+        second = FlakyLLM()
+        summary = SummaryService(db, llm=second).summarize(book_id, text)
+        db.commit()
+        # only the failed section is redone, then 8 -> 3 -> 1 reduce calls
+        assert sum("Chapter" in p for p in second.prompts) == 1
+        assert len(second.prompts) == 1 + 3 + 1
+        assert summary == f"summary #{len(second.prompts)}"
+        assert db.query(BookSummaryChunk).filter(BookSummaryChunk.book_id == book_id).count() == 0
+
+
+def test_long_book_summary_covers_every_section(monkeypatch):
+    from app.core.database import SessionLocal
+    from app.providers.llm.base import LLMProvider
+    from app.services.summary_service import SummaryService
+
+    monkeypatch.setattr(settings, "SUMMARY_CHUNK_TOKENS", 50, raising=False)
+    monkeypatch.setattr(settings, "SUMMARY_REDUCE_FANIN", 8, raising=False)
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    book_id = create_book(client, access, filename="epic.txt").json()["id"]
+    chapters = 60
+    text = "\n\n".join(f"Chapter {i}. " + "Something happens in this chapter. " * 5 for i in range(chapters))
+
+    class RecordingLLM(LLMProvider):
+        def __init__(self):
+            self.prompts = []
+
+        def generate(self, prompt, params=None):
+            self.prompts.append(prompt)
+            return f"summary #{len(self.prompts)}"
+
+    llm = RecordingLLM()
+    with SessionLocal() as db:
+        summary = SummaryService(db, llm=llm).summarize(book_id, text)
+        db.commit()
+    mapped = [p for p in llm.prompts if "Something happens" in p]
+    assert len(mapped) == chapters
+    for i in range(chapters):
+        assert any(f"Chapter {i}." in p for p in mapped)
+    # 60 -> 8 -> 1: reduced over two levels rather than sampled
+    assert len(llm.prompts) == chapters + 8 + 1
+    assert summary == f"summary #{len(llm.prompts)}"
+
+
+def test_summary_extract_stage_parses_once_and_llm_stage_reads_the_artifact(monkeypatch):
+    import gzip
+    import hashlib
+    from app.core.database import SessionLocal
+    from app.models import BookAISummary, BookFile
+    from app.providers.llm.base import LLMProvider
+    from app.core.celery_app import celery_app
+    from app.providers.storage.local import LocalStorageProvider
+    from app.workers import tasks
+
+    monkeypatch.setattr(settings, "SUMMARY_MAX_INPUT_TOKENS", 100, raising=False)
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    content = ("The beginning.  \r\n" * 40 + "\r\n\r\n\r\n" + "NEVER READ. " * 40_000).encode()
+    book_id = create_book(client, access, content=content, filename="big.txt").json()["id"]
+
+    streamed = {}
+    original = LocalStorageProvider.get_stream
+
+    def counting_stream(self, object_name, chunk_size=64 * 1024):
+        for chunk in original(self, object_name, chunk_size=4096):
+            key = "artifact" if object_name.endswith(".txt.gz") else "upload"
+            streamed[key] = streamed.get(key, 0) + len(chunk)
+            yield chunk
+
+    monkeypatch.setattr(LocalStorageProvider, "get_stream", counting_stream)
+    prompts = []
+
+    class RecordingLLM(LLMProvider):
+        def generate(self, prompt, params=None):
+            prompts.append(prompt)
+            return "short summary"
+
+    monkeypatch.setattr("app.services.summary_service.get_llm_provider", lambda: RecordingLLM())
+    sent = []
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda name, args=None, **k: sent.append((name, args)))
+
+    # the extract stage parses the whole upload once, calls no LLM and hands over to the llm queue
+    assert tasks.summarize_book.run(book_id) == tasks.EXTRACTED
+    assert streamed == {"upload": len(content)} and prompts == []
+    assert sent == [(tasks.SUMMARY_GENERATE_TASK, [book_id])]
+    assert celery_app.conf.task_routes[tasks.SUMMARY_GENERATE_TASK]["queue"] == "llm"
+    assert celery_app.conf.task_routes["app.workers.tasks.summarize_book"]["queue"] == "extract"
+
+    # the llm stage reads only the artifact; only the first 400 chars reach the LLM
+    streamed.clear()
+    assert tasks.generate_summary.run(book_id) == "ok"
+    assert "upload" not in streamed
+    assert len(prompts) == 1 and "NEVER READ" not in prompts[0]
+    with SessionLocal() as db:
+        bf = db.query(BookFile).filter(BookFile.book_id == book_id).one()
+        stored = gzip.decompress(LocalStorageProvider().get(bf.text_object_key)).decode()
+        assert stored.startswith("The beginning.\nThe beginning.\n") and "\r" not in stored
+        assert "The beginning.\n\nNEVER READ." in stored
+        assert bf.text_chars == len(stored) and bf.text_sha256 == hashlib.sha256(stored.encode()).hexdigest()
+        assert bf.text_page_offsets is None
+
+    # a prompt change re-summarizes from the artifact without touching the upload
+    monkeypatch.setattr(settings, "SUMMARY_PROMPT_VERSION", "v-next", raising=False)
+    streamed.clear()
+    assert run_summary(book_id) == "ok"
+    assert "upload" not in streamed and streamed["artifact"] < len(content) // 100
+    assert len(prompts) == 2 and prompts[1] == prompts[0]
+    with SessionLocal() as db:
+        row = db.query(BookAISummary).filter(BookAISummary.book_id == book_id).one()
+        assert row.status == "completed" and row.summary == "short summary"
+
+
+def test_summary_task_is_sent_after_the_upload_commits(monkeypatch):
+    import hashlib
+    from app.core.database import SessionLocal
+    from app.models import BookFile
+
+    seen = []
+
+    def send_task(name, args=None, **kwargs):
+        # what a worker picking the task up right away would read
+        with SessionLocal() as db:
+            bf = db.query(BookFile).filter(BookFile.book_id == args[0]).one_or_none()
+            seen.append((name, bf.content_sha256 if bf else None))
+
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", send_task)
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    book_id = create_book(client, access, content=b"first edition").json()["id"]
+    assert seen == [("app.workers.tasks.summarize_book", hashlib.sha256(b"first edition").hexdigest())]
+
+    seen.clear()
+    files = {"file": ("book.txt", io.BytesIO(b"second edition"), "text/plain")}
+    resp = client.put(f"/api/books/{book_id}", files=files, headers={"Authorization": f"Bearer {access}"})
+    assert resp.status_code == 200
+    assert seen == [("app.workers.tasks.summarize_book", hashlib.sha256(b"second edition").hexdigest())]
+
+
+def test_replaced_and_deleted_uploads_leave_no_objects_behind(tmp_path):
+    from pathlib import Path
+    from app.core.database import SessionLocal
+    from app.models import BookFile
+    from app.workers import tasks
+
+    def stored_file(book_id):
+        with SessionLocal() as db:
+            return db.query(BookFile).filter(BookFile.book_id == book_id).one()
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    headers = {"Authorization": f"Bearer {access}"}
+    book_id = create_book(client, access, content=b"first edition", filename="v1.txt").json()["id"]
+    assert tasks.summarize_book.run(book_id) == tasks.EXTRACTED
+    first = stored_file(book_id)
+    assert Path(first.object_key).exists() and Path(first.text_object_key).exists()
+
+    files = {"file": ("v2.txt", io.BytesIO(b"second edition"), "text/plain")}
+    assert client.put(f"/api/books/{book_id}", files=files, headers=headers).status_code == 200
+    assert not Path(first.object_key).exists() and not Path(first.text_object_key).exists()
+    assert tasks.summarize_book.run(book_id) == tasks.EXTRACTED
+    second = stored_file(book_id)
+    assert Path(second.object_key).read_bytes() == b"second edition"
+
+    # re-uploading under the same name keeps the (overwritten) upload, drops its old text
+    files = {"file": ("v2.txt", io.BytesIO(b"third edition"), "text/plain")}
+    assert client.put(f"/api/books/{book_id}", files=files, headers=headers).status_code == 200
+    assert Path(second.object_key).read_bytes() == b"third edition"
+    assert not Path(second.text_object_key).exists()
+    assert tasks.summarize_book.run(book_id) == tasks.EXTRACTED
+
+    assert client.delete(f"/api/books/{book_id}", headers=headers).status_code == 204
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == []
+
+
+def test_identical_uploads_share_one_cached_summary(monkeypatch):
+    from datetime import datetime, timedelta
+    from app.core.database import SessionLocal
+    from app.core.metrics import SUMMARY_CACHE_HITS
+    from app.models import BookAISummary, BookFile, SummaryCacheEntry
+    from app.providers.llm.base import LLMProvider
+    from app.workers import tasks
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    content = b"A short novella about caching. " * 20
+    b1 = create_book(client, access, content=content, filename="first.txt").json()["id"]
+    b2 = create_book(client, access, content=content, filename="second.txt").json()["id"]
+    calls = []
+
+    class CountingLLM(LLMProvider):
+        def generate(self, prompt, params=None):
+            calls.append(prompt)
+            return "cached summary"
+
+    monkeypatch.setattr("app.services.summary_service.get_llm_provider", lambda: CountingLLM())
+    hits_before = SUMMARY_CACHE_HITS._value.get()
+    assert run_summary(b1) == "ok"
+    # served from the cache by the extract stage, without an llm stage
+    assert tasks.summarize_book.run(b2) == "ok"
+    assert len(calls) == 1
+    assert SUMMARY_CACHE_HITS._value.get() == hits_before + 1
+
+    with SessionLocal() as db:
+        hashes = {h for (h,) in db.query(BookFile.content_sha256).filter(BookFile.book_id.in_([b1, b2]))}
+        assert len(hashes) == 1 and len(next(iter(hashes))) == 64
+        row = db.query(BookAISummary).filter(BookAISummary.book_id == b2).one()
+        assert row.summary == "cached summary" and row.prompt_version == settings.SUMMARY_PROMPT_VERSION
+
+        db.query(SummaryCacheEntry).update({"last_used_at": datetime.utcnow() - timedelta(days=365)})
+        db.commit()
+    tasks.evict_summary_cache.run()
+    with SessionLocal() as db:
+        assert db.query(SummaryCacheEntry).count() == 0
+
+
+def test_ollama_provider_caps_in_flight_requests_across_loops_and_counts_tokens():
+    import asyncio
+    import threading
+    import time
+    import httpx
+    from app.core.metrics import LLM_TOKENS
+    from app.providers.llm.ollama import OllamaProvider
+
+    lock = threading.Lock()
+    active, peak = 0, 0
+
+    def handler(request):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+        body = json.loads(request.content)
+        if body["stream"]:
+            lines = [{"response": word + " "} for word in body["prompt"].split()]
+            lines.append({"response": "", "prompt_eval_count": 7, "eval_count": 3, "done": True})
+            return httpx.Response(200, text="\n".join(json.dumps(line) for line in lines))
+        return httpx.Response(
+            200, json={"response": body["prompt"].upper(), "prompt_eval_count": 7, "eval_count": 3, "done": True}
+        )
+
+    provider = OllamaProvider(model="test-model", max_inflight=2, transport=httpx.MockTransport(handler))
+    completion_before = LLM_TOKENS.labels("test-model", "completion")._value.get()
+
+    async def fan_out(book):
+        async def streamed(i):
+            return "".join([piece async for piece in provider.astream(f"book {book} part {i}")])
+
+        calls = [provider.agenerate(f"book {book} part {i}") for i in range(3)] + [streamed(i) for i in range(2)]
+        return await asyncio.gather(*calls)
+
+    # one event loop per book, as summary tasks run them, plus a synchronous caller
+    results = {}
+    books = [threading.Thread(target=lambda b=b: results.update({b: asyncio.run(fan_out(b))})) for b in range(4)]
+    books.append(threading.Thread(target=lambda: results.update(sync=provider.generate("sync"))))
+    for t in books:
+        t.start()
+    for t in books:
+        t.join()
+
+    assert peak == 2
+    assert results["sync"] == "SYNC"
+    for b in range(4):
+        assert results[b] == [f"BOOK {b} PART {i}" for i in range(3)] + [f"book {b} part {i} " for i in range(2)]
+    assert LLM_TOKENS.labels("test-model", "completion")._value.get() == completion_before + 3 * 21
+    provider.close()
+
+    # the process-wide client is closed with the worker
+    from celery import signals
+    from app.providers.llm import get_llm_provider
+
+    shared = get_llm_provider()
+    signals.worker_process_shutdown.send(sender=None, pid=os.getpid(), exitcode=0)
+    assert shared.client.is_closed and get_llm_provider() is not shared
+
+
+def test_summary_tokens_stream_through_progress_and_sse(monkeypatch):
+    from app.core import progress
+    from app.providers.llm.base import LLMProvider
+    from app.services.summary_service import summary_progress_channel
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    headers = {"Authorization": f"Bearer {access}"}
+    book_id = create_book(client, access, content=b"A tiny book.", filename="tiny.txt").json()["id"]
+    channel = summary_progress_channel(book_id)
+    seen_mid_stream = []
+
+    class StreamingLLM(LLMProvider):
+        def generate(self, prompt, params=None):
+            raise AssertionError("the final summary call should stream")
+
+        def stream(self, prompt, params=None):
+            yield "First sentence. "
+            # the worker has published the first piece before the model finishes
+            seen_mid_stream.append(progress.read(channel)[:2])
+            yield "Second sentence."
+
+    monkeypatch.setattr("app.services.summary_service.get_llm_provider", lambda: StreamingLLM())
+    assert run_summary(book_id) == "ok"
+    state, text = seen_mid_stream[0]
+    assert state["status"] == "running" and text == "First sentence. "
+
+    def events(body):
+        parsed = []
+        for block in body.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            parsed.append((lines["event"], json.loads(lines["data"])))
+        return parsed
+
+    resp = client.get(f"/api/books/{book_id}/analysis/stream", headers=headers)
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+    received = events(resp.text)
+    assert received[0][0] == "status" and received[0][1]["status"] == "completed"
+    assert "".join(d["text"] for e, d in received if e == "delta") == "First sentence. Second sentence."
+
+    # once live progress has expired the stored summary is served instead
+    progress.reset_local_progress()
+    received = events(client.get(f"/api/books/{book_id}/analysis/stream", headers=headers).text)
+    assert received == [("status", {"status": "completed"}), ("delta", {"text": "First sentence. Second sentence."})]
+
+
+def test_summary_progress_is_one_run_and_fails_only_once_retries_run_out(monkeypatch):
+    from app.core import progress
+    from app.core.database import SessionLocal
+    from app.models import BookAISummary
+    from app.providers.llm.base import LLMProvider
+    from app.services.summary_service import summary_progress_channel
+    from app.workers import tasks
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    book_id = create_book(client, access, content=b"A tiny book.", filename="tiny.txt").json()["id"]
+    channel = summary_progress_channel(book_id)
+    sent = []
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda name, args=None, kwargs=None, **k: sent.append(kwargs))
+
+    class DownLLM(LLMProvider):
+        def generate(self, prompt, params=None):
+            raise RuntimeError("ollama down")
+
+        def stream(self, prompt, params=None):
+            yield "Half a sent"
+            raise RuntimeError("ollama down")
+
+    monkeypatch.setattr("app.services.summary_service.get_llm_provider", lambda: DownLLM())
+
+    def summary_status():
+        with SessionLocal() as db:
+            return db.query(BookAISummary).filter(BookAISummary.book_id == book_id).one().status
+
+    assert tasks.summarize_book.run(book_id) == tasks.EXTRACTED
+    started = progress.read(channel)[0]["run"]
+    # the llm stage continues the extract stage's run instead of resetting readers
+    with pytest.raises(RuntimeError):
+        tasks.generate_summary.run(book_id, **sent[0])
+    state, text, _ = progress.read(channel)
+    assert state["run"] == started and state["status"] == "retrying" and text == "Half a sent"
+    assert summary_status() != "failed"
+
+    # a retry starts over with an empty buffer; the last one marks the summary failed
+    tasks.generate_summary.push_request(retries=tasks.generate_summary.max_retries)
+    try:
+        with pytest.raises(RuntimeError):
+            tasks.generate_summary.run(book_id, **sent[0])
+    finally:
+        tasks.generate_summary.pop_request()
+    state, text, _ = progress.read(channel)
+    assert state["run"] != started and state["status"] == "failed" and text == "Half a sent"
+    assert summary_status() == "failed"
+
+
+def test_review_consensus_revised_incrementally_and_debounced(monkeypatch):
+    from app.core.database import SessionLocal
+    from app.models import BookReviewConsensus, Review
+    from app.providers.llm.base import LLMProvider
+    from app.workers import tasks
+
+    monkeypatch.setattr(settings, "REVIEW_CONSENSUS_DEBOUNCE_SECONDS", 30, raising=False)
+    sent = []
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda name, *a, **k: sent.append((name, k)))
+    prompts = []
+
+    class RecordingLLM(LLMProvider):
+        down = False
+
+        def generate(self, prompt, params=None):
+            prompts.append(prompt)
+            if self.down:
+                raise RuntimeError("ollama timeout")
+            return f"consensus #{len(prompts)}"
+
+    monkeypatch.setattr("app.services.consensus_service.get_llm_provider", lambda: RecordingLLM())
+    client = _client()
+    _, owner, _ = signup_and_login(client)
+    book_id = create_book(client, owner, filename="reviewed.txt").json()["id"]
+
+    def review(text, rating=4):
+        _, access, _ = signup_and_login(client)
+        headers = {"Authorization": f"Bearer {access}"}
+        client.post(f"/api/books/{book_id}/borrow", headers=headers)
+        client.post(f"/api/books/{book_id}/return", headers=headers)
+        r = client.post(f"/api/books/{book_id}/reviews", headers=headers, json={"rating": rating, "review_text": text})
+        assert r.status_code in (200, 201)
+
+    review("Loved the pacing")
+    review("Too long in the middle", rating=3)
+    consensus_runs = [k for name, k in sent if name == "app.workers.tasks.update_review_consensus"]
+    assert len(consensus_runs) == 1 and consensus_runs[0]["countdown"] == 30
+
+    assert tasks.update_review_consensus.run(book_id) == "ok"
+    assert len(prompts) == 1 and "Loved the pacing" in prompts[0] and "Too long" in prompts[0]
+
+    review("The ending made up for it", rating=5)
+    tasks.update_review_consensus.run(book_id)
+    # only the new review goes out, alongside the previous consensus
+    assert "Current consensus (from 2 reviews):\nconsensus #1" in prompts[1]
+    assert "The ending made up for it" in prompts[1] and "Loved the pacing" not in prompts[1]
+
+    tasks.update_review_consensus.run(book_id)
+    assert len(prompts) == 2
+    with SessionLocal() as db:
+        row = db.query(BookReviewConsensus).filter(BookReviewConsensus.book_id == book_id).one()
+        assert (row.status, row.consensus, row.reviews_included) == ("completed", "consensus #2", 3)
+        # a review vanishing below the watermark forces a rebuild from all remaining reviews
+        db.query(Review).filter(Review.review_text == "Loved the pacing").delete()
+        db.commit()
+    tasks.update_review_consensus.run(book_id)
+    assert "Current consensus" not in prompts[2] and "Too long" in prompts[2] and "The ending" in prompts[2]
+
+    # a failure raises for autoretry and the retry resumes from the watermark
+    review("Worth a second read", rating=5)
+    RecordingLLM.down = True
+    with pytest.raises(RuntimeError):
+        tasks.update_review_consensus.run(book_id)
+    with SessionLocal() as db:
+        assert db.query(BookReviewConsensus).filter(BookReviewConsensus.book_id == book_id).one().status != "failed"
+    RecordingLLM.down = False
+    tasks.update_review_consensus.run(book_id)
+    assert "Current consensus (from 2 reviews)" in prompts[-1] and "Worth a second read" in prompts[-1]
+    assert "Too long" not in prompts[-1]
+
+
+def test_consensus_prompts_packed_to_the_context_budget(monkeypatch):
+    from app.core.database import SessionLocal
+    from app.models import Review, User
+    from app.providers.llm.base import LLMProvider
+    from app.providers.llm.budget import get_estimator
+    from app.services.consensus_service import ConsensusService
+
+    monkeypatch.setattr(settings, "LLM_NUM_CTX", 600, raising=False)
+    monkeypatch.setattr(settings, "REVIEW_CONSENSUS_NUM_PREDICT", 100, raising=False)
+    calls = []
+
+    class RecordingLLM(LLMProvider):
+        def generate(self, prompt, params=None):
+            calls.append((prompt, params))
+            return "Mixed but mostly positive."
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    book_id = create_book(client, access, filename="long-reviews.txt").json()["id"]
+    texts = [f"Review {i}. " + "The characters felt real and the plot kept moving. " * 20 for i in range(3)]
+    with SessionLocal() as db:
+        for text in texts:
+            user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x")
+            db.add(user)
+            db.flush()
+            db.add(Review(user_id=user.id, book_id=book_id, rating=4, review_text=text))
+        db.commit()
+        ConsensusService(db, llm=RecordingLLM()).update(book_id)
+
+    # ~260 tokens per review against a ~400 token input budget: one review per call, none cut
+    assert len(calls) == 3
+    for (prompt, params), text in zip(calls, texts):
+        assert text in prompt
+        assert params == {"options": {"num_ctx": 600, "num_predict": 100}}
+        assert get_estimator().count(prompt) <= 600 - 100
+
+
+def test_fake_llm_provider_is_deterministic_with_configured_cost(monkeypatch):
+    import asyncio
+    import time
+    from app.providers.llm import get_llm_provider, reset_llm_provider
+    from app.providers.llm.fake import FakeLLMProvider
+
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "fake", raising=False)
+    reset_llm_provider()
+    try:
+        assert isinstance(get_llm_provider(), FakeLLMProvider)
+    finally:
+        monkeypatch.setattr(settings, "LLM_PROVIDER", "ollama", raising=False)
+        reset_llm_provider()
+
+    fake = FakeLLMProvider(latency_ms=20, latency_sigma=0, tokens_per_second=1000, output_tokens=50, max_inflight=2)
+    params = {"options": {"num_predict": 30}}
+    started = time.perf_counter()
+    out = fake.generate("same prompt", params)
+    # 20 ms to first token plus 30 tokens at 1000/s
+    assert 0.045 <= time.perf_counter() - started < 0.5
+    assert len(out.split()) == 30 and out == fake.generate("same prompt", params)
+    assert "".join(fake.stream("same prompt", params)) == out
+    assert len(fake.generate("another prompt").split()) == 50
+
+    async def burst():
+        begun = time.perf_counter()
+        await asyncio.gather(*(fake.agenerate(f"p{i}", params) for i in range(4)))
+        return time.perf_counter() - begun
+
+    # two at a time: four calls take two rounds
+    assert asyncio.run(burst()) >= 0.09
+
+    def failures(seed):
+        flaky = FakeLLMProvider(latency_ms=0, latency_sigma=0, tokens_per_second=1e6, failure_rate=0.3, seed=seed)
+        outcomes = []
+        for _ in range(200):
+            try:
+                flaky.generate("x")
+                outcomes.append(False)
+            except RuntimeError:
+                outcomes.append(True)
+        return outcomes
+
+    assert failures(7) == failures(7) and 40 <= sum(failures(7)) <= 80
+
+
+def test_summary_backfill_is_throttled_resumable_and_keyset_ordered(monkeypatch):
+    from datetime import datetime, timedelta
+    from app.core.database import SessionLocal
+    from app.core.metrics import SUMMARY_BACKFILL_PROGRESS
+    from app.models import BookAISummary, SummaryBackfill
+    from app.services.summary_backfill_service import SummaryBackfillService
+
+    client = _client()
+    _, access, _ = signup_and_login(client)
+    book_ids = [
+        create_book(client, access, content=f"Book number {i}.".encode(), filename=f"b{i}.txt").json()["id"]
+        for i in range(5)
+    ]
+    with SessionLocal() as db:
+        db.query(BookAISummary).update({"status": "completed", "prompt_version": "v0", "summary": "old"})
+        db.commit()
+    sent = []
+    monkeypatch.setattr(
+        "app.core.celery_app.celery_app.send_task", lambda name, args=None, **k: sent.append((args[0], k["countdown"]))
+    )
+
+    def finish_sent():
+        with SessionLocal() as db:
+            db.query(BookAISummary).filter(BookAISummary.book_id.in_([b for b, _ in sent])).update(
+                {"status": "completed", "prompt_version": settings.SUMMARY_PROMPT_VERSION}, synchronize_session=False
+            )
+            db.commit()
+
+    t0 = datetime.utcnow()
+    with SessionLocal() as db:
+        job = SummaryBackfillService(db).start(rate_per_minute=6, max_inflight=10)
+        job_id = job.id
+        assert job.total == 5
+    # 6/min: the first tick carries one tick (15s) of credit, later ones what accrued since
+    with SessionLocal() as db:
+        service = SummaryBackfillService(db)
+        ticks = [t0, t0 + timedelta(seconds=5), t0 + timedelta(seconds=6)]
+        assert [service.advance(t) for t in ticks] == [1, 1, 0]
+    with SessionLocal() as db:
+        assert {r.status for r in db.query(BookAISummary).filter(BookAISummary.book_id.in_([b for b, _ in sent]))} == {"pending"}
+
+    # restarting resumes the same backfill with new limits; the in-flight cap holds it back
+    with SessionLocal() as db:
+        assert SummaryBackfillService(db).start(rate_per_minute=600, max_inflight=2).id == job_id
+    with SessionLocal() as db:
+        assert SummaryBackfillService(db).advance(t0 + timedelta(seconds=10)) == 0
+    finish_sent()
+    with SessionLocal() as db:
+        assert SummaryBackfillService(db).advance(t0 + timedelta(seconds=11)) == 2
+    assert [c for _, c in sent[-2:]] == [0.0, 0.1]
+    finish_sent()
+    with SessionLocal() as db:
+        assert SummaryBackfillService(db).advance(t0 + timedelta(seconds=12)) == 1
+        job = db.get(SummaryBackfill, job_id)
+        assert job.status == "completed" and job.enqueued == 5
+        assert SummaryBackfillService(db).progress(job)["remaining"] == 0
+
+    # every stale summary exactly once, in book_id order
+    assert [b for b, _ in sent] == sorted(book_ids)
+    assert SUMMARY_BACKFILL_PROGRESS._value.get() == 1.0
@@ -0,0 +1,33 @@
+from app.providers.recs.content_based import ContentBasedRecommender
+
+
+def _reference(prefs, book_tags, exclude, limit):
+    scores = []
+    for book_id, tags in book_tags.items():
+        if book_id in exclude:
+            continue
+        score = sum(prefs.get(tag, 0.0) for tag in tags)
+        if score > 0:
+            scores.append((book_id, score))
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores[:limit]
+
+
+def test_matrix_ranking_matches_reference_including_ties():
+    book_tags = {
+        "b1": ["scifi"],
+        "b2": ["scifi", "space"],
+        "b3": ["space"],
+        "b4": ["scifi"],
+        "b5": ["romance"],
+        "b6": ["scifi", "scifi"],
+        "b7": ["space"],
+    }
+    prefs = {"scifi": 2.0, "space": 2.0, "romance": -1.0}
+    exclude = {"b2"}
+    rec = ContentBasedRecommender()
+
+    for limit in range(0, 8):
+        expected = _reference(prefs, book_tags, exclude, limit)
+        assert rec.recommend(prefs, book_tags, exclude, limit=limit) == expected
+        assert rec.recommend_many([prefs, {}], book_tags, [exclude, set()], limit=limit) == [expected, []]
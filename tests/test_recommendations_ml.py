@@ -12,6 +12,9 @@ def set_ml_provider(monkeypatch):
 
 
 def test_ml_recommendations_flow(monkeypatch):
+    from app.core import security
+    from app.workers.tasks import apply_preference_delta, recompute_recommendations
+
     client = TestClient(app)
     # create user
     email = f"mluser-{uuid.uuid4().hex}@example.com"
@@ -44,6 +47,10 @@ def test_ml_recommendations_flow(monkeypatch):
     ).json()["id"]
 
     client.post(f"/api/books/{b1}/borrow", headers={"Authorization": f"Bearer {access}"})
+    # what the borrow's background tasks do
+    user_id = security.decode_token(access)["sub"]
+    apply_preference_delta.run(user_id, b1)
+    recompute_recommendations.run(user_id)
 
     rec2 = client.get("/api/recommendations", headers={"Authorization": f"Bearer {access}"})
     assert rec2.status_code == 200
@@ -51,3 +58,364 @@ def test_ml_recommendations_flow(monkeypatch):
     assert items
     ids = {i["book_id"] for i in items}
     assert b2 in ids and b1 not in ids
+
+
+def test_similar_books_from_neighbour_table(monkeypatch, tmp_path):
+    from app.providers.recs.neighbours import NEIGHBOURS_PREFIX, NeighbourStore, reset_neighbour_cache
+    from app.workers.tasks import train_als_model
+
+    monkeypatch.setattr(settings, "RECS_CACHE_DIR", str(tmp_path / "cache"), raising=False)
+    monkeypatch.setattr(settings, "STORAGE_PROVIDER", "local", raising=False)
+    monkeypatch.setattr(settings, "LOCAL_STORAGE_PATH", str(tmp_path / "storage"), raising=False)
+    client = TestClient(app)
+    email = f"simuser-{uuid.uuid4().hex}@example.com"
+    password = "Passw0rd!"
+    client.post("/api/auth/signup", json={"email": email, "password": password})
+    access = client.post(
+        "/api/auth/login",
+        data={"username": email, "password": password},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {access}"}
+
+    def create(title, tags):
+        return client.post(
+            "/api/books",
+            headers=headers,
+            files={"file": (f"{title}.txt", b"hello", "text/plain")},
+            data={"title": title, "author": "auth", "tags": tags},
+        ).json()["id"]
+
+    space = create("Space", "scifi,space")
+    robots = create("Robots", "scifi,robots")
+    baking = create("Baking", "cooking")
+
+    reset_neighbour_cache()
+    res = client.get(f"/api/books/{space}/similar", headers=headers)
+    assert res.status_code == 200
+    assert res.json()["items"] == [] and res.json()["message"]
+
+    # no borrows yet: the table is built from shared tags only
+    train_als_model.run()
+    reset_neighbour_cache()
+    res = client.get(f"/api/books/{space}/similar", headers=headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["provider"] == "content"
+    assert [i["book_id"] for i in body["items"]] == [robots]
+    assert baking not in {i["book_id"] for i in body["items"]}
+
+    # nothing changed: no new table; a catalog change rebuilds, and storage keeps only the newest
+    store = NeighbourStore()
+    built = store.latest_version()
+    train_als_model.run()
+    assert store.latest_version() == built
+    monkeypatch.setattr(settings, "ALS_MODEL_RETENTION", 2, raising=False)
+    for i in range(3):
+        create(f"More{i}", "scifi")
+        train_als_model.run()
+    assert store.latest_version() > built
+    versions = {name.split("/")[2] for name in store.storage.list(NEIGHBOURS_PREFIX + "/") if name.count("/") == 3}
+    assert len(versions) == 2 and store.latest_version() in versions
+    reset_neighbour_cache()
+
+
+def test_empty_training_run_backs_off_retrains_and_old_models_are_pruned(monkeypatch, tmp_path):
+    import io
+    from app.providers.recs import model_store
+    from app.providers.recs.model_store import ALSModelStore, get_latest_model, reset_model_cache, retrain_wanted
+    from app.workers.tasks import train_als_model
+
+    monkeypatch.setattr(settings, "STORAGE_PROVIDER", "local", raising=False)
+    monkeypatch.setattr(settings, "LOCAL_STORAGE_PATH", str(tmp_path / "storage"), raising=False)
+    monkeypatch.setattr(settings, "RECS_CACHE_DIR", str(tmp_path / "cache"), raising=False)
+    reset_model_cache()
+    assert get_latest_model() is None and retrain_wanted(None)
+
+    # no interactions: nothing to load, but the attempt is recorded and no retrain is requested
+    train_als_model.run()
+    reset_model_cache()
+    assert get_latest_model() is None
+    assert not retrain_wanted(None)
+    monkeypatch.setattr(settings, "ALS_MODEL_MAX_AGE_HOURS", 0, raising=False)
+    assert retrain_wanted(None)
+
+    store = ALSModelStore()
+    versions = [f"2026010{i}T000000000000" for i in range(1, 6)]
+    for v in versions:
+        store.storage.put(io.BytesIO(b"x"), store.object_key(v))
+        store.storage.put(io.BytesIO(b"x"), store.object_key(v, "ann.npz"))
+    # LATEST is never pruned, even when it is not among the newest
+    store.storage.put(io.BytesIO(versions[0].encode()), model_store.ALS_LATEST_KEY)
+    assert store.prune(keep=2) == versions[1:3]
+    left = store.storage.list(model_store.ALS_MODEL_PREFIX + "/")
+    assert {name.split("/")[2] for name in left if name.count("/") == 3} == {versions[0], *versions[3:]}
+    assert model_store.ALS_ATTEMPT_KEY in left
+    reset_model_cache()
+
+
+def _login(client):
+    email = f"als-{uuid.uuid4().hex}@example.com"
+    client.post("/api/auth/signup", json={"email": email, "password": "Passw0rd!"})
+    access = client.post(
+        "/api/auth/login",
+        data={"username": email, "password": "Passw0rd!"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {access}"}
+
+
+def _borrow_and_return(client, headers, book_id):
+    assert client.post(f"/api/books/{book_id}/borrow", headers=headers).status_code == 201
+    assert client.post(f"/api/books/{book_id}/return", headers=headers).status_code == 200
+
+
+@pytest.fixture
+def als_env(monkeypatch, tmp_path):
+    """Local storage and small factors; model and interaction caches reset around the test."""
+    from app.providers.recs.interactions import reset_interaction_cache
+    from app.providers.recs.model_store import reset_model_cache
+
+    monkeypatch.setattr(settings, "STORAGE_PROVIDER", "local", raising=False)
+    monkeypatch.setattr(settings, "LOCAL_STORAGE_PATH", str(tmp_path / "storage"), raising=False)
+    monkeypatch.setattr(settings, "RECS_CACHE_DIR", str(tmp_path / "cache"), raising=False)
+    monkeypatch.setattr(settings, "ALS_FACTORS", 8, raising=False)
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda *a, **k: None)
+    reset_model_cache()
+    reset_interaction_cache()
+    yield TestClient(app)
+    reset_model_cache()
+    reset_interaction_cache()
+
+
+def _reading_groups(client, tags=None):
+    """Four readers over five books in two overlapping groups, {0, 1, 2} and {3, 4}."""
+    users = [_login(client) for _ in range(4)]
+    books = [
+        client.post(
+            "/api/books",
+            headers=users[0],
+            files={"file": (f"{i}.txt", f"book {i}".encode(), "text/plain")},
+            data={"title": f"B{i}", "author": "auth", **({"tags": tags[i]} if tags else {})},
+        ).json()["id"]
+        for i in range(5)
+    ]
+    history = [[0, 1], [0, 1, 2], [1, 2], [3, 4]]
+    for headers, read in zip(users, history):
+        for i in read:
+            _borrow_and_return(client, headers, books[i])
+    return users, books
+
+
+def test_als_trains_on_borrows_and_serves_from_persisted_factors(als_env):
+    import numpy as np
+    from app.providers.recs.model_store import ALSModelArtifact, ALSModelStore, get_latest_model, reset_model_cache
+    from app.workers.tasks import train_als_model
+
+    client = als_env
+    users, books = _reading_groups(client)
+    assert train_als_model.run().startswith("trained ALS model")
+    store = ALSModelStore()
+    version = store.latest_version()
+    assert version
+    artifact = store.load(version)
+    assert artifact.user_factors.shape == (4, 8) and artifact.item_factors.shape == (5, 8)
+    assert sorted(artifact.book_ids) == sorted(books)
+    copy = ALSModelArtifact.from_bytes(artifact.to_bytes())
+    assert copy.version == version and copy.book_ids == artifact.book_ids
+    assert np.array_equal(copy.item_factors, artifact.item_factors)
+    assert copy.params["nnz"] == 9
+
+    reset_model_cache()
+    loaded = get_latest_model()
+    assert loaded is not None and loaded.version == version
+
+    res = client.get("/api/recommendations", headers=users[0])
+    assert res.status_code == 200
+    body = res.json()
+    assert body["provider"] == "ml_als"
+    ids = [i["book_id"] for i in body["items"]]
+    assert ids and books[0] not in ids and books[1] not in ids
+    # the user's own reading group ranks first
+    assert ids[0] == books[2]
+
+
+def test_interaction_matrix_rebuilt_when_borrows_or_reviews_change(monkeypatch):
+    from app.core.database import SessionLocal
+    from app.providers.recs.interactions import get_interaction_matrix, reset_interaction_cache
+    from app.repositories.catalog_repo import CatalogRepository
+    from app.repositories.recommendation_repo import RecommendationRepository
+
+    monkeypatch.setattr("app.core.celery_app.celery_app.send_task", lambda *a, **k: None)
+    reset_interaction_cache()
+    client = TestClient(app)
+    headers = _login(client)
+    book = client.post(
+        "/api/books", headers=headers, files={"file": ("a.txt", b"a", "text/plain")}, data={"title": "A", "author": "x"}
+    ).json()["id"]
+
+    def matrix():
+        with SessionLocal() as db:
+            return get_interaction_matrix(RecommendationRepository(db))
+
+    def catalog_version():
+        with SessionLocal() as db:
+            return CatalogRepository(db).version()
+
+    empty = matrix()
+    assert empty.matrix.nnz == 0 and matrix() is empty
+    before = catalog_version()
+    _borrow_and_return(client, headers, book)
+    # borrows and reviews write no shared version row; the matrix version is read from the data
+    assert catalog_version() == before
+    borrowed = matrix()
+    assert borrowed is not empty and borrowed.version != empty.version
+    assert borrowed.matrix.toarray().tolist() == [[1.0]]
+    assert matrix() is borrowed
+
+    review = client.post(f"/api/books/{book}/reviews", headers=headers, json={"rating": 5, "review_text": "good"})
+    assert review.status_code in (200, 201)
+    reviewed = matrix()
+    assert reviewed.version != borrowed.version
+    assert reviewed.matrix.toarray().tolist() == [[2.0]]
+    reset_interaction_cache()
+
+
+def test_batch_snapshots_match_per_user_refresh(als_env):
+    from sqlalchemy import select
+    from app.core.database import SessionLocal
+    from app.models import RecommendationSnapshot
+    from app.providers.recs.model_store import reset_model_cache
+    from app.services.recommendation_service import RecommendationService
+    from app.workers.tasks import train_als_model
+
+    client = als_env
+    users, books = _reading_groups(client, tags=["scifi", "scifi", "scifi,space", "cooking", "cooking"])
+    train_als_model.run()
+    reset_model_cache()
+    # a review on top of the borrows, and a reader the model has not seen (content-based in both paths)
+    client.post(f"/api/books/{books[2]}/reviews", headers=users[1], json={"rating": 4, "review_text": "ok"})
+    _borrow_and_return(client, _login(client), books[0])
+
+    with SessionLocal() as db:
+        service = RecommendationService(db)
+        counts = service.recommend_all(limit=4)
+        assert counts["ml_als"] == 4 and counts["content"] == 1
+        batch = {}
+        for snap in db.scalars(select(RecommendationSnapshot)):
+            items = service.rec_repo.items_for_snapshot(snap.id)
+            batch[str(snap.user_id)] = (snap.provider, [(str(i.book_id), i.score) for i in items])
+        for user_id, (provider, items) in batch.items():
+            snap = service.refresh(user_id, limit=4)
+            single = [(str(i.book_id), i.score) for i in service.rec_repo.items_for_snapshot(snap.id)]
+            assert snap.provider == provider, user_id
+            assert [b for b, _ in single] == [b for b, _ in items], user_id
+            assert [s for _, s in single] == pytest.approx([s for _, s in items], rel=1e-4, abs=1e-5)
+            # nothing the user borrowed or reviewed comes back
+            assert not {b for b, _ in single} & service.exclusions([user_id])[user_id]
+        db.rollback()
+
+
+def test_fold_in_overlay_written_used_and_ignored_after_retrain(als_env):
+    import numpy as np
+    from sqlalchemy import update
+    from app.core import security
+    from app.core.database import SessionLocal
+    from app.models import UserFactorOverlay
+    from app.providers.recs.model_store import get_latest_model, reset_model_cache
+    from app.services.recommendation_service import RecommendationService
+    from app.workers.tasks import recompute_recommendations, train_als_model
+
+    client = als_env
+    users, books = _reading_groups(client)
+    train_als_model.run()
+    reset_model_cache()
+    model = get_latest_model()
+
+    # a reader who arrives after training is not in the model
+    newcomer = _login(client)
+    user_id = security.decode_token(newcomer["Authorization"].split()[1])["sub"]
+    assert model.user_vector(user_id) is None
+    _borrow_and_return(client, newcomer, books[3])
+    recompute_recommendations.run(user_id)
+
+    with SessionLocal() as db:
+        service = RecommendationService(db)
+        overlay = service.rec_repo.factor_overlay(user_id, model.version)
+        assert overlay is not None and overlay.shape == (model.item_factors.shape[1],)
+        # scored from the overlay, without folding in again
+        snap = service.refresh(user_id, limit=4)
+        assert snap.provider == "ml_als"
+        items = service.rec_repo.items_for_snapshot(snap.id)
+        expected = model.item_factors @ overlay
+        expected[model.book_index[books[3]]] = -np.inf
+        assert books[3] not in {str(i.book_id) for i in items}
+        assert str(items[0].book_id) == model.book_ids[int(np.argmax(expected))]
+        assert service.recommend_all(limit=4)["ml_als"] == 5
+
+        # an overlay solved against another model version is ignored
+        db.execute(update(UserFactorOverlay).values(model_version="older"))
+        db.flush()
+        assert service.rec_repo.factor_overlay(user_id, model.version) is None
+        assert service.refresh(user_id, limit=4).provider == "content"
+        assert service.recommend_all(limit=4)["ml_als"] == 4
+
+
+def test_ivfpq_recall_floor_at_default_probes():
+    """ALS_ANN_PROBES is chosen from this test: recall@10 against exact search must
+    stay >= 0.9 when the probed share of lists matches a ~100k-book catalog."""
+    import numpy as np
+    from app.benchmarks.ann import exact_top_k, synthetic_factors
+    from app.providers.recs import get_recommendation_provider
+    from app.providers.recs.ann import IVFPQIndex
+
+    rng = np.random.default_rng(0)
+    items = synthetic_factors(20_000, 64, 200, rng)
+    queries = synthetic_factors(100, 64, 200, rng)
+    # sqrt(100k) lists, so the default probes cover the same share as in production
+    index = IVFPQIndex.build(items, n_lists=316, n_subvectors=settings.ALS_ANN_SUBVECTORS)
+    index = IVFPQIndex.from_bytes(index.to_bytes())
+    provider = get_recommendation_provider()
+    book_ids = [f"b{i}" for i in range(items.shape[0])]
+
+    hits = 0
+    for query in queries:
+        exclude = rng.choice(items.shape[0], 20, replace=False)
+        truth = {book_ids[i] for i in exact_top_k(items, query, 10, exclude)}
+        found = provider.score_with_factors(
+            query, items, book_ids, exclude_book_ids={book_ids[i] for i in exclude}, limit=10, ann=index
+        )
+        assert len(found) == 10
+        assert not {b for b, _ in found} & {book_ids[i] for i in exclude}
+        # re-ranked scores are exact
+        assert [s for _, s in found] == pytest.approx([float(items[int(b[1:])] @ query) for b, _ in found], rel=1e-5)
+        hits += len(truth & {b for b, _ in found})
+    assert hits / (10 * len(queries)) >= 0.9
+
+
+def test_neighbour_build_is_blocked_by_memory_budget_and_uses_ivf_lists():
+    import numpy as np
+    from scipy import sparse
+    from app.benchmarks.ann import synthetic_factors
+    from app.providers.recs.ann import IVFPQIndex
+    from app.providers.recs.neighbours import ann_cosine_neighbours, cosine_neighbours, sparse_cosine_neighbours
+
+    rng = np.random.default_rng(0)
+    items = synthetic_factors(10_000, 64, 200, rng)
+    exact_idx, exact_scores = cosine_neighbours(items, 10)
+    # a budget of seven rows per block gives the same table as one big block
+    idx, scores = cosine_neighbours(items[:2000], 10, budget_bytes=17 * 2000 * 7)
+    full_idx, full_scores = cosine_neighbours(items[:2000], 10)
+    assert np.array_equal(idx, full_idx) and np.array_equal(scores, full_scores)
+
+    tags = sparse.random(3000, 40, density=0.1, random_state=1, format="csr")
+    small = sparse_cosine_neighbours(tags, 10, budget_bytes=1)
+    large = sparse_cosine_neighbours(tags, 10)
+    assert np.array_equal(small[0], large[0]) and np.allclose(small[1], large[1])
+
+    # candidates from the IVF lists of a model-sized index: the probed share matches a ~100k catalog
+    index = IVFPQIndex.build(items, n_lists=316, n_subvectors=settings.ALS_ANN_SUBVECTORS)
+    idx, scores = ann_cosine_neighbours(items, 10, index, settings.ALS_ANN_PROBES, budget_bytes=1 << 20)
+    assert not (idx == np.arange(items.shape[0])[:, None]).any()
+    recall = np.mean([len(set(a) & set(b)) for a, b in zip(idx, exact_idx)]) / 10
+    assert recall >= 0.95